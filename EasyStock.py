@@ -4,20 +4,39 @@ y modularizable. Mantiene la lógica esencial: gestión de tiendas, productos, v
 
 Dependencias:
   pip install customtkinter pandas openpyxl
+  (opcional: pyarrow, para exportar ventas a Parquet)
 
 Notas:
-- Este archivo está pensado como base. Para producción: separar en módulos (db.py, ui/*.py, utils.py).
+- Este archivo contiene la interfaz. La lógica sin GUI (base de datos, catálogo, importación)
+  vive en el paquete `easystock`, que también se usa desde la línea de comandos (python -m easystock).
+- Modo caja: con --servidor URL (o la variable EASYSTOCK_SERVIDOR) la interfaz no abre la base;
+  habla con el servidor de `python -m easystock servidor`, que la comparte entre varias cajas.
+- EASYSTOCK_DURABILIDAD=normal confirma sin fsync en cada commit (más rápido; un corte de luz
+  puede perder las últimas ventas, nunca corromper la base). Por defecto: completa.
+- Las ventanas no recargan tras escribir: aplican solo las filas que avisa la base
+  (easystock.cambios). Lo que escriben otros procesos o cajas se revisa cada pocos segundos.
 - Paleta: neutros + acento verde. Diseño responsivo usando grid/pack combinado y frames expandibles.
 
 """
 
+import json
+import os
+import sys
+import time
 import customtkinter as ctk
 import tkinter as tk
+import tkinter.font as tkfont
 from tkinter import messagebox
 from tkinter import simpledialog
+from tkinter import filedialog
 import sqlite3
-from datetime import datetime
-import pandas as pd
+from datetime import datetime, timedelta
+
+from easystock.carrito import Carrito
+from easystock.catalogo import CatalogoProductos
+from easystock.db import DBManager, StockInsuficienteError, TAM_PAGINA_HISTORIAL
+from easystock.ejecutor import EjecutorDB
+# pandas (easystock.importacion) se importa recién al cargar un Excel: pesa casi todo el arranque
 
 def bring_to_front(win):
     win.lift()
@@ -32,167 +51,172 @@ def bring_to_front(win):
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")  # puedes cambiar por "dark-blue" etc.
 
-DB_FILE = "StockManager.db"
 PASSWORD = "2000"
 INACTIVITY_MS = 5 * 60 * 1000  # 5 minutos
+FILTRO_DEBOUNCE_MS = 150  # espera tras la última tecla antes de filtrar
+TAM_PAGINA_BUSQUEDA = 50  # resultados por pedido en la búsqueda entre sucursales
+REVISION_EXTERNA_MS = 2000  # cada cuánto se mira si otro proceso u otra caja cambió la base
+# Presupuesto de arranque en ms, desde que se lanza el proceso: incluye el intérprete y el
+# desempaquetado de PyInstaller. `EasyStock.py --medir-arranque` abre la ventana, mide hasta que
+# se dibuja, imprime JSON y sale con código 1 si se excede (lo corre tests/test_arranque.py).
+# El instante de lanzamiento lo pone quien lanza, en EASYSTOCK_T_LANZAMIENTO (time.time());
+# sin él se cuenta desde el fin de los imports y 'imports' no se mide.
+PRESUPUESTO_ARRANQUE_MS = {'imports': 700, 'primer_pintado': 1500}
+_T_IMPORTS = time.time()
 
 # -------------------------
-# DB Manager (encapsula acceso a sqlite)
+# Ventanas y componentes (UI)
 # -------------------------
-class DBManager:
-    def __init__(self, filename=DB_FILE):
-        self.conn = sqlite3.connect(filename, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor = self.conn.cursor()
-        self._ensure_schema()
-
-    def _ensure_schema(self):
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tiendas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT
-        )
-        """)
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS productos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT,
-            stock INTEGER,
-            precio REAL,
-            id_tienda INTEGER,
-            codigo_barras TEXT UNIQUE
-        )
-        """)
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ventas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            producto TEXT,
-            cantidad INTEGER,
-            total REAL,
-            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS venta_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            venta_id INTEGER,
-            producto TEXT,
-            cantidad INTEGER,
-            precio REAL,
-            subtotal REAL,
-            FOREIGN KEY (venta_id) REFERENCES ventas(id) ON DELETE CASCADE
-        )
-        """)
-        self.conn.commit()
-
-    # Tiendas
-    def list_tiendas(self):
-        self.cursor.execute("SELECT id, nombre FROM tiendas ORDER BY id")
-        return [dict(r) for r in self.cursor.fetchall()]
-
-    def add_tienda(self, nombre):
-        self.cursor.execute("INSERT INTO tiendas (nombre) VALUES (?)", (nombre,))
-        self.conn.commit()
-        return self.cursor.lastrowid
-
-    # Productos
-    def list_productos(self, id_tienda=None):
-        if id_tienda is None:
-            self.cursor.execute("SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos")
+def _fila_carrito(l):
+    return f"{l['producto']} | {l['cantidad']} x ${l['precio']:.2f} = ${l['subtotal']:.2f}"
+
+
+def _fila_producto(p):
+    return f"{p['nombre']} | stock: {p['stock']} | ${p['precio']}"
+
+
+class ListaVirtual(ctk.CTkFrame):
+    """Listbox que solo dibuja las filas visibles.
+
+    `datos` es cualquier secuencia (len + índice) y `formato` convierte un registro
+    en el texto de su fila; solo se llama para las filas en pantalla. Los índices de
+    curselection() y seleccionado() son del conjunto completo, no de la ventana.
+    Con `on_fin` los datos pueden llegar por páginas a medida que se desplaza.
+    """
+
+    def __init__(self, master, formato=str, on_select=None, on_activate=None, on_fin=None, **listbox_kw):
+        super().__init__(master, fg_color="transparent")
+        self.formato = formato
+        self.on_select = on_select
+        self.on_activate = on_activate
+        self.on_fin = on_fin  # se llama cuando se muestran las últimas filas (para cargar más)
+        self._datos = []
+        self._offset = 0
+        self._filas = 1
+        self._sel = None
+
+        self.listbox = tk.Listbox(self, exportselection=False, **listbox_kw)
+        self.scroll = ctk.CTkScrollbar(self, command=self._yview)
+        self.scroll.pack(side='right', fill='y')
+        self.listbox.pack(side='left', expand=True, fill='both')
+        self._alto_fila = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+
+        self.listbox.bind('<Configure>', self._on_configure)
+        self.listbox.bind('<<ListboxSelect>>', self._on_listbox_select)
+        self.listbox.bind('<Double-Button-1>', self._on_double)
+        self.listbox.bind('<MouseWheel>', self._on_wheel)
+        self.listbox.bind('<Button-4>', lambda e: self._desplazar(-3))
+        self.listbox.bind('<Button-5>', lambda e: self._desplazar(3))
+        self.listbox.bind('<Up>', lambda e: self._mover_seleccion(-1))
+        self.listbox.bind('<Down>', lambda e: self._mover_seleccion(1))
+        self.listbox.bind('<Prior>', lambda e: self._mover_seleccion(-self._filas))
+        self.listbox.bind('<Next>', lambda e: self._mover_seleccion(self._filas))
+
+    # ---- API ----
+    def set_datos(self, datos, conservar_posicion=False):
+        self._datos = datos
+        if not conservar_posicion:
+            self._offset = 0
+            self._sel = None
+        elif self._sel is not None and self._sel >= len(datos):
+            self._sel = None
+        self._render()
+
+    def refrescar(self):
+        self._render()
+
+    def curselection(self):
+        if self._sel is None or self._sel >= len(self._datos):
+            return ()
+        return (self._sel,)
+
+    def seleccionado(self):
+        sel = self.curselection()
+        return self._datos[sel[0]] if sel else None
+
+    def seleccionar(self, indice):
+        self._sel = indice
+        self.ver(indice)
+        self._render()
+
+    def ver(self, indice):
+        if indice < self._offset:
+            self._ir_a(indice)
+        elif indice >= self._offset + self._filas:
+            self._ir_a(indice - self._filas + 1)
+
+    # ---- internos ----
+    def _render(self):
+        total = len(self._datos)
+        self._offset = max(0, min(self._offset, total - self._filas))
+        fin = min(total, self._offset + self._filas)
+        self.listbox.delete(0, tk.END)
+        if fin > self._offset:
+            self.listbox.insert(tk.END, *(self.formato(self._datos[i]) for i in range(self._offset, fin)))
+        if self._sel is not None and self._offset <= self._sel < fin:
+            self.listbox.selection_set(self._sel - self._offset)
+        self.listbox.yview_moveto(0)
+        if total:
+            self.scroll.set(self._offset / total, fin / total)
         else:
-            self.cursor.execute(
-                "SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos WHERE id_tienda = ?",
-                (id_tienda,)
-            )
-        return [dict(r) for r in self.cursor.fetchall()]
-
-    def add_producto(self, nombre, stock, precio, id_tienda, codigo_barras=None):
-        try:
-            self.cursor.execute(
-                "INSERT INTO productos (nombre, stock, precio, id_tienda, codigo_barras) VALUES (?, ?, ?, ?, ?)",
-                (nombre, int(stock), float(precio), id_tienda, codigo_barras)
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
-        except sqlite3.IntegrityError:
-            raise
-
-    def update_producto(self, prod_id, nombre, stock, precio, codigo_barras):
-        self.cursor.execute(
-            "UPDATE productos SET nombre=?, stock=?, precio=?, codigo_barras=? WHERE id=?",
-            (nombre, int(stock), float(precio), codigo_barras, prod_id)
-        )
-        self.conn.commit()
-
-    def delete_producto(self, prod_id):
-        self.cursor.execute("DELETE FROM productos WHERE id=?", (prod_id,))
-        self.conn.commit()
-
-    # Ventas
-    def create_venta(self, lineas, total):
-        # lineas: list of dicts {producto, cantidad, precio, subtotal}
-        self.cursor.execute("INSERT INTO ventas (producto, cantidad, total) VALUES (?, ?, ?)", (None, None, total))
-        venta_id = self.cursor.lastrowid
-        for l in lineas:
-            self.cursor.execute(
-                "INSERT INTO venta_items (venta_id, producto, cantidad, precio, subtotal) VALUES (?, ?, ?, ?, ?)",
-                (venta_id, l['producto'], l['cantidad'], l['precio'], l['subtotal'])
-            )
-            # actualizar stock
-            self.cursor.execute("UPDATE productos SET stock = stock - ? WHERE id = ?", (l['cantidad'], l['producto_id']))
-        self.conn.commit()
-        return venta_id
-
-    def list_ventas(self):
-        self.cursor.execute("SELECT id, total, fecha FROM ventas ORDER BY fecha DESC")
-        return [dict(r) for r in self.cursor.fetchall()]
-
-    def list_items_by_venta(self, venta_id):
-        self.cursor.execute("SELECT producto, cantidad, precio, subtotal FROM venta_items WHERE venta_id = ?", (venta_id,))
-        return [dict(r) for r in self.cursor.fetchall()]
-
-    def delete_venta(self, venta_id):
-        self.cursor.execute("DELETE FROM venta_items WHERE venta_id = ?", (venta_id,))
-        self.cursor.execute("DELETE FROM ventas WHERE id = ?", (venta_id,))
-        self.conn.commit()
-
-    def top_por_mes(self, year_month):
-        # year_month: 'YYYY-MM'
-        self.cursor.execute(
-            """
-            SELECT vi.producto, SUM(vi.cantidad) AS total_vendido, SUM(vi.subtotal) AS ingresos
-            FROM venta_items vi
-            JOIN ventas v ON vi.venta_id = v.id
-            WHERE strftime('%Y-%m', v.fecha) = ?
-            GROUP BY vi.producto
-            ORDER BY total_vendido DESC
-            """,
-            (year_month,)
-        )
-        unidades = [dict(r) for r in self.cursor.fetchall()]
-
-        self.cursor.execute(
-            """
-            SELECT vi.producto, SUM(vi.cantidad) AS total_vendido, SUM(vi.subtotal) AS ingresos
-            FROM venta_items vi
-            JOIN ventas v ON vi.venta_id = v.id
-            WHERE strftime('%Y-%m', v.fecha) = ?
-            GROUP BY vi.producto
-            ORDER BY ingresos DESC
-            """,
-            (year_month,)
-        )
-        ingresos = [dict(r) for r in self.cursor.fetchall()]
-        return unidades, ingresos
-
-    def close(self):
-        self.conn.commit()
-        self.conn.close()
+            self.scroll.set(0, 1)
+        if self.on_fin and fin + self._filas >= total:
+            self.on_fin()
+
+    def _ir_a(self, offset):
+        offset = max(0, min(int(offset), len(self._datos) - self._filas))
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+
+    def _desplazar(self, filas):
+        self._ir_a(self._offset + filas)
+        return 'break'
+
+    def _yview(self, *args):
+        if args[0] == 'moveto':
+            self._ir_a(float(args[1]) * len(self._datos))
+        elif args[0] == 'scroll':
+            n = int(float(args[1]))
+            self._desplazar(n * self._filas if args[2] == 'pages' else n)
+
+    def _on_configure(self, event):
+        alto_util = event.height - 2 * (int(self.listbox.cget('borderwidth')) + int(self.listbox.cget('highlightthickness')))
+        filas = max(1, alto_util // self._alto_fila)
+        if filas != self._filas:
+            self._filas = filas
+            self._render()
+
+    def _on_wheel(self, event):
+        # Windows entrega múltiplos de 120, macOS valores pequeños
+        paso = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._desplazar(-3 * paso)
+
+    def _on_listbox_select(self, event):
+        cur = self.listbox.curselection()
+        if not cur:
+            return
+        self._sel = self._offset + cur[0]
+        if self.on_select:
+            self.on_select(event)
+
+    def _on_double(self, event):
+        if self.on_activate and self.curselection():
+            self.on_activate(event)
+
+    def _mover_seleccion(self, paso):
+        total = len(self._datos)
+        if not total:
+            return 'break'
+        actual = self._offset if self._sel is None else self._sel
+        self._sel = max(0, min(total - 1, actual + paso))
+        self.ver(self._sel)
+        self._render()
+        if self.on_select:
+            self.on_select(None)
+        return 'break'
 
 
-# -------------------------
-# Ventanas y componentes (UI)
-# -------------------------
 class AddEditProductWindow(ctk.CTkToplevel):
     def __init__(self, parent, db: DBManager, tienda_id, producto=None, callback=None):
         super().__init__(parent)
@@ -266,13 +290,79 @@ class AddEditProductWindow(ctk.CTkToplevel):
         self.destroy()
 
 
+class CambiosMasivosWindow(ctk.CTkToplevel):
+    # acción -> argumento de DBManager.actualizar_productos (None: eliminar)
+    ACCIONES = {
+        'Ajustar precio (%)': 'porcentaje',
+        'Fijar precio': 'precio',
+        'Fijar stock': 'stock',
+        'Sumar stock': 'sumar_stock',
+        'Eliminar productos': None,
+    }
+
+    def __init__(self, parent, db: DBManager, tienda_id, productos, filtro='', callback=None):
+        super().__init__(parent)
+        bring_to_front(self)
+        self.db = db
+        self.tienda_id = tienda_id
+        self.callback = callback
+        # sin filtro se opera sobre la sucursal entera (una sola sentencia, sin lista de ids)
+        self.ids = [p['id'] for p in productos] if filtro.strip() else None
+        self.cantidad = len(productos)
+        self.title("Cambios masivos")
+        self.geometry("460x260")
+        self.configure(padx=16, pady=16)
+
+        alcance = f"los {self.cantidad} productos filtrados por '{filtro.strip()}'" if self.ids is not None \
+            else f"todos los productos de la sucursal ({self.cantidad})"
+        ctk.CTkLabel(self, text=f"Se aplicará a {alcance}", wraplength=420).pack(fill='x', pady=6)
+        self.opt_accion = ctk.CTkOptionMenu(self, values=list(self.ACCIONES), command=self._cambio_accion)
+        self.opt_accion.pack(fill='x', pady=6)
+        self.entry_valor = ctk.CTkEntry(self, placeholder_text="Valor (ej: 10 para +10 %, -5 para -5 %)")
+        self.entry_valor.pack(fill='x', pady=6)
+
+        btn_frame = ctk.CTkFrame(self)
+        btn_frame.pack(fill='x', pady=8)
+        ctk.CTkButton(btn_frame, text="Aplicar", command=self.aceptar).pack(side='left', expand=True, padx=6)
+        ctk.CTkButton(btn_frame, text="Cancelar", command=self.destroy).pack(side='right', expand=True, padx=6)
+
+    def _cambio_accion(self, accion):
+        self.entry_valor.configure(state='disabled' if self.ACCIONES[accion] is None else 'normal')
+
+    def aceptar(self):
+        if not self.cantidad:
+            messagebox.showinfo("Info", "No hay productos a los que aplicar el cambio", parent=self)
+            return
+        accion = self.opt_accion.get()
+        campo = self.ACCIONES[accion]
+        if campo is None:
+            if not messagebox.askyesno("Confirmar", f"Eliminar {self.cantidad} productos?", parent=self):
+                return
+            n = self.db.delete_productos(ids=self.ids, id_tienda=self.tienda_id)
+            resumen = f"Productos eliminados: {n}"
+        else:
+            try:
+                valor = int(self.entry_valor.get()) if campo in ('stock', 'sumar_stock') \
+                    else float(self.entry_valor.get().replace(',', '.'))
+            except ValueError:
+                messagebox.showerror("Error", "Stock debe ser entero y precio/porcentaje numérico", parent=self)
+                return
+            n = self.db.actualizar_productos(id_tienda=self.tienda_id, ids=self.ids, **{campo: valor})
+            resumen = f"Productos modificados: {n}"
+        if self.callback:
+            self.callback()
+        messagebox.showinfo("Cambios masivos", resumen, parent=self)
+        self.destroy()
+
+
 class SaleWindow(ctk.CTkToplevel):
-    def __init__(self, parent, db: DBManager, productos, refresh_callback):
+    def __init__(self, parent, db: DBManager, ejecutor: EjecutorDB, catalogo: CatalogoProductos):
         super().__init__(parent)
         bring_to_front(self)
         self.db = db
-        self.productos = productos  # lista de dicts con id, nombre, stock, precio, codigo_barras
-        self.refresh_callback = refresh_callback
+        self.ejecutor = ejecutor
+        self.catalogo = catalogo
+        self.productos = catalogo.productos  # lista de dicts con id, nombre, stock, precio, codigo_barras
         self.title("Registrar Venta")
         self.geometry("900x520")
         self.configure(padx=12, pady=12)
@@ -294,23 +384,35 @@ class SaleWindow(ctk.CTkToplevel):
 
         # Left: disponibles
         ctk.CTkLabel(left, text="Productos disponibles").pack(anchor='n', pady=6)
-        self.lb_disponibles = tk.Listbox(left)
+        self.lb_disponibles = ListaVirtual(left, formato=_fila_producto, on_activate=self.agregar_al_carrito)
         self.lb_disponibles.pack(expand=True, fill='both', padx=6, pady=6)
-        for p in self.productos:
-            self.lb_disponibles.insert(tk.END, f"{p['nombre']} | stock: {p['stock']} | ${p['precio']}")
-        self.lb_disponibles.bind('<Double-Button-1>', self.agregar_al_carrito)
+        self.lb_disponibles.set_datos(self.productos)
 
-        # Right: carrito
+        # Right: carrito (se dibuja desde self.carrito; solo las filas visibles)
+        self.carrito = Carrito()
         ctk.CTkLabel(right, text="Carrito").pack(anchor='n', pady=6)
-        self.frame_items = ctk.CTkScrollableFrame(right)
-        self.frame_items.pack(expand=True, fill='both', padx=6, pady=6)
-        self.entradas_cant = {}
+        self.lb_carrito = ListaVirtual(right, formato=_fila_carrito, on_select=self._linea_seleccionada,
+                                       on_activate=lambda e: self.entry_cant.focus_set())
+        self.lb_carrito.pack(expand=True, fill='both', padx=6, pady=6)
+        self.lb_carrito.set_datos(self.carrito.lineas)
+        edicion = ctk.CTkFrame(right)
+        edicion.pack(fill='x', padx=6)
+        self.entry_cant = ctk.CTkEntry(edicion, width=70, placeholder_text='Cant.')
+        self.entry_cant.pack(side='left', padx=2, pady=4)
+        self.entry_cant.bind('<Return>', lambda e: self.fijar_cantidad())
+        ctk.CTkButton(edicion, text='Fijar', width=50, command=self.fijar_cantidad).pack(side='left', padx=2)
+        ctk.CTkButton(edicion, text='+1', width=40, command=lambda: self.sumar(1)).pack(side='left', padx=2)
+        ctk.CTkButton(edicion, text='-1', width=40, command=lambda: self.sumar(-1)).pack(side='left', padx=2)
+        ctk.CTkButton(edicion, text='Quitar', width=60, command=self.quitar_linea).pack(side='left', padx=2)
+        self.lbl_total = ctk.CTkLabel(right, text='', anchor='e')
+        self.lbl_total.pack(fill='x', padx=6, pady=4)
+        self._actualizar_total()
         # Botones
         btn_frame = ctk.CTkFrame(self)
         btn_frame.pack(fill='x', pady=6)
-        btn_confirm = ctk.CTkButton(btn_frame, text="Confirmar Venta", command=self.procesar_venta)
+        self.btn_confirm = ctk.CTkButton(btn_frame, text="Confirmar Venta", command=self.procesar_venta)
         btn_cancel = ctk.CTkButton(btn_frame, text="Cancelar", command=self.destroy)
-        btn_confirm.pack(side='left', expand=True, padx=8)
+        self.btn_confirm.pack(side='left', expand=True, padx=8)
         btn_cancel.pack(side='right', expand=True, padx=8)
 
     def agregar_por_cb(self, event=None):
@@ -318,81 +420,119 @@ class SaleWindow(ctk.CTkToplevel):
         self.entry_cb.delete(0, tk.END)
         if not codigo:
             return
-        producto = next((p for p in self.productos if (p.get('codigo_barras') or '') == codigo), None)
+        producto = self.catalogo.por_codigo(codigo)
         if not producto:
             messagebox.showerror("Error", f"Producto con código {codigo} no registrado")
             return
         self._agregar_item(producto)
 
     def agregar_al_carrito(self, event=None):
-        sel = self.lb_disponibles.curselection()
-        if not sel:
+        p = self.lb_disponibles.seleccionado()
+        if p is None:
             return
-        p = self.productos[sel[0]]
         self._agregar_item(p)
 
     def _agregar_item(self, producto):
-        # evita duplicados: si existe incrementa
-        for child in self.frame_items.winfo_children():
-            if getattr(child, 'producto_id', None) == producto['id']:
-                entry = self.entradas_cant[producto['id']]
-                entry.delete(0, tk.END)
-                entry.insert(0, str(int(entry.get() or '0') + 1))
-                return
-        fila = ctk.CTkFrame(self.frame_items)
-        fila.producto_id = producto['id']
-        fila.pack(fill='x', pady=6, padx=6)
-        lbl = ctk.CTkLabel(fila, text=producto['nombre'], anchor='w')
-        lbl.pack(side='left', expand=True)
-        e = ctk.CTkEntry(fila, width=80)
-        e.pack(side='right')
-        e.insert(0, '1')
-        self.entradas_cant[producto['id']] = e
+        # una línea por producto: escanear de nuevo suma 1
+        self.carrito.agregar(producto)
+        self.lb_carrito.seleccionar(self.carrito.posicion(producto['id']))
+        self._actualizar_total()
+
+    def _linea_seleccionada(self, event=None):
+        linea = self.lb_carrito.seleccionado()
+        if linea is not None:
+            self.entry_cant.delete(0, tk.END)
+            self.entry_cant.insert(0, str(linea['cantidad']))
+
+    def fijar_cantidad(self):
+        linea = self.lb_carrito.seleccionado()
+        if linea is None:
+            return
+        try:
+            cant = int(self.entry_cant.get())
+        except ValueError:
+            messagebox.showerror("Error", "Cantidades inválidas", parent=self)
+            return
+        self._cambiar_linea(linea['producto_id'], cant)
+
+    def sumar(self, paso):
+        linea = self.lb_carrito.seleccionado()
+        if linea is not None:
+            self._cambiar_linea(linea['producto_id'], linea['cantidad'] + paso)
+
+    def quitar_linea(self):
+        linea = self.lb_carrito.seleccionado()
+        if linea is not None:
+            self._cambiar_linea(linea['producto_id'], 0)
+
+    def _cambiar_linea(self, prod_id, cantidad):
+        self.carrito.fijar_cantidad(prod_id, cantidad)
+        if prod_id in self.carrito:
+            self.lb_carrito.refrescar()
+            self._linea_seleccionada()
+        else:
+            self.lb_carrito.set_datos(self.carrito.lineas, conservar_posicion=True)
+        self._actualizar_total()
+
+    def _actualizar_total(self):
+        self.lbl_total.configure(
+            text=f"{len(self.carrito)} líneas, {self.carrito.unidades} unidades   Total: ${self.carrito.total:.2f}"
+        )
 
     def procesar_venta(self):
-        lineas = []
-        total = 0.0
-        # Validar stocks
-        for pid, entry in self.entradas_cant.items():
-            try:
-                cant = int(entry.get())
-            except ValueError:
-                messagebox.showerror("Error", "Cantidades inválidas")
-                return
-            if cant <= 0:
-                continue
-            p = next((x for x in self.productos if x['id'] == pid), None)
-            if p is None:
-                continue
-            if cant > p['stock']:
-                messagebox.showerror("Error", f"Stock insuficiente para {p['nombre']}: disponible {p['stock']}, pedido {cant}")
-                return
-            subtotal = cant * float(p['precio'])
-            lineas.append({
-                'producto': p['nombre'],
-                'producto_id': p['id'],
-                'cantidad': cant,
-                'precio': float(p['precio']),
-                'subtotal': subtotal
-            })
-            total += subtotal
-
-        if total <= 0:
+        if not self.carrito.unidades:
             messagebox.showinfo("Venta", "No hay cantidades válidas")
             return
+        # Validar stocks
+        for linea in self.carrito:
+            p = self.catalogo.por_id(linea['producto_id'])
+            if p is not None and linea['cantidad'] > p['stock']:
+                messagebox.showerror("Error", f"Stock insuficiente para {p['nombre']}: disponible {p['stock']}, pedido {linea['cantidad']}")
+                return
+        lineas, total = self.carrito.para_venta()
+
+        # se confirma en el EjecutorDB; el botón queda deshabilitado para no registrarla dos veces
+        self.btn_confirm.configure(state='disabled')
+        self.ejecutor.enviar(
+            lambda db: db.create_venta(lineas, total),
+            on_ok=lambda venta_id: self._venta_ok(lineas, total),
+            on_error=self._venta_error,
+            ventana=self,
+        )
 
-        self.db.create_venta(lineas, total)
+    def _venta_ok(self, lineas, total):
+        # el stock nuevo llega al catálogo por el aviso de la venta (MainApp._al_cambiar)
         messagebox.showinfo("OK", f"Venta registrada por ${total:.2f}")
-        if self.refresh_callback:
-            self.refresh_callback()
         self.destroy()
 
+    def catalogo_actualizado(self, solo_actualizados):
+        # lo llama MainApp tras aplicar cambios al catálogo: se redibuja sin volver a leer
+        self.productos = self.catalogo.productos
+        if solo_actualizados:
+            self.lb_disponibles.refrescar()
+        else:
+            self.lb_disponibles.set_datos(self.productos, conservar_posicion=True)
+
+    def _venta_error(self, exc):
+        self.btn_confirm.configure(state='normal')
+        if not isinstance(exc, StockInsuficienteError):
+            messagebox.showerror("Error", f"No se pudo registrar la venta:\n{exc}")
+            return
+        # otra caja vendió antes: no se registró nada
+        for f in exc.faltantes:
+            self.catalogo.actualizar_stock(f['producto_id'], f['disponible'])
+        detalle = '\n'.join(f"{f['producto']}: disponible {f['disponible']}, pedido {f['pedido']}" for f in exc.faltantes)
+        messagebox.showerror("Error", f"Stock insuficiente, la venta no se registró:\n{detalle}")
+        self.lb_disponibles.refrescar()
+
 
 class HistoryWindow(ctk.CTkToplevel):
-    def __init__(self, parent, db: DBManager):
+    def __init__(self, parent, db: DBManager, ejecutor: EjecutorDB, tienda_id=None):
         super().__init__(parent)
         bring_to_front(self)
         self.db = db
+        self.ejecutor = ejecutor
+        self.tienda_id = tienda_id
         self.title("Historial de Ventas")
         self.geometry("860x480")
         self.configure(padx=12, pady=12)
@@ -405,9 +545,22 @@ class HistoryWindow(ctk.CTkToplevel):
         right.pack(side='right', expand=True, fill='both', padx=6, pady=6)
 
         ctk.CTkLabel(left, text='Ventas').pack(anchor='n', pady=6)
-        self.lb_ventas = tk.Listbox(left)
+        filtros = ctk.CTkFrame(left)
+        filtros.pack(fill='x', padx=6)
+        self.entry_desde = ctk.CTkEntry(filtros, width=100, placeholder_text='Desde AAAA-MM-DD')
+        self.entry_hasta = ctk.CTkEntry(filtros, width=100, placeholder_text='Hasta AAAA-MM-DD')
+        self.entry_min = ctk.CTkEntry(filtros, width=70, placeholder_text='Total mín')
+        self.entry_max = ctk.CTkEntry(filtros, width=70, placeholder_text='Total máx')
+        for e in (self.entry_desde, self.entry_hasta, self.entry_min, self.entry_max):
+            e.pack(side='left', padx=2, pady=4)
+            e.bind('<Return>', lambda ev: self.cargar_ventas())
+        self.var_sucursal = tk.BooleanVar(value=False)
+        ctk.CTkCheckBox(filtros, text='Solo esta sucursal', variable=self.var_sucursal,
+                        command=self.cargar_ventas).pack(side='left', padx=2)
+        ctk.CTkButton(filtros, text='Filtrar', width=60, command=self.cargar_ventas).pack(side='left', padx=2)
+        self.lb_ventas = ListaVirtual(left, formato=lambda v: f"{v['fecha']} | Total: ${v['total']}",
+                                      on_select=self.mostrar_detalle, on_fin=self._cargar_pagina)
         self.lb_ventas.pack(expand=True, fill='both', padx=6, pady=6)
-        self.lb_ventas.bind('<<ListboxSelect>>', self.mostrar_detalle)
 
         ctk.CTkLabel(right, text='Detalle').pack(anchor='n', pady=6)
         self.txt_detalle = ctk.CTkTextbox(right, width=1, height=1)
@@ -417,26 +570,98 @@ class HistoryWindow(ctk.CTkToplevel):
         btn_frame.pack(fill='x', pady=6)
         btn_del = ctk.CTkButton(btn_frame, text='Eliminar venta', command=self.eliminar_venta)
         btn_top = ctk.CTkButton(btn_frame, text='Top mensual', command=self.abrir_top)
+        btn_reportes = ctk.CTkButton(btn_frame, text='Reportes', command=self.abrir_reportes)
+        self.btn_exportar = ctk.CTkButton(btn_frame, text='Exportar...', command=self.exportar)
         btn_close = ctk.CTkButton(btn_frame, text='Cerrar', command=self.destroy)
         btn_del.pack(side='left', expand=True, padx=8)
         btn_top.pack(side='left', expand=True, padx=8)
+        if isinstance(db, DBManager):
+            # exporta y analiza leyendo la base directo: no disponible en modo caja
+            btn_reportes.pack(side='left', expand=True, padx=8)
+            self.btn_exportar.pack(side='left', expand=True, padx=8)
         btn_close.pack(side='right', expand=True, padx=8)
 
         self.ventas = []
+        self._items = {}        # venta_id -> ítems, precargados por página
+        self._filtros = {}
+        self._agotado = False   # ya no quedan páginas
+        self._cargando = False
+        self._cancelar_avisos = db.suscribir(ejecutor.en_tk(self._al_cambiar, ventana=self), tablas=('ventas',))
         self.cargar_ventas()
 
+    def destroy(self):
+        self._cancelar_avisos()
+        super().destroy()
+
+    def _leer_filtros(self):
+        filtros = {}
+        for clave, entry in (('desde', self.entry_desde), ('hasta', self.entry_hasta)):
+            texto = entry.get().strip()
+            if texto:
+                datetime.strptime(texto, '%Y-%m-%d')
+                filtros[clave] = texto
+        for clave, entry in (('total_min', self.entry_min), ('total_max', self.entry_max)):
+            texto = entry.get().strip()
+            if texto:
+                filtros[clave] = float(texto.replace(',', '.'))
+        if self.var_sucursal.get() and self.tienda_id is not None:
+            filtros['id_tienda'] = self.tienda_id
+        return filtros
+
     def cargar_ventas(self):
-        self.ventas = self.db.list_ventas()
-        self.lb_ventas.delete(0, tk.END)
-        for v in self.ventas:
-            self.lb_ventas.insert(tk.END, f"{v['fecha']} | Total: ${v['total']}")
+        # vuelve a la primera página (con los filtros actuales)
+        try:
+            self._filtros = self._leer_filtros()
+        except ValueError:
+            messagebox.showerror("Error", "Fechas como AAAA-MM-DD y totales numéricos", parent=self)
+            return
+        self.ventas = []
+        self._items = {}
+        self._agotado = False
+        self._cargando = False
+        self.txt_detalle.delete('0.0', tk.END)
+        self.lb_ventas.set_datos(self.ventas)
+        self._cargar_pagina()
+
+    def _cargar_pagina(self):
+        if self._cargando or self._agotado:
+            return
+        self._cargando = True
+        despues = (self.ventas[-1]['fecha'], self.ventas[-1]['id']) if self.ventas else None
+        filtros = dict(self._filtros)
+
+        def leer(db):
+            pagina = db.list_ventas_pagina(despues=despues, **filtros)
+            return pagina, db.list_items_by_ventas([v['id'] for v in pagina])
+
+        self.ejecutor.enviar(leer, on_ok=self._pagina_cargada, on_error=self._error,
+                             clave=('ventas', id(self)), ventana=self)
+
+    def _pagina_cargada(self, resultado):
+        pagina, items = resultado
+        self._cargando = False
+        self._agotado = len(pagina) < TAM_PAGINA_HISTORIAL
+        self.ventas.extend(pagina)
+        self._items.update(items)
+        self.lb_ventas.set_datos(self.ventas, conservar_posicion=True)
+
+    def _error(self, exc):
+        # sin esto _cargando quedaba en True y la lista no volvía a pedir páginas
+        self._cargando = False
+        messagebox.showerror("Error", f"No se pudo leer el historial: {exc}", parent=self)
 
     def mostrar_detalle(self, event=None):
         sel = self.lb_ventas.curselection()
         if not sel:
             return
-        venta = self.ventas[sel[0]]
-        items = self.db.list_items_by_venta(venta['id'])
+        venta_id = self.ventas[sel[0]]['id']
+        if venta_id in self._items:
+            self._mostrar_items(self._items[venta_id])
+            return
+        self.ejecutor.enviar(lambda db: db.list_items_by_venta(venta_id), on_ok=self._mostrar_items,
+                             clave=('detalle', id(self)), ventana=self)
+
+    def _mostrar_items(self, items):
         self.txt_detalle.delete('0.0', tk.END)
         if items:
             total_calc = 0.0
@@ -455,22 +680,107 @@ class HistoryWindow(ctk.CTkToplevel):
         venta = self.ventas[idx]
         if not messagebox.askyesno("Confirmar", f"¿Eliminar venta del {venta['fecha']}?"):
             return
-        self.db.delete_venta(venta['id'])
-        self.cargar_ventas()
         self.txt_detalle.delete('0.0', tk.END)
+        self.ejecutor.enviar(lambda db: db.delete_venta(venta['id']), on_ok=lambda _: self._venta_eliminada(venta),
+                             on_error=lambda exc: messagebox.showerror("Error", str(exc), parent=self),
+                             ventana=self)
+
+    def _venta_eliminada(self, venta):
+        # normalmente ya la quitó el aviso del borrado
+        self._quitar_ventas({venta['id']})
+
+    # ---- avisos de cambios: se parchean las filas en vez de releer el historial ----
+    def _al_cambiar(self, cambios):
+        if any(c.externo for c in cambios):
+            self.cargar_ventas()  # no se sabe qué ventas cambiaron
+            return
+        borradas = {vid for c in cambios for vid in c.borrados}
+        if borradas:
+            self._quitar_ventas(borradas)
+        nuevas = [vid for c in cambios for vid in c.insertados if vid not in borradas]
+        if nuevas:
+            filtros = dict(self._filtros)
+
+            def leer(db):
+                # solo las que cumplen los filtros actuales
+                ventas = db.list_ventas_pagina(ids=nuevas, limite=len(nuevas), **filtros)
+                return ventas, db.list_items_by_ventas([v['id'] for v in ventas])
+
+            self.ejecutor.enviar(leer, on_ok=self._agregar_ventas, ventana=self)
+
+    def _quitar_ventas(self, ids):
+        antes = len(self.ventas)
+        self.ventas[:] = [v for v in self.ventas if v['id'] not in ids]
+        if len(self.ventas) != antes:
+            for vid in ids:
+                self._items.pop(vid, None)
+            self.lb_ventas.set_datos(self.ventas, conservar_posicion=True)
+
+    def _agregar_ventas(self, resultado):
+        ventas, items = resultado
+        presentes = {v['id'] for v in self.ventas}
+        for v in ventas:
+            clave = (v['fecha'], v['id'])
+            if v['id'] in presentes:
+                continue
+            if not self._agotado and self.ventas and clave < (self.ventas[-1]['fecha'], self.ventas[-1]['id']):
+                continue  # cae después de lo cargado: llegará con su página
+            # las nuevas van casi siempre arriba: se busca el lugar desde el principio
+            i = next((k for k, w in enumerate(self.ventas) if (w['fecha'], w['id']) < clave), len(self.ventas))
+            self.ventas.insert(i, v)
+            self._items[v['id']] = items.get(v['id'], [])
+        self.lb_ventas.set_datos(self.ventas, conservar_posicion=True)
 
     def abrir_top(self):
-        TopWindow(self, self.db)
+        TopWindow(self, self.db, self.ejecutor)
+
+    def abrir_reportes(self):
+        ReportesWindow(self, self.db, self.ejecutor, self.tienda_id)
+
+    def exportar(self):
+        # ítems de las ventas que cumplen los filtros de fecha y sucursal (los de total no aplican)
+        try:
+            filtros = self._leer_filtros()
+        except ValueError:
+            messagebox.showerror("Error", "Fechas como AAAA-MM-DD y totales numéricos", parent=self)
+            return
+        ruta = filedialog.asksaveasfilename(
+            parent=self, title='Exportar ventas', defaultextension='.csv', initialfile='ventas.csv',
+            filetypes=[('CSV', '*.csv'), ('Excel', '*.xlsx'), ('Parquet', '*.parquet')]
+        )
+        if not ruta:
+            return
+        from easystock.exportacion import exportar_ventas
+        self.btn_exportar.configure(state='disabled', text='Exportando...')
+        self.ejecutor.enviar(
+            lambda db: exportar_ventas(db, ruta, desde=filtros.get('desde'), hasta=filtros.get('hasta'),
+                                       id_tienda=filtros.get('id_tienda')),
+            on_ok=lambda filas: self._exportado(ruta, filas),
+            on_error=self._exportar_error,
+            ventana=self,
+        )
+
+    def _exportado(self, ruta, filas):
+        self.btn_exportar.configure(state='normal', text='Exportar...')
+        messagebox.showinfo("Exportación", f"{filas} ítems exportados a\n{ruta}", parent=self)
+
+    def _exportar_error(self, exc):
+        self.btn_exportar.configure(state='normal', text='Exportar...')
+        if isinstance(exc, ImportError):
+            messagebox.showerror("Error", f"Falta instalar {exc.name} para ese formato", parent=self)
+        else:
+            messagebox.showerror("Error", f"No se pudo exportar:\n{exc}", parent=self)
 
 
 class TopWindow(ctk.CTkToplevel):
     MESES_ES = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
                 "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
 
-    def __init__(self, parent, db: DBManager):
+    def __init__(self, parent, db: DBManager, ejecutor: EjecutorDB):
         super().__init__(parent)
         bring_to_front(self)
         self.db = db
+        self.ejecutor = ejecutor
         self.mes_actual = datetime.now().replace(day=1)
         self.title("Top Productos del Mes")
         self.geometry("760x420")
@@ -511,7 +821,12 @@ class TopWindow(ctk.CTkToplevel):
     def actualizar_listbox(self):
         self.lbl_fecha.configure(text=f"{self.MESES_ES[self.mes_actual.month-1]} {self.mes_actual.year}")
         mes_str = self.mes_actual.strftime('%Y-%m')
-        unidades, ingresos = self.db.top_por_mes(mes_str)
+        # si se cambia de mes antes de que llegue el resultado, el pedido anterior se descarta
+        self.ejecutor.enviar(lambda db: db.top_por_mes(mes_str), on_ok=self._mostrar_top,
+                             clave=('top', id(self)), ventana=self)
+
+    def _mostrar_top(self, resultado):
+        unidades, ingresos = resultado
         self.lb_unidades.delete(0, tk.END)
         for u in unidades:
             self.lb_unidades.insert(tk.END, f"{u['producto']} | {int(u['total_vendido'])} unidades")
@@ -520,18 +835,322 @@ class TopWindow(ctk.CTkToplevel):
             self.lb_ingresos.insert(tk.END, f"{inc['producto']} | ${float(inc['ingresos']):.2f}")
 
 
+class ReportesWindow(ctk.CTkToplevel):
+    """Curvas de ventas, productos, sucursales y canasta de un rango, contra el período anterior.
+    Las cuentas las hace easystock.analitica (pandas) en el EjecutorDB."""
+    PERIODOS = {'Por día': 'dia', 'Por semana': 'semana', 'Por mes': 'mes'}
+    ANCHO_BARRA = 24
+
+    def __init__(self, parent, db: DBManager, ejecutor: EjecutorDB, tienda_id=None):
+        super().__init__(parent)
+        bring_to_front(self)
+        self.db = db
+        self.ejecutor = ejecutor
+        self.tienda_id = tienda_id
+        self.title("Reportes de ventas")
+        self.geometry("1000x560")
+        self.configure(padx=12, pady=12)
+
+        filtros = ctk.CTkFrame(self)
+        filtros.pack(fill='x', pady=6)
+        hoy = datetime.now()
+        self.entry_desde = ctk.CTkEntry(filtros, width=110, placeholder_text='Desde AAAA-MM-DD')
+        self.entry_hasta = ctk.CTkEntry(filtros, width=110, placeholder_text='Hasta AAAA-MM-DD')
+        self.entry_desde.insert(0, (hoy - timedelta(days=29)).strftime('%Y-%m-%d'))
+        self.entry_hasta.insert(0, hoy.strftime('%Y-%m-%d'))
+        for e in (self.entry_desde, self.entry_hasta):
+            e.pack(side='left', padx=2, pady=4)
+            e.bind('<Return>', lambda ev: self.actualizar())
+        self.opt_periodo = ctk.CTkOptionMenu(filtros, values=list(self.PERIODOS), width=120,
+                                             command=lambda _: self.actualizar())
+        self.opt_periodo.pack(side='left', padx=2)
+        self.var_sucursal = tk.BooleanVar(value=False)
+        ctk.CTkCheckBox(filtros, text='Solo esta sucursal', variable=self.var_sucursal,
+                        command=self.actualizar).pack(side='left', padx=2)
+        ctk.CTkButton(filtros, text='Actualizar', width=80, command=self.actualizar).pack(side='left', padx=2)
+
+        self.lbl_resumen = ctk.CTkLabel(self, text='Calculando...', justify='left', anchor='w')
+        self.lbl_resumen.pack(fill='x', padx=6, pady=4)
+
+        frame = ctk.CTkFrame(self)
+        frame.pack(expand=True, fill='both', pady=6)
+        frame.grid_rowconfigure(1, weight=1)
+        frame.grid_columnconfigure((0, 1, 2), weight=1)
+        ctk.CTkLabel(frame, text='Ingresos por período').grid(row=0, column=0, pady=4)
+        ctk.CTkLabel(frame, text='Productos (por ingresos)').grid(row=0, column=1, pady=4)
+        ctk.CTkLabel(frame, text='Sucursales y canasta').grid(row=0, column=2, pady=4)
+        self._max_ingresos = 0
+        self.lb_curva = ListaVirtual(frame, formato=self._fila_curva, font=("Consolas", 11))
+        self.lb_productos = ListaVirtual(
+            frame, formato=lambda p: f"{p['producto']} | {p['unidades']} u. | ${p['ingresos']:.2f}")
+        self.txt_detalle = ctk.CTkTextbox(frame, width=1, height=1)
+        self.lb_curva.grid(row=1, column=0, sticky='nsew', padx=6, pady=6)
+        self.lb_productos.grid(row=1, column=1, sticky='nsew', padx=6, pady=6)
+        self.txt_detalle.grid(row=1, column=2, sticky='nsew', padx=6, pady=6)
+
+        ctk.CTkButton(self, text='Cerrar', command=self.destroy).pack(pady=6)
+        self.actualizar()
+
+    def _fila_curva(self, c):
+        barra = round(c['ingresos'] / self._max_ingresos * self.ANCHO_BARRA) if self._max_ingresos else 0
+        return f"{c['periodo']} {'█' * barra:<{self.ANCHO_BARRA}} ${c['ingresos']:.2f} ({c['ventas']})"
+
+    def actualizar(self):
+        desde, hasta = self.entry_desde.get().strip(), self.entry_hasta.get().strip()
+        try:
+            datetime.strptime(desde, '%Y-%m-%d')
+            datetime.strptime(hasta, '%Y-%m-%d')
+        except ValueError:
+            messagebox.showerror("Error", "Fechas como AAAA-MM-DD", parent=self)
+            return
+        periodo = self.PERIODOS[self.opt_periodo.get()]
+        tid = self.tienda_id if self.var_sucursal.get() else None
+
+        def calcular(db):
+            # pandas se importa acá, en el hilo del ejecutor, y solo si se abren los reportes
+            from easystock.analitica import analitica
+            a = analitica(db)
+            return {
+                'comparacion': a.comparar(desde, hasta, tid),
+                'curva': a.curva(periodo, desde, hasta, tid),
+                'productos': a.productos(desde, hasta, tid),
+                'tiendas': a.por_tienda(desde, hasta),
+                'canastas': a.canastas(desde, hasta, tid),
+            }
+        self.lbl_resumen.configure(text='Calculando...')
+        self.ejecutor.enviar(calcular, on_ok=self._mostrar, on_error=self._error,
+                             clave=('reportes', id(self)), ventana=self)
+
+    def _mostrar(self, r):
+        act, ant, var = r['comparacion']['actual'], r['comparacion']['anterior'], r['comparacion']['variacion']
+
+        def cambio(clave):
+            return '' if var[clave] is None else f" ({var[clave]:+.1f} %)"
+        self.lbl_resumen.configure(text=(
+            f"Ventas: {act['ventas']}{cambio('ventas')}   Ingresos: ${act['ingresos']:.2f}{cambio('ingresos')}   "
+            f"Ticket promedio: ${act['ticket_promedio']:.2f}{cambio('ticket_promedio')}   "
+            f"Unidades por venta: {act['unidades_por_venta']}{cambio('unidades_por_venta')}\n"
+            f"Comparado con {ant['desde']} a {ant['hasta']}: {ant['ventas']} ventas, ${ant['ingresos']:.2f}"
+        ))
+        self._max_ingresos = max((c['ingresos'] for c in r['curva']), default=0)
+        self.lb_curva.set_datos(r['curva'])
+        self.lb_productos.set_datos(r['productos'])
+        self.txt_detalle.delete('0.0', tk.END)
+        self.txt_detalle.insert(tk.END, "Sucursales (todas):\n")
+        for t in r['tiendas']:
+            self.txt_detalle.insert(tk.END, f"  {t['tienda']}: {t['ventas']} ventas, ${t['ingresos']:.2f}, "
+                                            f"ticket ${t['ticket_promedio']:.2f}\n")
+        self.txt_detalle.insert(tk.END, "\nUnidades por venta -> ventas:\n")
+        for c in r['canastas']:
+            self.txt_detalle.insert(tk.END, f"  {c['unidades']}: {c['ventas']}\n")
+
+    def _error(self, exc):
+        if isinstance(exc, ImportError):
+            self.lbl_resumen.configure(text=f"Falta instalar {exc.name} para los reportes")
+        else:
+            self.lbl_resumen.configure(text=f"No se pudo calcular el reporte: {exc}")
+
+
+class StockBajoWindow(ctk.CTkToplevel):
+    """Productos que ya no llegan a su punto de pedido, según la demanda que se actualiza con
+    cada venta (easystock.reposicion); no recorre el historial de ventas."""
+
+    def __init__(self, parent, db: DBManager, ejecutor: EjecutorDB, tienda_id):
+        super().__init__(parent)
+        bring_to_front(self)
+        self.db = db
+        self.ejecutor = ejecutor
+        self.tienda_id = tienda_id
+        self.title("Stock bajo")
+        self.geometry("820x460")
+        self.configure(padx=12, pady=12)
+
+        opciones = ctk.CTkFrame(self)
+        opciones.pack(fill='x', pady=6)
+        # numpy (easystock.reposicion) recién al abrir la ventana, como pandas al importar
+        from easystock.reposicion import PLAZO_REPOSICION_DIAS
+        ctk.CTkLabel(opciones, text='Plazo de reposición (días):').pack(side='left', padx=4)
+        self.entry_plazo = ctk.CTkEntry(opciones, width=60)
+        self.entry_plazo.insert(0, str(PLAZO_REPOSICION_DIAS))
+        self.entry_plazo.pack(side='left', padx=4)
+        self.entry_plazo.bind('<Return>', lambda ev: self.actualizar())
+        self.var_todos = tk.BooleanVar(value=False)
+        ctk.CTkCheckBox(opciones, text='Mostrar todos los productos', variable=self.var_todos,
+                        command=self.actualizar).pack(side='left', padx=8)
+        ctk.CTkButton(opciones, text='Actualizar', width=80, command=self.actualizar).pack(side='left', padx=4)
+
+        self.lbl_resumen = ctk.CTkLabel(self, text='Calculando...', anchor='w')
+        self.lbl_resumen.pack(fill='x', padx=6)
+        self.lb_productos = ListaVirtual(self, formato=self._fila, font=("Arial", 13))
+        self.lb_productos.pack(expand=True, fill='both', padx=6, pady=6)
+        ctk.CTkButton(self, text='Cerrar', command=self.destroy).pack(pady=6)
+        self.actualizar()
+
+    @staticmethod
+    def _fila(p):
+        cobertura = 'sin ventas' if p['dias_cobertura'] is None else f"cubre {p['dias_cobertura']} días"
+        return (f"{'! ' if p['alerta'] else '  '}{p['nombre']} | stock: {p['stock']} | {p['demanda']}/día | "
+                f"{cobertura} | pedir en {p['punto_pedido']} | sugerido: {p['sugerido']}")
+
+    def actualizar(self):
+        try:
+            plazo = int(self.entry_plazo.get())
+        except ValueError:
+            messagebox.showerror("Error", "El plazo debe ser un número entero de días", parent=self)
+            return
+        tid, solo_alertas = self.tienda_id, not self.var_todos.get()
+
+        def calcular(db):
+            from easystock.reposicion import productos_a_reponer
+            return productos_a_reponer(db, tid, plazo=plazo, solo_alertas=solo_alertas)
+        self.ejecutor.enviar(calcular, on_ok=self._mostrar, on_error=self._error,
+                             clave=('stock_bajo', id(self)), ventana=self)
+
+    def _mostrar(self, filas):
+        alertas = sum(p['alerta'] for p in filas)
+        self.lbl_resumen.configure(text=f"{alertas} productos en o por debajo de su punto de pedido")
+        self.lb_productos.set_datos(filas)
+
+    def _error(self, exc):
+        if isinstance(exc, ImportError):
+            self.lbl_resumen.configure(text=f"Falta instalar {exc.name} para calcular la reposición")
+        else:
+            self.lbl_resumen.configure(text=f"No se pudo calcular la reposición: {exc}")
+
+
+class BuscarProductosWindow(ctk.CTkToplevel):
+    """Busca en el catálogo de todas las sucursales (o de una) con el índice de texto de la
+    base; los resultados llegan por páginas. Doble clic abre el producto en su sucursal."""
+
+    def __init__(self, parent, db: DBManager, ejecutor: EjecutorDB, on_elegir=None):
+        super().__init__(parent)
+        bring_to_front(self)
+        self.db = db
+        self.ejecutor = ejecutor
+        self.on_elegir = on_elegir
+        self.title("Buscar en sucursales")
+        self.geometry("820x480")
+        self.configure(padx=12, pady=12)
+
+        self.entry_texto = ctk.CTkEntry(self, placeholder_text='Nombre o código de barras...')
+        self.entry_texto.pack(fill='x', padx=6, pady=6)
+        self.entry_texto.bind('<KeyRelease>', self._tecla)
+        self.lbl_resumen = ctk.CTkLabel(self, text='', anchor='w')
+        self.lbl_resumen.pack(fill='x', padx=6)
+        self.lb_resultados = ListaVirtual(self, formato=self._fila, on_activate=self._elegir,
+                                          on_fin=self._cargar_pagina, font=("Arial", 13))
+        self.lb_resultados.pack(expand=True, fill='both', padx=6, pady=6)
+        ctk.CTkButton(self, text='Cerrar', command=self.destroy).pack(pady=6)
+
+        self.resultados = []
+        self._texto = ''
+        self._agotado = True
+        self._cargando = False
+        self._job = None
+        self.entry_texto.focus_set()
+
+    @staticmethod
+    def _fila(p):
+        codigo = f" | {p['codigo_barras']}" if p['codigo_barras'] else ''
+        return f"{p['nombre']} | {p['tienda'] or 'sin sucursal'} | stock: {p['stock']} | ${p['precio']}{codigo}"
+
+    def _tecla(self, event=None):
+        # debounce, como el filtro de la ventana principal
+        if self._job is not None:
+            self.after_cancel(self._job)
+        self._job = self.after(FILTRO_DEBOUNCE_MS, self.buscar)
+
+    def buscar(self):
+        self._job = None
+        self._texto = self.entry_texto.get().strip()
+        self.resultados = []
+        self._agotado = not self._texto
+        self._cargando = False
+        self.lbl_resumen.configure(text='')
+        self.lb_resultados.set_datos(self.resultados)
+        self._cargar_pagina()
+
+    def _cargar_pagina(self):
+        if self._cargando or self._agotado:
+            return
+        self._cargando = True
+        texto, offset = self._texto, len(self.resultados)
+        # misma clave para páginas y búsquedas nuevas: un texto nuevo descarta lo que estaba en curso
+        self.ejecutor.enviar(lambda db: db.buscar_productos(texto, limite=TAM_PAGINA_BUSQUEDA, offset=offset),
+                             on_ok=self._pagina_cargada, on_error=self._error,
+                             clave=('buscar', id(self)), ventana=self)
+
+    def _pagina_cargada(self, pagina):
+        self._cargando = False
+        self._agotado = len(pagina) < TAM_PAGINA_BUSQUEDA
+        self.resultados.extend(pagina)
+        self.lb_resultados.set_datos(self.resultados, conservar_posicion=True)
+        n = len(self.resultados)
+        self.lbl_resumen.configure(text=f"{n}{'' if self._agotado else '+'} productos" if n else 'Sin resultados')
+
+    def _error(self, exc):
+        self._cargando = False
+        self.lbl_resumen.configure(text=f"No se pudo buscar: {exc}")
+
+    def _elegir(self, event=None):
+        p = self.lb_resultados.seleccionado()
+        if p is not None and p['id_tienda'] is not None and self.on_elegir:
+            self.on_elegir(p)
+
+
 class MainApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, medir_arranque=False, servidor=None):
         super().__init__()
-        self.title("Easy Stock - Refactor")
+        self.medir_arranque = medir_arranque
+        self.codigo_salida = 0
+        self.title("Easy Stock - Refactor" + (f" (caja de {servidor})" if servidor else ""))
         self.geometry("1100x700")
         self.minsize(800, 600)
-        self.db = DBManager()
+        # el db del EjecutorDB comparte los avisos de cambios con self.db: lo que escribe uno
+        # lo ven los suscriptores del otro, y no cuenta como cambio externo
+        if servidor:
+            from easystock.cliente import ClienteDB
+            self.db = ClienteDB(servidor)
+            self.ejecutor = EjecutorDB(self, servidor, abrir=lambda url: ClienteDB(url, avisos=self.db.avisos))
+        else:
+            self.db = DBManager()
+            self.ejecutor = EjecutorDB(self, self.db.filename,
+                                       abrir=lambda f: DBManager(f, avisos=self.db.avisos))
         self.tienda_id = None
+        self.catalogo = None
         self.productos = []
+        self._visibles = []  # productos en el orden en que se muestran en lb_productos
+        self._filtro_job = None
+        self._ventas_abiertas = []  # SaleWindow que muestran el catálogo
+        self.db.suscribir(self.ejecutor.en_tk(self._al_cambiar), tablas=('productos',))
         self.contraseña_ok = False
         self._iniciar_ui()
+        # la ventana se pinta primero; el selector de sucursal y el catálogo vienen después
+        self._pintada = False
+        self.bind('<Map>', self._al_mapear, add='+')
+
+    def _al_mapear(self, event):
+        # <Map> llega también por cada widget hijo y al restaurar la ventana: cuenta una vez
+        if event.widget is not self or self._pintada:
+            return
+        self._pintada = True
+        self._primer_pintado()
+
+    def _primer_pintado(self):
+        self.update_idletasks()  # lo que quedaba por dibujar de la ventana recién mapeada
+        fin = time.time()
+        lanzamiento = os.environ.get('EASYSTOCK_T_LANZAMIENTO')
+        t0 = float(lanzamiento) if lanzamiento else _T_IMPORTS
+        tiempos = {'imports': round((_T_IMPORTS - t0) * 1000)} if lanzamiento else {}
+        tiempos['primer_pintado'] = round((fin - t0) * 1000)
+        if self.medir_arranque:
+            excedidos = [k for k, v in tiempos.items() if v > PRESUPUESTO_ARRANQUE_MS[k]]
+            print(json.dumps({'ms': tiempos, 'presupuesto_ms': PRESUPUESTO_ARRANQUE_MS, 'excedidos': excedidos}))
+            self.codigo_salida = 1 if excedidos else 0
+            self.on_closing()
+            return
         self.after(INACTIVITY_MS, self._pedir_contraseña_periodico)
+        self.after(REVISION_EXTERNA_MS, self._revisar_externos)
         self._seleccionar_tienda_inicio()
 
     # ------------------ UI principal ------------------
@@ -546,6 +1165,11 @@ class MainApp(ctk.CTk):
         self.entry_buscar = ctk.CTkEntry(header, placeholder_text='Buscar producto...')
         self.entry_buscar.grid(row=0, column=0, sticky='nsew', padx=8, pady=6)
         self.entry_buscar.bind('<KeyRelease>', self.filtrar_lista)
+        self.btn_stock_bajo = ctk.CTkButton(header, text='Stock bajo', width=150, command=self.abrir_stock_bajo)
+        self.btn_stock_bajo.grid(row=0, column=1, padx=8, pady=6)
+        self._color_stock_bajo = self.btn_stock_bajo.cget('fg_color')
+        ctk.CTkButton(header, text='Buscar en sucursales', width=170,
+                      command=self.abrir_buscar).grid(row=0, column=2, padx=8, pady=6)
 
         # Lista principal
         frame_central = ctk.CTkFrame(self)
@@ -553,20 +1177,21 @@ class MainApp(ctk.CTk):
         frame_central.grid_rowconfigure(0, weight=1)
         frame_central.grid_columnconfigure(0, weight=1)
 
-        self.lb_productos = tk.Listbox(frame_central, font=("Arial", 14))
+        self.lb_productos = ListaVirtual(frame_central, formato=_fila_producto, font=("Arial", 14))
         self.lb_productos.grid(row=0, column=0, sticky='nsew', padx=6, pady=6)
 
         # Botones inferiores
         btns = ctk.CTkFrame(self)
         btns.grid(row=2, column=0, columnspan=2, sticky='nsew', padx=12, pady=6)
-        btns.grid_columnconfigure(tuple(range(6)), weight=1)
+        btns.grid_columnconfigure(tuple(range(7)), weight=1)
 
         ctk.CTkButton(btns, text='Agregar producto', command=self.abrir_agregar).grid(row=0, column=0, padx=6, pady=6, sticky='nsew')
         ctk.CTkButton(btns, text='Cargar desde Excel', command=self.cargar_desde_excel).grid(row=0, column=1, padx=6, pady=6, sticky='nsew')
         ctk.CTkButton(btns, text='Modificar producto', command=self.abrir_modificar).grid(row=0, column=2, padx=6, pady=6, sticky='nsew')
         ctk.CTkButton(btns, text='Eliminar producto', command=self.eliminar_producto).grid(row=0, column=3, padx=6, pady=6, sticky='nsew')
-        ctk.CTkButton(btns, text='Registrar Venta', command=self.abrir_venta).grid(row=0, column=4, padx=6, pady=6, sticky='nsew')
-        ctk.CTkButton(btns, text='Historial de ventas', command=self.abrir_historial).grid(row=0, column=5, padx=6, pady=6, sticky='nsew')
+        ctk.CTkButton(btns, text='Cambios masivos', command=self.abrir_cambios_masivos).grid(row=0, column=4, padx=6, pady=6, sticky='nsew')
+        ctk.CTkButton(btns, text='Registrar Venta', command=self.abrir_venta).grid(row=0, column=5, padx=6, pady=6, sticky='nsew')
+        ctk.CTkButton(btns, text='Historial de ventas', command=self.abrir_historial).grid(row=0, column=6, padx=6, pady=6, sticky='nsew')
 
     # ------------------ Tienda selection ------------------
     def _seleccionar_tienda_inicio(self):
@@ -614,13 +1239,9 @@ class MainApp(ctk.CTk):
                 tid = next(x["id"] for x in tiendas if x["nombre"] == text)
                 if not messagebox.askyesno("Confirmar", f"Eliminar sucursal {text}? Se eliminarán todos sus productos."):
                     return
-                # eliminar productos asociados
-                prods = self.db.list_productos(tid)
-                for p in prods:
-                    self.db.delete_producto(p['id'])
-                # eliminar tienda
-                self.db.cursor.execute("DELETE FROM tiendas WHERE id = ?", (tid,))
-                self.db.conn.commit()
+                # sucursal y productos en una sola transacción
+                n = self.db.delete_tienda(tid)
+                messagebox.showinfo("Sucursal eliminada", f"{text}: {n} productos eliminados", parent=dlg)
                 # recargar lista
                 lb.delete(0, tk.END)
                 tiendas.clear()
@@ -649,75 +1270,198 @@ class MainApp(ctk.CTk):
 
     # ------------------ acciones UI ------------------
     def recargar_pagina(self):
-        self.productos = self.db.list_productos(self.tienda_id)
-        self._llenar_lista_productos()
+        # el catálogo ya está al día con las escrituras de DBManager: no vuelve a consultar SQLite
+        if self.catalogo is None or self.catalogo.id_tienda != self.tienda_id:
+            if not self.db.tiene_catalogo(self.tienda_id):
+                # primera vez para esta tienda: se lee en el EjecutorDB
+                self.catalogo = None
+                self.productos = []
+                self._llenar_lista_productos()
+                tid = self.tienda_id
+                self.ejecutor.enviar(lambda db: db.list_productos(tid),
+                                     on_ok=lambda filas: self._catalogo_cargado(tid, filas),
+                                     clave='catalogo')
+                return
+            self.catalogo = self.db.catalogo(self.tienda_id)
+        self.productos = self.catalogo.productos
+        self._llenar_lista_productos(self.entry_buscar.get())
+        self._actualizar_alertas()
+
+    def _actualizar_alertas(self):
+        # cuántos productos llegaron al punto de pedido; se pide de nuevo tras cada recarga (ventas, cambios)
+        tid = self.tienda_id
+
+        def contar(db):
+            from easystock.reposicion import productos_a_reponer
+            return len(productos_a_reponer(db, tid))
+        self.ejecutor.enviar(contar, on_ok=self._mostrar_alertas, on_error=lambda exc: None, clave='alertas')
+
+    def _mostrar_alertas(self, n):
+        self.btn_stock_bajo.configure(text=f'Stock bajo ({n})' if n else 'Stock bajo',
+                                      fg_color='#b22222' if n else self._color_stock_bajo)
+
+    def _catalogo_cargado(self, tid, filas):
+        self.db.catalogo(tid, productos=filas)
+        if tid == self.tienda_id:
+            self.recargar_pagina()
 
-    def _llenar_lista_productos(self, filtro=''):
-        self.lb_productos.delete(0, tk.END)
-        filtro = filtro.lower()
-        for p in self.productos:
-            detalle = f"{p['nombre']} | stock: {p['stock']} | ${p['precio']}"
-            if filtro in detalle.lower():
-                self.lb_productos.insert(tk.END, detalle)
+    def _llenar_lista_productos(self, filtro='', conservar_posicion=False):
+        self._visibles = self.catalogo.buscar(filtro) if self.catalogo else []
+        self.lb_productos.set_datos(self._visibles, conservar_posicion=conservar_posicion)
+
+    # ------------------ avisos de cambios ------------------
+    def _revisar_externos(self):
+        # en el EjecutorDB: en modo caja es un pedido HTTP. Si hubo algo, llega como aviso
+        self.ejecutor.enviar(lambda db: db.revisar_cambios(), on_error=lambda exc: None, clave='revisar')
+        self.after(REVISION_EXTERNA_MS, self._revisar_externos)
+
+    def _al_cambiar(self, cambios):
+        # las escrituras de self.db ya parchearon el catálogo; las demás se releen por id
+        if self.catalogo is None:
+            return
+        tid = self.tienda_id
+        if any(c.externo for c in cambios):
+            self.db.descartar_catalogos(excepto=tid)
+            self.ejecutor.enviar(lambda db: db.list_productos(tid),
+                                 on_ok=lambda filas: self._sincronizar(tid, filas), clave='sincronizar')
+            return
+        ajenos = {pid for c in cambios if c.origen is not self.db
+                  for pid in (*c.insertados, *c.actualizados, *c.borrados)}
+        if ajenos:
+            self.db.descartar_catalogos(excepto=tid)
+            self.ejecutor.enviar(lambda db: db.productos_por_ids(ajenos),
+                                 on_ok=lambda filas: self._sincronizar(tid, filas, ajenos))
+        propios = [c for c in cambios if c.origen is self.db]
+        if propios:
+            self._mostrar_cambios(not any(c.insertados or c.borrados for c in propios))
+
+    def _sincronizar(self, tid, filas, ids=None):
+        if self.catalogo is None or self.catalogo.id_tienda != tid:
+            return
+        insertados, actualizados, borrados = self.catalogo.sincronizar(filas, ids)
+        if insertados or actualizados or borrados:
+            self._mostrar_cambios(not insertados and not borrados)
+
+    def _mostrar_cambios(self, solo_actualizados):
+        # filas parchadas en el lugar: sin filtro ni altas/bajas alcanza con redibujar
+        self.productos = self.catalogo.productos
+        filtro = self.entry_buscar.get()
+        if solo_actualizados and not filtro.strip():
+            self.lb_productos.refrescar()
+        else:
+            self._llenar_lista_productos(filtro, conservar_posicion=True)
+        self._ventas_abiertas = [v for v in self._ventas_abiertas if v.winfo_exists()]
+        for v in self._ventas_abiertas:
+            v.catalogo_actualizado(solo_actualizados)
+        self._actualizar_alertas()
 
     def filtrar_lista(self, event=None):
-        texto = self.entry_buscar.get()
-        self._llenar_lista_productos(texto)
+        # debounce: solo se filtra cuando se deja de teclear
+        if self._filtro_job is not None:
+            self.after_cancel(self._filtro_job)
+        self._filtro_job = self.after(FILTRO_DEBOUNCE_MS, self._aplicar_filtro)
+
+    def _aplicar_filtro(self):
+        self._filtro_job = None
+        self._llenar_lista_productos(self.entry_buscar.get())
 
     def abrir_agregar(self):
-        AddEditProductWindow(self, self.db, self.tienda_id, callback=self.recargar_pagina)
+        AddEditProductWindow(self, self.db, self.tienda_id)
 
     def abrir_modificar(self):
         sel = self.lb_productos.curselection()
         if not sel:
             return
         idx = sel[0]
-        p = self.productos[idx]
-        AddEditProductWindow(self, self.db, self.tienda_id, producto=p, callback=self.recargar_pagina)
+        p = self._visibles[idx]
+        AddEditProductWindow(self, self.db, self.tienda_id, producto=p)
 
     def eliminar_producto(self):
         sel = self.lb_productos.curselection()
         if not sel:
             return
         idx = sel[0]
-        p = self.productos[idx]
+        p = self._visibles[idx]
         if not messagebox.askyesno("Confirmar", f"Eliminar {p['nombre']}?"):
             return
-        self.db.delete_producto(p['id'])
-        self.recargar_pagina()
+        self.db.delete_producto(p['id'])  # la lista se actualiza con el aviso del borrado
+
+    def abrir_cambios_masivos(self):
+        if self.tienda_id is None:
+            return
+        CambiosMasivosWindow(self, self.db, self.tienda_id, self._visibles, self.entry_buscar.get())
 
     def abrir_venta(self):
         if not self.productos:
             messagebox.showinfo("Info", "No hay productos cargados")
             return
-        SaleWindow(self, self.db, self.productos, refresh_callback=self.recargar_pagina)
+        self._ventas_abiertas.append(SaleWindow(self, self.db, self.ejecutor, self.catalogo))
+
+    def abrir_stock_bajo(self):
+        if self.tienda_id is None:
+            return
+        StockBajoWindow(self, self.db, self.ejecutor, self.tienda_id)
+
+    def abrir_buscar(self):
+        BuscarProductosWindow(self, self.db, self.ejecutor, on_elegir=self._ir_a_producto)
+
+    def _ir_a_producto(self, p):
+        # pasa a la sucursal del producto y lo deja filtrado en la lista principal
+        self.tienda_id = p['id_tienda']
+        self.entry_buscar.delete(0, tk.END)
+        self.entry_buscar.insert(0, p['nombre'])
+        self.recargar_pagina()
 
     def abrir_historial(self):
-        HistoryWindow(self, self.db)
+        HistoryWindow(self, self.db, self.ejecutor, self.tienda_id)
 
     def cargar_desde_excel(self):
+        from easystock.importacion import guardar_reporte_rechazados, importar_productos
+        ruta = filedialog.askopenfilename(
+            parent=self, title='Elegir archivo de productos',
+            filetypes=[('Excel o CSV', '*.xlsx *.xlsm *.xls *.csv'), ('Todos los archivos', '*.*')]
+        )
+        if not ruta:
+            return
+        dlg = ctk.CTkToplevel(self)
+        dlg.title('Importando productos')
+        dlg.geometry('360x90')
+        dlg.transient(self)
+        dlg.grab_set()
+        lbl = ctk.CTkLabel(dlg, text='Leyendo archivo...')
+        lbl.pack(expand=True, fill='both', padx=12, pady=12)
+
+        def progreso(leidas):
+            # solo se redibuja: update() procesaría clics y timers (p. ej. otra importación o
+            # la contraseña periódica) en medio de la transacción
+            lbl.configure(text=f'{leidas} filas procesadas...')
+            dlg.update_idletasks()
+
         try:
-            df = pd.read_excel('archivo.excel')
-            cols = [c.lower() for c in df.columns]
-            if not all(col in cols for col in ['nombre', 'stock', 'precio']):
-                messagebox.showerror('Error', 'Excel debe contener columnas: nombre, stock, precio (opcional: codigo_barras)')
-                return
-            for _, row in df.iterrows():
-                nombre = str(row['nombre'])
-                stock = int(row['stock'])
-                precio = float(row['precio'])
-                codigo = str(row['codigo_barras']) if 'codigo_barras' in df.columns else None
-                try:
-                    self.db.add_producto(nombre, stock, precio, self.tienda_id, codigo)
-                except sqlite3.IntegrityError:
-                    # saltar duplicados
-                    continue
-            self.recargar_pagina()
-            messagebox.showinfo('Éxito', 'Productos cargados desde Excel correctamente')
+            res = importar_productos(self.db, ruta, self.tienda_id, progreso=progreso)
         except FileNotFoundError:
-            messagebox.showerror('Error', 'No se encontró el archivo Control_Huevos_Mayorista.xlsx')
+            messagebox.showerror('Error', f'No se encontró el archivo {ruta}')
+            return
+        except ValueError as e:
+            messagebox.showerror('Error', str(e))
+            return
         except Exception as e:
-            messagebox.showerror('Error', f'Ocurrió un problema al leer el Excel:\n{e}')
+            messagebox.showerror('Error', f'Ocurrió un problema al leer el archivo:\n{e}')
+            return
+        finally:
+            dlg.destroy()
+
+        rechazados = res['rechazados']
+        resumen = f"Nuevos: {res['insertados']}\nActualizados: {res['actualizados']}\nRechazados: {len(rechazados)}"
+        if not rechazados:
+            messagebox.showinfo('Éxito', resumen)
+            return
+        detalle = '\n'.join(f'Fila {fila}: {motivo}' for fila, motivo in rechazados[:10])
+        if messagebox.askyesno('Importación con rechazos', f'{resumen}\n\n{detalle}\n\n¿Guardar el reporte completo de rechazos?'):
+            destino = filedialog.asksaveasfilename(parent=self, defaultextension='.csv',
+                                                   initialfile='rechazados.csv', filetypes=[('CSV', '*.csv')])
+            if destino:
+                guardar_reporte_rechazados(rechazados, destino)
 
     # ------------------ seguridad (contraseña periódica) ------------------
     def _pedir_contraseña_periodico(self):
@@ -737,11 +1481,16 @@ class MainApp(ctk.CTk):
         self.after(INACTIVITY_MS, self._pedir_contraseña_periodico)
 
     def on_closing(self):
+        self.ejecutor.cerrar()
         self.db.close()
         self.destroy()
 
 
 if __name__ == '__main__':
-    app = MainApp()
+    servidor = os.environ.get('EASYSTOCK_SERVIDOR')
+    if '--servidor' in sys.argv:
+        servidor = sys.argv[sys.argv.index('--servidor') + 1]
+    app = MainApp(medir_arranque='--medir-arranque' in sys.argv, servidor=servidor)
     app.protocol('WM_DELETE_WINDOW', app.on_closing)
     app.mainloop()
+    sys.exit(app.codigo_salida)
@@ -26,7 +26,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # descomprimir con UPX en cada arranque costaba más de lo que ahorraba
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -0,0 +1,11 @@
+"""Lógica de Easy Stock sin interfaz gráfica: base de datos, catálogo, carrito e importación.
+
+La GUI (EasyStock.py) y la línea de comandos (python -m easystock) usan este paquete.
+La importación desde Excel/CSV necesita pandas y se importa aparte (easystock.importacion).
+"""
+
+from .carrito import Carrito
+from .catalogo import CatalogoProductos, IndiceBusqueda
+from .db import DB_FILE, DBManager, StockInsuficienteError
+
+__all__ = ['Carrito', 'CatalogoProductos', 'IndiceBusqueda', 'DB_FILE', 'DBManager', 'StockInsuficienteError']
@@ -0,0 +1,127 @@
+"""Group commit: un hilo escritor que confirma juntas las escrituras que llegan a la vez."""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .cambios import Cambio
+
+
+# -------------------------
+# Group commit de escrituras
+# -------------------------
+class AgrupadorEscrituras:
+    """Hilo escritor: junta las escrituras pendientes y las confirma en una sola transacción.
+
+    Mientras un lote se confirma, las escrituras nuevas esperan en la cola y forman el
+    siguiente, así que con carga hay un solo fsync para muchas operaciones y sin carga no
+    se agrega demora. espera_ms > 0 retiene un poco el lote para juntar más. Cada operación
+    corre en su propio SAVEPOINT (ver GestorConexiones.transaccion): si falla se deshace
+    solo esa, y su Future recibe el resultado o la excepción recién después del COMMIT.
+
+    Las escrituras largas (importar, archivar, recalcular) van con enviar_sola(): corren en
+    el hilo escritor entre dos lotes, con su propia transacción. Así nunca toman el lock de
+    escritura desde otro hilo mientras un lote espera (y falla con "database is locked").
+    """
+
+    def __init__(self, db, lote_max=64, espera_ms=0):
+        self.db = db
+        self.lote_max = lote_max
+        self.espera = espera_ms / 1000
+        self.lotes = 0
+        self.escrituras = 0
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._cerrado = False
+        self._hilo = threading.Thread(target=self._trabajar, name='AgrupadorEscrituras', daemon=True)
+        self._hilo.start()
+
+    def enviar(self, fn, *args, **kwargs):
+        """Encola fn(*args, **kwargs) para el próximo lote; devuelve un Future."""
+        return self._encolar(fn, args, kwargs, False)
+
+    def enviar_sola(self, fn, *args, **kwargs):
+        """Como enviar, pero fn corre sola, fuera de la transacción de un lote (abre la suya)."""
+        return self._encolar(fn, args, kwargs, True)
+
+    def _encolar(self, fn, args, kwargs, sola):
+        fut = Future()
+        with self._lock:
+            if self._cerrado:
+                raise RuntimeError("el agrupador de escrituras ya se cerró")
+            self._cola.put((fut, fn, args, kwargs, sola))
+        return fut
+
+    def _trabajar(self):
+        fin = False
+        siguiente = None  # una operación sola que cortó el lote anterior
+        while not fin:
+            pedido, siguiente = siguiente or self._cola.get(), None
+            if pedido is None:
+                break
+            if pedido[4]:
+                self._correr_sola(pedido)
+                continue
+            lote = [pedido]
+            limite = time.monotonic() + self.espera
+            while len(lote) < self.lote_max:
+                restante = limite - time.monotonic()
+                try:
+                    pedido = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if pedido is None:
+                    fin = True
+                    break
+                if pedido[4]:
+                    siguiente = pedido
+                    break
+                lote.append(pedido)
+            self._confirmar(lote)
+
+    def _correr_sola(self, pedido):
+        fut, fn, args, kwargs, _ = pedido
+        try:
+            r = fn(*args, **kwargs)
+        except Exception as e:
+            fut.set_exception(e)
+            return
+        self.lotes += 1
+        self.escrituras += 1
+        fut.set_result(r)
+
+    def _confirmar(self, lote):
+        resultados = []
+        try:
+            with self.db.transaccion():
+                for fut, fn, args, kwargs, _ in lote:
+                    try:
+                        resultados.append((fn(*args, **kwargs), None))
+                    except Exception as e:
+                        resultados.append((None, e))
+        except Exception as e:
+            # falló el COMMIT: no quedó nada, y los catálogos ya tenían aplicados los cambios
+            for cat in list(self.db._catalogos.values()):
+                cat.cargar()
+            # y los avisos de lo deshecho no salieron: quien mire la base debe releer
+            self.db.avisos.emitir([Cambio(None)])
+            for fut, *_ in lote:
+                fut.set_exception(e)
+            return
+        self.lotes += 1
+        self.escrituras += len(lote)
+        for (fut, *_), (r, exc) in zip(lote, resultados):
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(r)
+
+    def cerrar(self):
+        # confirma lo que ya estaba encolado
+        with self._lock:
+            if self._cerrado:
+                return
+            self._cerrado = True
+            self._cola.put(None)
+        self._hilo.join()
@@ -0,0 +1,276 @@
+"""Análisis del historial de ventas con NumPy/pandas, usable sin GUI.
+
+El historial completo (base activa y archivos) se lee una sola vez a columnas y todas las
+cuentas (curvas por día/semana/mes, canasta, unidades por producto, sucursales, comparación
+entre períodos) son group-bys vectorizados sobre esas columnas. Las columnas y los resultados
+quedan en caché hasta que cambia DBManager.version_datos(), es decir, hasta que alguien
+confirma una escritura en la base.
+"""
+
+import weakref
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+PERIODOS = {'dia': 'D', 'semana': 'W-MON', 'mes': 'MS'}
+MAX_RESULTADOS_CACHE = 256
+
+_POR_DB = weakref.WeakKeyDictionary()
+
+
+def analitica(db):
+    """La AnaliticaVentas de `db` (una por instancia, así la caché sobrevive entre reportes)."""
+    a = _POR_DB.get(db)
+    if a is None:
+        a = _POR_DB[db] = AnaliticaVentas(db)
+    return a
+
+
+def _tabla(lotes, columnas):
+    # lotes de tuplas -> un DataFrame (from_records arma las columnas en C, sin zip por fila)
+    partes = [pd.DataFrame.from_records(lote, columns=columnas) for lote in lotes]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=columnas)
+
+
+def _variacion(actual, anterior):
+    # en %; None si no hay base para comparar
+    if not anterior:
+        return None
+    return round((actual - anterior) / anterior * 100, 1)
+
+
+class AnaliticaVentas:
+    """Reportes de ventas sobre columnas en memoria.
+
+    Todos los métodos aceptan desde/hasta ('YYYY-MM-DD', ambas inclusive, o None para no
+    acotar) y la mayoría id_tienda; devuelven dicts o listas de dicts, como DBManager.
+    Como DBManager, cada hilo debe usar la suya (ver analitica()).
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._version = None
+        self._archivos = None  # [(anio, ventas)] de los archivos que había en la última lectura completa
+        self._ventas = None    # una fila por venta, en orden cronológico
+        self._items = None     # una fila por ítem, con pos = fila de su venta en _ventas, ordenados por pos
+        self._resultados = {}
+
+    # ---- carga ----
+    def _datos(self):
+        version = self.db.version_datos()
+        if version != self._version:
+            self._actualizar()
+            self._version = version
+        return self._ventas, self._items
+
+    def _actualizar(self):
+        archivos = [(a['anio'], a['ventas']) for a in self.db.archivos_ventas()]
+        if self._ventas is not None and archivos == self._archivos and len(self._ventas):
+            # si no se borró ninguna venta ya leída, alcanza con leer las nuevas
+            max_id = int(self._ventas['venta_id'].max())
+            en_activa = len(self._ventas) - sum(n for _, n in archivos)
+            if self.db.conteo_ventas(max_id)[0] == en_activa:
+                ventas, items = self._leer(max_id)
+                if len(ventas) or len(items):
+                    self._armar(pd.concat([self._ventas[ventas.columns], ventas], ignore_index=True),
+                                self._concatenar_items(self._items[items.columns], items))
+                return
+        self._archivos = archivos
+        self._armar(*self._leer())
+
+    def _leer(self, despues_id=None):
+        # columnas crudas: las ventas y sus ítems se leen por separado y se unen en _armar
+        ventas = _tabla(self.db.lotes_ventas(despues_id), ['venta_id', 'fecha', 'id_tienda', 'total'])
+        items = _tabla(self.db.lotes_items_ventas(despues_id), ['venta_id', 'producto', 'cantidad', 'subtotal'])
+        return (
+            pd.DataFrame({
+                'venta_id': ventas['venta_id'].astype(np.int64),
+                'fecha': ventas['fecha'].to_numpy(dtype=object).astype('datetime64[s]'),
+                'id_tienda': ventas['id_tienda'].astype('Int64'),
+                'total': ventas['total'].astype(np.float64),
+            }),
+            pd.DataFrame({
+                'venta_id': items['venta_id'].astype(np.int64),
+                'producto': pd.Categorical(items['producto'].to_numpy(dtype=object)),
+                'cantidad': items['cantidad'].astype(np.int64),
+                'subtotal': items['subtotal'].astype(np.float64),
+            }),
+        )
+
+    @staticmethod
+    def _concatenar_items(a, b):
+        # pd.concat de dos categóricas distintas daría object: se unen las categorías
+        producto = union_categoricals([a['producto'].array, b['producto'].array])
+        items = pd.concat([a.drop(columns='producto'), b.drop(columns='producto')], ignore_index=True)
+        items['producto'] = producto
+        return items
+
+    def _armar(self, ventas, items):
+        """Ordena las ventas por fecha, ubica cada ítem en su venta (pos) y calcula unidades y
+        líneas por venta; todo con operaciones sobre arreglos."""
+        fechas = ventas['fecha'].to_numpy()
+        if len(fechas) > 1 and (fechas[1:] < fechas[:-1]).any():
+            ventas = ventas.iloc[np.lexsort((ventas['venta_id'].to_numpy(), fechas))].reset_index(drop=True)
+        ids = ventas['venta_id'].to_numpy()
+        if not len(ids):
+            # sin ventas no hay dónde ubicar ningún ítem (orden[k] fallaría con orden vacío)
+            items = items.iloc[0:0]
+        orden = np.argsort(ids, kind='stable')
+        k = np.minimum(np.searchsorted(ids[orden], items['venta_id'].to_numpy()), max(len(ids) - 1, 0))
+        # ítems de ventas que no se leyeron (borradas o agregadas entre una lectura y otra) quedan afuera
+        validos = ids[orden][k] == items['venta_id'].to_numpy()
+        pos = orden[k][validos]
+        items = items[validos].copy()
+        items['pos'] = pos
+        items = items.iloc[np.argsort(pos, kind='stable')].reset_index(drop=True)
+        pos = items['pos'].to_numpy()
+        items['id_tienda'] = ventas['id_tienda'].array[pos]
+        ventas = ventas.assign(
+            unidades=np.bincount(pos, weights=items['cantidad'].to_numpy(), minlength=len(ventas)).astype(np.int64),
+            lineas=np.bincount(pos, minlength=len(ventas)),
+        )
+        self._ventas, self._items = ventas, items
+        self._resultados.clear()
+
+    def _memo(self, clave, calcular):
+        self._datos()  # recarga (y vacía la caché) si cambió la base
+        if clave not in self._resultados:
+            if len(self._resultados) >= MAX_RESULTADOS_CACHE:
+                self._resultados.clear()
+            self._resultados[clave] = calcular()
+        return self._resultados[clave]
+
+    def _rango(self, desde, hasta):
+        # las ventas están ordenadas por fecha: el rango es un slice [i, j) por búsqueda binaria
+        fechas = self._ventas['fecha'].to_numpy()
+        i = np.searchsorted(fechas, np.datetime64(desde), 'left') if desde else 0
+        j = np.searchsorted(fechas, np.datetime64(hasta) + np.timedelta64(1, 'D'), 'left') if hasta else len(fechas)
+        return i, j
+
+    def _recortar_ventas(self, desde, hasta, id_tienda=None):
+        i, j = self._rango(desde, hasta)
+        return self._de_tienda(self._ventas.iloc[i:j], id_tienda)
+
+    def _recortar_items(self, desde, hasta, id_tienda=None):
+        i, j = self._rango(desde, hasta)
+        pos = self._items['pos'].to_numpy()
+        return self._de_tienda(self._items.iloc[np.searchsorted(pos, i):np.searchsorted(pos, j)], id_tienda)
+
+    @staticmethod
+    def _de_tienda(df, id_tienda):
+        if id_tienda is None:
+            return df
+        return df[(df['id_tienda'] == id_tienda).fillna(False).to_numpy(dtype=bool)]
+
+    # ---- reportes ----
+    def resumen(self, desde=None, hasta=None, id_tienda=None):
+        """Ventas, ingresos, ticket promedio, unidades y tamaño de canasta del rango."""
+        def calcular():
+            v = self._recortar_ventas(desde, hasta, id_tienda)
+            n = len(v)
+            ingresos = float(v['total'].sum())
+            return {
+                'ventas': n,
+                'ingresos': round(ingresos, 2),
+                'ticket_promedio': round(ingresos / n, 2) if n else 0.0,
+                'unidades': int(v['unidades'].sum()),
+                'unidades_por_venta': round(float(v['unidades'].mean()), 2) if n else 0.0,
+                'lineas_por_venta': round(float(v['lineas'].mean()), 2) if n else 0.0,
+            }
+        return self._memo(('resumen', desde, hasta, id_tienda), calcular)
+
+    def curva(self, periodo='dia', desde=None, hasta=None, id_tienda=None):
+        """Ventas, ingresos, unidades y ticket promedio por día, semana (desde el lunes) o mes.
+        Los períodos sin ventas aparecen en 0, así la curva no tiene huecos."""
+        if periodo not in PERIODOS:
+            raise ValueError(f"Período desconocido: '{periodo}'. Use {', '.join(PERIODOS)}")
+
+        def calcular():
+            v = self._recortar_ventas(desde, hasta, id_tienda)
+            if v.empty and not (desde and hasta):
+                return []
+            dias = v['fecha'].dt.normalize()
+            if periodo == 'semana':
+                clave = dias - pd.to_timedelta(dias.dt.weekday, unit='D')
+            elif periodo == 'mes':
+                clave = dias.dt.to_period('M').dt.start_time
+            else:
+                clave = dias
+            g = v.groupby(clave.to_numpy()).agg(ventas=('venta_id', 'size'), ingresos=('total', 'sum'),
+                                                unidades=('unidades', 'sum'))
+            inicio = pd.Timestamp(desde) if desde else g.index.min()
+            fin = pd.Timestamp(hasta) if hasta else g.index.max()
+            if periodo == 'semana':
+                inicio -= pd.Timedelta(days=inicio.weekday())
+            elif periodo == 'mes':
+                inicio = inicio.replace(day=1)
+            g = g.reindex(pd.date_range(inicio, fin, freq=PERIODOS[periodo]), fill_value=0)
+            ticket = np.divide(g['ingresos'].to_numpy(), g['ventas'].to_numpy(),
+                               out=np.zeros(len(g)), where=g['ventas'].to_numpy() > 0)
+            return [
+                {'periodo': p.strftime('%Y-%m-%d'), 'ventas': int(n), 'ingresos': round(float(i), 2),
+                 'unidades': int(u), 'ticket_promedio': round(float(t), 2)}
+                for p, n, i, u, t in zip(g.index, g['ventas'], g['ingresos'], g['unidades'], ticket)
+            ]
+        return self._memo(('curva', periodo, desde, hasta, id_tienda), calcular)
+
+    def productos(self, desde=None, hasta=None, id_tienda=None, orden='ingresos', limite=None):
+        """Unidades, ingresos y cantidad de ventas por producto, de mayor a menor según `orden`."""
+        if orden not in ('ingresos', 'unidades'):
+            raise ValueError("orden debe ser 'ingresos' o 'unidades'")
+
+        def calcular():
+            it = self._recortar_items(desde, hasta, id_tienda)
+            g = it.groupby('producto', observed=True).agg(
+                unidades=('cantidad', 'sum'), ingresos=('subtotal', 'sum'), ventas=('venta_id', 'nunique'))
+            g = g.sort_values([orden, 'unidades' if orden == 'ingresos' else 'ingresos'], ascending=False)
+            return [
+                {'producto': p, 'unidades': int(u), 'ingresos': round(float(i), 2), 'ventas': int(n)}
+                for p, u, i, n in zip(g.index, g['unidades'], g['ingresos'], g['ventas'])
+            ]
+        filas = self._memo(('productos', desde, hasta, id_tienda, orden), calcular)
+        return filas[:limite] if limite else filas
+
+    def canastas(self, desde=None, hasta=None, id_tienda=None):
+        """Distribución del tamaño de canasta: cuántas ventas llevaron 1, 2, 3... unidades."""
+        def calcular():
+            v = self._recortar_ventas(desde, hasta, id_tienda)
+            conteo = np.bincount(v['unidades'].to_numpy()) if len(v) else np.empty(0, np.int64)
+            return [{'unidades': int(u), 'ventas': int(n)} for u, n in enumerate(conteo) if n]
+        return self._memo(('canastas', desde, hasta, id_tienda), calcular)
+
+    def por_tienda(self, desde=None, hasta=None):
+        """Ventas, ingresos, ticket promedio y unidades por sucursal (id_tienda None: sucursal
+        borrada o ventas anteriores a que se registrara)."""
+        def calcular():
+            v = self._recortar_ventas(desde, hasta)
+            g = v.groupby('id_tienda', dropna=False).agg(
+                ventas=('venta_id', 'size'), ingresos=('total', 'sum'), unidades=('unidades', 'sum'))
+            g = g.sort_values('ingresos', ascending=False)
+            nombres = {t['id']: t['nombre'] for t in self.db.list_tiendas()}
+            filas = []
+            for tid, n, i, u in zip(g.index, g['ventas'], g['ingresos'], g['unidades']):
+                tid = None if pd.isna(tid) else int(tid)
+                filas.append({'id_tienda': tid, 'tienda': nombres.get(tid, 'sin sucursal'), 'ventas': int(n),
+                              'ingresos': round(float(i), 2), 'ticket_promedio': round(float(i) / n, 2),
+                              'unidades': int(u)})
+            return filas
+        return self._memo(('por_tienda', desde, hasta), calcular)
+
+    def comparar(self, desde, hasta, id_tienda=None):
+        """resumen() del rango contra el del período anterior de igual largo, con la variación en %."""
+        d = datetime.strptime(desde, '%Y-%m-%d')
+        h = datetime.strptime(hasta, '%Y-%m-%d')
+        if h < d:
+            raise ValueError("hasta es anterior a desde")
+        h_ant = d - timedelta(days=1)
+        d_ant = h_ant - (h - d)
+        actual = self.resumen(desde, hasta, id_tienda)
+        anterior = self.resumen(d_ant.strftime('%Y-%m-%d'), h_ant.strftime('%Y-%m-%d'), id_tienda)
+        return {
+            'actual': {'desde': desde, 'hasta': hasta, **actual},
+            'anterior': {'desde': d_ant.strftime('%Y-%m-%d'), 'hasta': h_ant.strftime('%Y-%m-%d'), **anterior},
+            'variacion': {k: _variacion(actual[k], anterior[k]) for k in actual},
+        }
@@ -0,0 +1,242 @@
+"""Benchmarks reproducibles de DBManager con datos sintéticos.
+
+Uso:
+  python -m easystock.bench [--escalas chico mediano] [--seed 42] [--salida resultados.json]
+                            [--comparar base.json] [--tolerancia 0.25]
+
+Cada escala genera (con semilla fija) una base nueva con N sucursales, M productos y K ventas,
+mide las operaciones de DBManager y guarda medianas/p95 en JSON. Con --comparar se marcan
+como regresión las operaciones cuya mediana supera a la de la base en más de la tolerancia,
+y el proceso sale con código 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from .db import DBManager
+from .exportacion import exportar_ventas
+
+ESCALAS = {
+    'chico': {'tiendas': 2, 'productos': 1_000, 'ventas': 5_000},
+    'mediano': {'tiendas': 5, 'productos': 20_000, 'ventas': 100_000},
+    'grande': {'tiendas': 10, 'productos': 100_000, 'ventas': 1_000_000},
+}
+MESES_HISTORIA = 24
+FILAS_EXCEL = {'chico': 1_000, 'mediano': 20_000, 'grande': 100_000}
+
+
+# -------------------------
+# Generador de datos
+# -------------------------
+def generar_datos(db, tiendas, productos, ventas, seed=42, meses=MESES_HISTORIA):
+    """Carga datos sintéticos directamente con executemany (no pasa por create_venta).
+
+    Popularidad de productos tipo Zipf, 1 a 15 ítems por venta (la mayoría 1-4) y fechas
+    repartidas en `meses` meses con más ventas de día que de noche.
+    Devuelve {'tiendas': [ids], 'codigos': [códigos de barras], 'meses': ['YYYY-MM', ...]}.
+    """
+    rnd = random.Random(seed)
+    cur = db.conn.cursor()
+    cur.execute("BEGIN")
+    cur.executemany("INSERT INTO tiendas (nombre) VALUES (?)", [(f"Sucursal {i + 1}",) for i in range(tiendas)])
+    ids_tienda = [r[0] for r in cur.execute("SELECT id FROM tiendas ORDER BY id")]
+
+    filas = []
+    for i in range(productos):
+        codigo = f"779{i:010d}"
+        filas.append((f"Producto {i} {rnd.choice(['x1', 'x6', '500g', '1kg', '1.5L'])}",
+                      rnd.randint(1_000, 100_000), round(rnd.uniform(50, 5_000), 2),
+                      ids_tienda[i % tiendas], codigo))
+    cur.executemany(
+        "INSERT INTO productos (nombre, stock, precio, id_tienda, codigo_barras) VALUES (?, ?, ?, ?, ?)", filas
+    )
+    catalogo = [tuple(r) for r in cur.execute("SELECT id, nombre, precio, id_tienda FROM productos ORDER BY id")]
+    pesos = [1 / (rango + 1) for rango in range(len(catalogo))]
+
+    fin = datetime(2026, 1, 1)
+    inicio = fin - timedelta(days=30 * meses)
+    segundos = int((fin - inicio).total_seconds())
+    lote_ventas, lote_items = [], []
+    venta_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM ventas").fetchone()[0]
+    for _ in range(ventas):
+        venta_id += 1
+        fecha = inicio + timedelta(seconds=rnd.randrange(segundos))
+        if fecha.hour < 8 and rnd.random() < 0.8:
+            fecha += timedelta(hours=10)
+        n_items = min(15, 1 + int(rnd.expovariate(0.5)))
+        total = 0.0
+        elegidos = rnd.choices(catalogo, weights=pesos, k=n_items)
+        for pid, nombre, precio, _ in elegidos:
+            cant = rnd.randint(1, 5)
+            sub = round(cant * precio, 2)
+            total += sub
+            lote_items.append((venta_id, nombre, cant, precio, sub, pid))
+        lote_ventas.append((venta_id, round(total, 2), fecha.strftime('%Y-%m-%d %H:%M:%S'), elegidos[0][3]))
+        if len(lote_ventas) >= 10_000:
+            _volcar_ventas(cur, lote_ventas, lote_items)
+    _volcar_ventas(cur, lote_ventas, lote_items)
+    db.conn.commit()
+    db.recalcular_ventas_mes()
+    db.recalcular_demanda()
+    cur.execute("ANALYZE")
+    db.conn.commit()
+
+    meses_str = sorted({r[0] for r in cur.execute("SELECT DISTINCT mes FROM ventas_mes")})
+    return {'tiendas': ids_tienda, 'codigos': [f[4] for f in filas], 'meses': meses_str}
+
+
+def _volcar_ventas(cur, lote_ventas, lote_items):
+    cur.executemany("INSERT INTO ventas (id, total, fecha, id_tienda) VALUES (?, ?, ?, ?)", lote_ventas)
+    cur.executemany("INSERT INTO venta_items (venta_id, producto, cantidad, precio, subtotal, producto_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", lote_items)
+    lote_ventas.clear()
+    lote_items.clear()
+
+
+def generar_excel(ruta, filas, seed=42):
+    from openpyxl import Workbook
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(['nombre', 'stock', 'precio', 'codigo_barras'])
+    for i in range(filas):
+        ws.append([f"Importado {i}", rnd.randint(0, 500), round(rnd.uniform(10, 900), 2), f"880{i:010d}"])
+    wb.save(ruta)
+
+
+# -------------------------
+# Medición
+# -------------------------
+def _medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t) * 1000)
+    tiempos.sort()
+    return {
+        'n': repeticiones,
+        'mediana_ms': round(statistics.median(tiempos), 4),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 4),
+        'max_ms': round(tiempos[-1], 4),
+    }
+
+
+def correr_escala(nombre, params, seed, directorio):
+    ruta = os.path.join(directorio, f"bench_{nombre}.db")
+    db = DBManager(ruta)
+    rnd = random.Random(seed + 1)
+    t = time.perf_counter()
+    datos = generar_datos(db, seed=seed, **params)
+    resultado = {'parametros': params, 'generacion_s': round(time.perf_counter() - t, 2), 'operaciones': {}}
+    ops = resultado['operaciones']
+    tienda = datos['tiendas'][0]
+
+    ops['list_productos'] = _medir(lambda: db.list_productos(tienda), 5)
+
+    def cargar_catalogo():
+        db._catalogos.pop(tienda, None)
+        db.catalogo(tienda)
+    ops['catalogo_carga'] = _medir(cargar_catalogo, 3)
+    cat = db.catalogo(tienda)
+    codigos = [p['codigo_barras'] for p in cat.productos]
+    ops['buscar_codigo'] = _medir(lambda: cat.por_codigo(rnd.choice(codigos)), 2_000)
+    ops['buscar_codigo_sql'] = _medir(lambda: db.conn.execute(
+        "SELECT id FROM productos WHERE codigo_barras = ?", (rnd.choice(codigos),)).fetchone(), 500)
+
+    productos = cat.productos
+
+    def venta():
+        lineas = []
+        for p in rnd.sample(productos, k=min(len(productos), rnd.randint(1, 6))):
+            cant = rnd.randint(1, 3)
+            lineas.append({'producto': p['nombre'], 'producto_id': p['id'], 'cantidad': cant,
+                           'precio': p['precio'], 'subtotal': cant * p['precio']})
+        db.create_venta(lineas, sum(l['subtotal'] for l in lineas))
+    ops['create_venta'] = _medir(venta, 200)
+
+    ops['list_ventas'] = _medir(db.list_ventas, 3)
+    ops['list_ventas_pagina'] = _medir(lambda: db.list_ventas_pagina(), 20)
+    max_id = db.conn.execute("SELECT MAX(id) FROM ventas").fetchone()[0]
+    ops['list_items_by_venta'] = _medir(lambda: db.list_items_by_venta(rnd.randint(1, max_id)), 500)
+    ops['top_por_mes'] = _medir(lambda: db.top_por_mes(rnd.choice(datos['meses'])), 50)
+    ruta_csv = os.path.join(directorio, f"bench_{nombre}.csv")
+    ops['exportar_csv'] = _medir(lambda: exportar_ventas(db, ruta_csv), 1)
+    ids = rnd.sample(range(1, max_id + 1), k=min(200, max_id))
+    ops['delete_venta'] = _medir(lambda: db.delete_venta(ids.pop()), len(ids))
+
+    try:
+        from .importacion import importar_productos
+        ruta_xlsx = os.path.join(directorio, f"bench_{nombre}.xlsx")
+        generar_excel(ruta_xlsx, FILAS_EXCEL.get(nombre, 1_000), seed)
+        ops['importar_excel'] = _medir(lambda: importar_productos(db, ruta_xlsx, datos['tiendas'][-1]), 1)
+    except ImportError as e:
+        ops['importar_excel'] = {'omitido': f"falta dependencia: {e.name}"}
+    db.close()
+    return resultado
+
+
+def comparar(actual, base, tolerancia):
+    # devuelve [(escala, operación, mediana base, mediana actual)] de las que empeoraron
+    regresiones = []
+    for escala, res in actual['escalas'].items():
+        ops_base = base.get('escalas', {}).get(escala, {}).get('operaciones', {})
+        for op, m in res['operaciones'].items():
+            b = ops_base.get(op, {})
+            if 'mediana_ms' in m and 'mediana_ms' in b and m['mediana_ms'] > b['mediana_ms'] * (1 + tolerancia):
+                regresiones.append((escala, op, b['mediana_ms'], m['mediana_ms']))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='easystock.bench', description='Benchmarks de DBManager')
+    parser.add_argument('--escalas', nargs='+', choices=list(ESCALAS), default=['chico'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--salida', help='guardar resultados en este JSON')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='empeoramiento admitido (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    resultados = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'seed': args.seed,
+        'escalas': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='easystock_bench_') as directorio:
+        for nombre in args.escalas:
+            print(f"[{nombre}] generando y midiendo...", file=sys.stderr)
+            resultados['escalas'][nombre] = correr_escala(nombre, ESCALAS[nombre], args.seed, directorio)
+            for op, m in resultados['escalas'][nombre]['operaciones'].items():
+                print(f"  {op:22} {m.get('mediana_ms', m.get('omitido'))}", file=sys.stderr)
+
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, args.tolerancia)
+        for escala, op, antes, ahora in regresiones:
+            print(f"REGRESIÓN [{escala}] {op}: {antes} ms -> {ahora} ms", file=sys.stderr)
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Avisos de cambios: qué filas tocó cada escritura, para que las vistas apliquen solo eso."""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+log = logging.getLogger('easystock.cambios')
+
+
+class Cambio:
+    """Filas de una tabla ('tiendas', 'productos' o 'ventas') que tocó una escritura ya confirmada.
+
+    tabla None es un cambio externo (otro proceso u otra caja): no se sabe qué filas
+    cambiaron y hay que releer. origen es el DBManager (o ClienteDB) que escribió.
+    """
+
+    __slots__ = ('tabla', 'insertados', 'actualizados', 'borrados', 'origen')
+
+    def __init__(self, tabla, insertados=(), actualizados=(), borrados=(), origen=None):
+        self.tabla = tabla
+        self.insertados = tuple(insertados)
+        self.actualizados = tuple(actualizados)
+        self.borrados = tuple(borrados)
+        self.origen = origen
+
+    @property
+    def externo(self):
+        return self.tabla is None
+
+    def __repr__(self):
+        if self.externo:
+            return "Cambio(externo)"
+        return (f"Cambio({self.tabla!r}, insertados={self.insertados}, actualizados={self.actualizados}, "
+                f"borrados={self.borrados})")
+
+
+class AvisosCambios:
+    """Suscripciones a los cambios de una base, y detección de los que hizo otro proceso.
+
+    Lo comparten los DBManager de un proceso sobre el mismo archivo (el de la interfaz y el
+    del EjecutorDB): cada uno emite sus propias escrituras y ninguna cuenta como externa.
+    Las de otros procesos se ven con PRAGMA data_version en una conexión propia, que cambia
+    cuando otra conexión confirma algo; como no dice qué, revisar() emite un Cambio externo.
+    Sin archivo (ClienteDB, ':memory:'), quien escribe avisa con marcar_externo() o, en
+    modo caja, con la versión que informa el servidor (version_remota()).
+    Los suscriptores se llaman en el hilo que escribió o que llamó a revisar().
+    """
+
+    def __init__(self, filename=None):
+        self.filename = None if filename in (None, '', ':memory:') else filename
+        self._suscriptores = []
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = None   # data_version ya explicado por escrituras propias
+        self._externo = False
+
+    def suscribir(self, fn, tablas=None):
+        """fn(cambios) recibe una lista de Cambio; con `tablas`, solo los de esas tablas
+        (los externos llegan siempre). Devuelve una función que cancela la suscripción."""
+        entrada = (fn, frozenset(tablas) if tablas else None)
+        with self._lock:
+            self._suscriptores.append(entrada)
+
+        def cancelar():
+            with self._lock:
+                if entrada in self._suscriptores:
+                    self._suscriptores.remove(entrada)
+        return cancelar
+
+    def emitir(self, cambios):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for fn, tablas in suscriptores:
+            propios = [c for c in cambios if tablas is None or c.externo or c.tabla in tablas]
+            if propios:
+                try:
+                    fn(propios)
+                except Exception:
+                    # una vista rota no puede hacer fallar una escritura ya confirmada
+                    log.exception("error en un suscriptor de cambios")
+
+    # ---- cambios externos ----
+    def _data_version(self):
+        if self.filename is None:
+            return None
+        if self._conn is None:
+            # solo se usa con self._lock tomado
+            uri = f"{Path(self.filename).resolve().as_uri()}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def antes_de_confirmar(self):
+        # con el lock de escritura tomado (BEGIN IMMEDIATE) nadie más puede confirmar hasta
+        # nuestro COMMIT: si data_version ya cambió, fue otro proceso
+        with self._lock:
+            version = self._data_version()
+            if self._version is not None and version != self._version:
+                self._externo = True
+            self._version = version
+
+    @contextmanager
+    def confirmando(self):
+        # envuelve nuestro COMMIT: el lock se suelta recién con la versión nueva leída. Si no,
+        # otro DBManager de este proceso que tome el lock de escritura apenas confirmamos vería
+        # data_version cambiada en antes_de_confirmar y marcaría nuestro commit como externo
+        with self._lock:
+            yield
+            self._version = self._data_version()
+
+    def despues_de_confirmar(self):
+        # la versión actual ya está explicada (p. ej. lo que escribieron las migraciones)
+        with self._lock:
+            self._version = self._data_version()
+
+    def marcar_externo(self):
+        with self._lock:
+            self._externo = True
+
+    def version_remota(self, version, escrituras=0):
+        # X-Version del servidor: sube 1 por escritura; si subió más de lo que explican las
+        # `escrituras` propias de esta respuesta (o bajó: se reinició), escribió otra caja
+        with self._lock:
+            if self._version is not None and not self._version <= version <= self._version + escrituras:
+                self._externo = True
+            self._version = version
+
+    def revisar(self):
+        """Si alguien más escribió desde la última revisión, emite un Cambio externo.
+        Devuelve si lo hubo."""
+        with self._lock:
+            externo = self._externo
+            if self.filename is not None:
+                version = self._data_version()
+                externo = externo or (self._version is not None and version != self._version)
+                self._version = version
+            self._externo = False
+        if externo:
+            self.emitir([Cambio(None)])
+        return externo
+
+    def cerrar(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,84 @@
+"""Carrito de una venta, independiente de la interfaz."""
+
+
+class Carrito:
+    """Líneas de una venta indexadas por id de producto, con el total al día.
+
+    Cada línea es un dict {producto, producto_id, cantidad, precio, subtotal}, el mismo
+    formato que recibe DBManager.create_venta. Agregar, cambiar, consultar o ubicar una
+    línea es O(1); quitar es O(n) porque reacomoda las posiciones. `lineas` conserva el
+    orden en que se agregaron y la interfaz la muestra tal cual, sin copiarla.
+    """
+
+    def __init__(self):
+        self.lineas = []
+        self._por_id = {}
+        self._posicion = {}  # prod_id -> índice en lineas
+        self.total = 0.0
+        self.unidades = 0
+
+    def __len__(self):
+        return len(self.lineas)
+
+    def __iter__(self):
+        return iter(self.lineas)
+
+    def __contains__(self, prod_id):
+        return prod_id in self._por_id
+
+    def linea(self, prod_id):
+        return self._por_id.get(prod_id)
+
+    def agregar(self, producto, cantidad=1):
+        """Suma `cantidad` del producto (una línea por producto) y devuelve su línea."""
+        linea = self._por_id.get(producto['id'])
+        if linea is None:
+            precio = float(producto['precio'])
+            linea = {'producto': producto['nombre'], 'producto_id': producto['id'],
+                     'cantidad': 0, 'precio': precio, 'subtotal': 0.0}
+            self._por_id[producto['id']] = linea
+            self._posicion[producto['id']] = len(self.lineas)
+            self.lineas.append(linea)
+        self._cambiar(linea, linea['cantidad'] + cantidad)
+        return linea
+
+    def fijar_cantidad(self, prod_id, cantidad):
+        # 0 o menos quita la línea
+        linea = self._por_id[prod_id]
+        if cantidad <= 0:
+            self.quitar(prod_id)
+        else:
+            self._cambiar(linea, cantidad)
+
+    def quitar(self, prod_id):
+        linea = self._por_id.pop(prod_id, None)
+        if linea is not None:
+            del self.lineas[self._posicion[prod_id]]
+            self._posicion = {l['producto_id']: i for i, l in enumerate(self.lineas)}
+            self.total -= linea['subtotal']
+            self.unidades -= linea['cantidad']
+            if not self.lineas:
+                self.total = 0.0  # sin arrastrar redondeos de punto flotante
+
+    def vaciar(self):
+        self.lineas.clear()
+        self._por_id.clear()
+        self._posicion.clear()
+        self.total = 0.0
+        self.unidades = 0
+
+    def posicion(self, prod_id):
+        return self._posicion[prod_id]
+
+    def para_venta(self):
+        """(lineas, total) listos para create_venta: copias, para que el carrito pueda
+        seguir cambiando mientras la venta se confirma en otro hilo."""
+        lineas = [dict(l) for l in self.lineas]
+        return lineas, sum(l['subtotal'] for l in lineas)
+
+    def _cambiar(self, linea, cantidad):
+        subtotal = cantidad * linea['precio']
+        self.total += subtotal - linea['subtotal']
+        self.unidades += cantidad - linea['cantidad']
+        linea['cantidad'] = cantidad
+        linea['subtotal'] = subtotal
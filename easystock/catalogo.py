@@ -0,0 +1,220 @@
+"""Catálogo de productos en memoria e índice de búsqueda (sin dependencias de GUI)."""
+
+import unicodedata
+
+
+# -------------------------
+# Índice de búsqueda (trigramas sobre nombre, código y precio)
+# -------------------------
+def _normalizar(texto):
+    # minúsculas y sin tildes: "Azúcar" y "azucar" son la misma búsqueda
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _trigramas(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class IndiceBusqueda:
+    """Índice invertido de trigramas para el buscador de productos.
+
+    Se actualiza producto a producto (agregar/actualizar/quitar) en vez de
+    reconstruirse. Si la consulta nueva extiende la anterior (el usuario sigue
+    tecleando) se filtra sobre el resultado previo en lugar de todo el catálogo.
+    """
+
+    def __init__(self, productos=()):
+        self._productos = {}   # id -> producto
+        self._textos = {}      # id -> texto normalizado
+        self._gramas = {}      # trigrama -> set(ids)
+        self._ultima = None    # (consulta normalizada, set(ids))
+        for p in productos:
+            self.agregar(p)
+
+    @staticmethod
+    def _texto(producto):
+        return _normalizar(f"{producto['nombre']} {producto.get('codigo_barras') or ''} {producto['precio']}")
+
+    def agregar(self, producto):
+        pid = producto['id']
+        texto = self._texto(producto)
+        self._productos[pid] = producto
+        self._textos[pid] = texto
+        for tok in texto.split():
+            for g in _trigramas(tok):
+                self._gramas.setdefault(g, set()).add(pid)
+        self._ultima = None
+
+    def quitar(self, prod_id):
+        texto = self._textos.pop(prod_id, None)
+        self._productos.pop(prod_id, None)
+        if texto is None:
+            return
+        for tok in texto.split():
+            for g in _trigramas(tok):
+                ids = self._gramas.get(g)
+                if ids is not None:
+                    ids.discard(prod_id)
+                    if not ids:
+                        del self._gramas[g]
+        self._ultima = None
+
+    def actualizar(self, producto):
+        if self._textos.get(producto['id']) == self._texto(producto):
+            self._productos[producto['id']] = producto
+            return
+        self.quitar(producto['id'])
+        self.agregar(producto)
+
+    def buscar(self, consulta):
+        q = _normalizar(consulta).strip()
+        tokens = q.split()
+        if not tokens:
+            return list(self._productos.values())
+
+        candidatos = None
+        if self._ultima is not None and q.startswith(self._ultima[0]):
+            candidatos = self._ultima[1]
+        else:
+            for tok in sorted(tokens, key=len, reverse=True):
+                for g in _trigramas(tok):
+                    ids = self._gramas.get(g, set())
+                    candidatos = ids if candidatos is None else candidatos & ids
+                    if not candidatos:
+                        break
+            if candidatos is None:  # solo tokens de menos de 3 letras
+                candidatos = self._textos.keys()
+
+        textos = self._textos
+        encontrados = {pid for pid in candidatos if all(tok in textos[pid] for tok in tokens)}
+        self._ultima = (q, encontrados)
+        return sorted((self._productos[pid] for pid in encontrados), key=lambda p: self._puntaje(p, tokens))
+
+    def _puntaje(self, producto, tokens):
+        # menor es mejor: código exacto, nombre que empieza por la consulta, palabras por prefijo, resto
+        texto = self._textos[producto['id']]
+        if producto.get('codigo_barras') and _normalizar(producto['codigo_barras']) in tokens:
+            nivel = 0
+        elif texto.startswith(tokens[0]):
+            nivel = 1
+        elif all(any(pal.startswith(tok) for pal in texto.split()) for tok in tokens):
+            nivel = 2
+        else:
+            nivel = 3
+        return nivel, len(texto), texto
+
+
+# -------------------------
+# Catálogo en memoria (índices por id y código de barras)
+# -------------------------
+class CatalogoProductos:
+    """Productos de una tienda con índices hash por id y por código de barras.
+
+    Lo crea y mantiene DBManager.catalogo(): cada escritura de DBManager lo parchea,
+    así que una búsqueda por escaneo es O(1) y no toca SQLite. `productos` permite
+    construirlo con filas ya leídas (por ejemplo en el EjecutorDB).
+    """
+
+    def __init__(self, db, id_tienda, productos=None):
+        self.db = db
+        self.id_tienda = id_tienda
+        self.productos = []   # orden de list_productos (mismo orden que las listas de la UI)
+        self._por_id = {}
+        self._por_cb = {}
+        self.cargar(productos)
+
+    def cargar(self, productos=None):
+        self.productos = self.db.list_productos(self.id_tienda) if productos is None else productos
+        self._por_id = {p['id']: p for p in self.productos}
+        self._por_cb = {p['codigo_barras']: p for p in self.productos if p.get('codigo_barras')}
+        self.indice = IndiceBusqueda(self.productos)
+
+    def buscar(self, texto=''):
+        # sin texto se respeta el orden del catálogo
+        if not texto.strip():
+            return list(self.productos)
+        return self.indice.buscar(texto)
+
+    def por_id(self, prod_id):
+        return self._por_id.get(prod_id)
+
+    def por_codigo(self, codigo):
+        return self._por_cb.get(codigo)
+
+    def __len__(self):
+        return len(self.productos)
+
+    def __iter__(self):
+        return iter(self.productos)
+
+    def aplicar_venta(self, lineas):
+        # descuenta el stock de una venta ya confirmada
+        for l in lineas:
+            p = self._por_id.get(l['producto_id'])
+            if p is not None:
+                p['stock'] -= l['cantidad']
+
+    def actualizar_stock(self, prod_id, stock):
+        p = self._por_id.get(prod_id)
+        if p is not None:
+            p['stock'] = stock
+
+    # Parches aplicados por DBManager tras cada escritura
+    def _agregar(self, producto):
+        self.productos.append(producto)
+        self._por_id[producto['id']] = producto
+        if producto.get('codigo_barras'):
+            self._por_cb[producto['codigo_barras']] = producto
+        self.indice.agregar(producto)
+
+    def _actualizar(self, prod_id, **campos):
+        p = self._por_id.get(prod_id)
+        if p is None:
+            return
+        if 'codigo_barras' in campos and p.get('codigo_barras') != campos['codigo_barras']:
+            if p.get('codigo_barras'):
+                self._por_cb.pop(p['codigo_barras'], None)
+            if campos['codigo_barras']:
+                self._por_cb[campos['codigo_barras']] = p
+        p.update(campos)
+        self.indice.actualizar(p)
+
+    def _quitar_varios(self, ids):
+        # una sola pasada por la lista (quitar de a uno sería O(n) por producto)
+        ids = set(ids) & self._por_id.keys()
+        if not ids:
+            return
+        for pid in ids:
+            p = self._por_id.pop(pid)
+            if p.get('codigo_barras'):
+                self._por_cb.pop(p['codigo_barras'], None)
+            self.indice.quitar(pid)
+        self.productos[:] = [p for p in self.productos if p['id'] not in ids]
+
+    def _quitar(self, prod_id):
+        # list.remove compararía dicts enteros (y borraría el primero igual, no este)
+        self._quitar_varios([prod_id])
+
+    def sincronizar(self, filas, ids=None):
+        """Aplica filas recién leídas sin recargar todo. filas son las actuales de `ids`
+        (las que faltan se borraron); sin ids, las del catálogo entero. Devuelve las listas
+        (insertados, actualizados, borrados) de ids que de verdad cambiaron."""
+        nuevas = {p['id']: p for p in filas if self.id_tienda is None or p['id_tienda'] == self.id_tienda}
+        revisar = self._por_id.keys() | nuevas.keys() if ids is None else set(ids)
+        insertados, actualizados, borrados = [], [], []
+        for pid in sorted(revisar):
+            actual, nueva = self._por_id.get(pid), nuevas.get(pid)
+            if nueva is None:
+                if actual is not None:
+                    borrados.append(pid)
+            elif actual is None:
+                self._agregar(nueva)
+                insertados.append(pid)
+            else:
+                campos = {c: nueva[c] for c in ('nombre', 'stock', 'precio', 'codigo_barras') if actual[c] != nueva[c]}
+                if campos:
+                    self._actualizar(pid, **campos)
+                    actualizados.append(pid)
+        self._quitar_varios(borrados)
+        return insertados, actualizados, borrados
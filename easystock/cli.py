@@ -0,0 +1,311 @@
+"""Línea de comandos para tareas por lotes y reportes, sin Tk.
+
+Uso:
+  python -m easystock [--db RUTA] importar ARCHIVO --tienda ID [--rechazados RUTA]
+  python -m easystock [--db RUTA] ventas [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--salida RUTA]
+  python -m easystock [--db RUTA] top AAAA-MM [--orden unidades|ingresos] [--limite N]
+  python -m easystock [--db RUTA] stock [--tienda ID] [--salida RUTA]
+  python -m easystock [--db RUTA] buscar TEXTO [--tienda ID] [--limite N]
+  python -m easystock [--db RUTA] reposicion [--tienda ID] [--plazo DIAS] [--todos] [--salida RUTA]
+  python -m easystock [--db RUTA] exportar SALIDA.csv|.xlsx|.parquet [--desde] [--hasta] [--tienda ID]
+  python -m easystock [--db RUTA] archivar [--hasta AAAA] [--compactar]
+  python -m easystock [--db RUTA] reporte DESDE HASTA [--periodo dia|semana|mes] [--tienda ID] [--limite N]
+  python -m easystock [--db RUTA] servidor [--host H] [--puerto N] [--lote-max N] [--espera-ms N]
+  python -m easystock simular [--url URL] [--clientes N] [--ventas N]
+
+Opciones globales --metricas ARCHIVO y --sql-lento-ms N activan la instrumentación (easystock.metricas).
+--durabilidad completa|normal elige cuándo se hace fsync (ver easystock.conexiones.DURABILIDAD);
+`simular --durabilidad normal` sirve para comparar los dos perfiles.
+
+simular lanza cajas simuladas contra un servidor; sin --url levanta uno propio sobre una base
+temporal con datos sintéticos (no toca --db).
+
+Las salidas se escriben fila a fila (o de a lotes), sin cargar toda la base en memoria.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime
+from contextlib import contextmanager
+
+from .conexiones import DURABILIDAD
+from .db import DB_FILE, DBManager
+from .metricas import METRICAS
+
+
+@contextmanager
+def _abrir_salida(ruta):
+    if ruta in (None, '-'):
+        yield sys.stdout
+        sys.stdout.flush()
+    else:
+        with open(ruta, 'w', newline='', encoding='utf-8') as f:
+            yield f
+
+
+def cmd_importar(db, args):
+    # pandas solo hace falta para este comando
+    from .importacion import TAM_LOTE_IMPORTACION, guardar_reporte_rechazados, importar_productos
+
+    def progreso(leidas):
+        print(f"{leidas} filas procesadas", file=sys.stderr)
+
+    try:
+        res = importar_productos(db, args.archivo, args.tienda, progreso=progreso,
+                                 tam_lote=args.lote or TAM_LOTE_IMPORTACION)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    rechazados = res['rechazados']
+    print(f"Nuevos: {res['insertados']}  Actualizados: {res['actualizados']}  Rechazados: {len(rechazados)}",
+          file=sys.stderr)
+    if rechazados:
+        if args.rechazados:
+            guardar_reporte_rechazados(rechazados, args.rechazados)
+        else:
+            w = csv.writer(sys.stdout)
+            w.writerow(['fila', 'motivo'])
+            w.writerows(rechazados)
+    return 0
+
+
+def cmd_ventas(db, args):
+    with _abrir_salida(args.salida) as f:
+        w = csv.writer(f)
+        w.writerow(['venta_id', 'fecha', 'total', 'producto', 'cantidad', 'precio', 'subtotal'])
+        w.writerows(tuple(r) for r in db.iter_ventas_items(args.desde, args.hasta))
+    return 0
+
+
+def cmd_top(db, args):
+    unidades, ingresos = db.top_por_mes(args.mes)
+    filas = unidades if args.orden == 'unidades' else ingresos
+    if args.limite:
+        filas = filas[:args.limite]
+    w = csv.writer(sys.stdout)
+    w.writerow(['producto', 'total_vendido', 'ingresos'])
+    w.writerows((r['producto'], r['total_vendido'], r['ingresos']) for r in filas)
+    return 0
+
+
+def cmd_stock(db, args):
+    with _abrir_salida(args.salida) as f:
+        w = csv.writer(f)
+        w.writerow(['id', 'nombre', 'stock', 'precio', 'id_tienda', 'codigo_barras'])
+        w.writerows(tuple(r) for r in db.iter_productos(args.tienda))
+    return 0
+
+
+def cmd_buscar(db, args):
+    columnas = ['id', 'nombre', 'stock', 'precio', 'id_tienda', 'tienda', 'codigo_barras']
+    w = csv.writer(sys.stdout)
+    w.writerow(columnas)
+    w.writerows([p[c] for c in columnas] for p in db.buscar_productos(args.texto, args.tienda, args.limite))
+    return 0
+
+
+def cmd_reposicion(db, args):
+    from .reposicion import PLAZO_REPOSICION_DIAS, productos_a_reponer
+    columnas = ['id', 'nombre', 'stock', 'demanda', 'dias_cobertura', 'punto_pedido', 'sugerido', 'alerta']
+    with _abrir_salida(args.salida) as f:
+        w = csv.writer(f)
+        w.writerow(columnas)
+        w.writerows([p[c] for c in columnas]
+                    for p in productos_a_reponer(db, args.tienda, plazo=args.plazo or PLAZO_REPOSICION_DIAS, solo_alertas=not args.todos))
+    return 0
+
+
+def cmd_exportar(db, args):
+    # openpyxl/pyarrow solo hacen falta para xlsx/parquet
+    from .exportacion import TAM_LOTE_EXPORTACION, exportar_ventas
+
+    def progreso(filas):
+        print(f"{filas} filas exportadas", file=sys.stderr)
+
+    try:
+        filas = exportar_ventas(db, args.salida, args.formato, args.desde, args.hasta, args.tienda,
+                                progreso=progreso, tam_lote=args.lote or TAM_LOTE_EXPORTACION)
+    except ImportError as e:
+        print(f"Error: falta la dependencia {e.name} para exportar en ese formato", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"{filas} filas en {args.salida}", file=sys.stderr)
+    return 0
+
+
+def cmd_archivar(db, args):
+    hasta = args.hasta or datetime.now().year - 1
+    try:
+        for anio in db.anios_archivables():
+            if anio > hasta:
+                break
+            ventas, items = db.archivar_ventas(anio)
+            print(f"{anio}: {ventas} ventas y {items} ítems archivados", file=sys.stderr)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.compactar:
+        db.conn.execute("VACUUM")
+    w = csv.writer(sys.stdout)
+    w.writerow(['anio', 'archivo', 'ventas', 'items', 'creado'])
+    w.writerows((a['anio'], a['archivo'], a['ventas'], a['items'], a['creado']) for a in db.archivos_ventas())
+    return 0
+
+
+def cmd_reporte(db, args):
+    # pandas se importa solo para este comando
+    from .analitica import analitica
+    a = analitica(db)
+    try:
+        res = {
+            'comparacion': a.comparar(args.desde, args.hasta, args.tienda),
+            'curva': a.curva(args.periodo, args.desde, args.hasta, args.tienda),
+            'productos': a.productos(args.desde, args.hasta, args.tienda, limite=args.limite or None),
+            'canastas': a.canastas(args.desde, args.hasta, args.tienda),
+            'tiendas': a.por_tienda(args.desde, args.hasta),
+        }
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(res, indent=2, ensure_ascii=False))
+    return 0
+
+
+def cmd_servidor(db, args):
+    from .servidor import ServidorPOS
+    pos = ServidorPOS(db, args.host, args.puerto, args.lote_max, args.espera_ms)
+    print(f"Sirviendo {db.filename} en {pos.url} (Ctrl+C para terminar)", file=sys.stderr)
+    try:
+        pos.servir()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pos.cerrar()
+    return 0
+
+
+def cmd_simular(db, args):
+    from .servidor import ServidorPOS, simular
+    if args.url:
+        res = simular(args.url, args.clientes, args.ventas, args.tienda)
+    else:
+        from .bench import ESCALAS, generar_datos
+        with tempfile.TemporaryDirectory(prefix='easystock_sim_') as directorio:
+            db = DBManager(os.path.join(directorio, 'sim.db'), args.durabilidad)
+            generar_datos(db, **ESCALAS['chico'])
+            pos = ServidorPOS(db, puerto=0, lote_max=args.lote_max, espera_ms=args.espera_ms).iniciar()
+            try:
+                res = simular(pos.url, args.clientes, args.ventas, args.tienda)
+            finally:
+                pos.cerrar()
+                db.close()
+    print(json.dumps(res, indent=2, ensure_ascii=False))
+    return 1 if res['errores'] else 0
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(prog='easystock', description='Easy Stock sin interfaz gráfica')
+    parser.add_argument('--db', default=DB_FILE, help=f'archivo de base de datos (por defecto {DB_FILE})')
+    parser.add_argument('--metricas', help='exportar métricas de la base a este archivo (formato Prometheus)')
+    parser.add_argument('--sql-lento-ms', type=float, help='registrar sentencias más lentas que este umbral')
+    parser.add_argument('--durabilidad', choices=sorted(DURABILIDAD),
+                        help="'completa': fsync en cada commit; 'normal': solo en los checkpoints de WAL "
+                             "(por defecto EASYSTOCK_DURABILIDAD o 'completa')")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('importar', help='importar productos desde Excel/CSV')
+    p.add_argument('archivo')
+    p.add_argument('--tienda', type=int, required=True, help='id de la sucursal')
+    p.add_argument('--lote', type=int, help='filas por lote')
+    p.add_argument('--rechazados', help='guardar las filas rechazadas en este CSV (por defecto: stdout)')
+    p.set_defaults(func=cmd_importar)
+
+    p = sub.add_parser('ventas', help='exportar ventas con sus ítems (CSV)')
+    p.add_argument('--desde', help='AAAA-MM-DD, inclusive')
+    p.add_argument('--hasta', help='AAAA-MM-DD, inclusive')
+    p.add_argument('--salida', help='archivo de salida (por defecto: stdout)')
+    p.set_defaults(func=cmd_ventas)
+
+    p = sub.add_parser('top', help='productos más vendidos de un mes')
+    p.add_argument('mes', help='AAAA-MM')
+    p.add_argument('--orden', choices=['unidades', 'ingresos'], default='unidades')
+    p.add_argument('--limite', type=int, default=0, help='cantidad de productos (0 = todos)')
+    p.set_defaults(func=cmd_top)
+
+    p = sub.add_parser('stock', help='foto del stock actual (CSV)')
+    p.add_argument('--tienda', type=int, help='id de la sucursal (por defecto: todas)')
+    p.add_argument('--salida', help='archivo de salida (por defecto: stdout)')
+    p.set_defaults(func=cmd_stock)
+
+    p = sub.add_parser('buscar', help='buscar productos por nombre o código en todas las sucursales (CSV)')
+    p.add_argument('texto')
+    p.add_argument('--tienda', type=int, help='id de la sucursal (por defecto: todas)')
+    p.add_argument('--limite', type=int, default=50)
+    p.set_defaults(func=cmd_buscar)
+
+    p = sub.add_parser('reposicion', help='productos en su punto de pedido, con la cantidad sugerida (CSV)')
+    p.add_argument('--tienda', type=int, help='id de la sucursal (por defecto: todas)')
+    p.add_argument('--plazo', type=int, help='días que tarda en llegar un pedido (por defecto 7)')
+    p.add_argument('--todos', action='store_true', help='incluir los que todavía no están en alerta')
+    p.add_argument('--salida', help='archivo de salida (por defecto: stdout)')
+    p.set_defaults(func=cmd_reposicion)
+
+    p = sub.add_parser('exportar', help='exportar el historial de ventas a CSV, XLSX o Parquet')
+    p.add_argument('salida', help='archivo de salida; el formato sale de la extensión')
+    p.add_argument('--formato', choices=['csv', 'xlsx', 'parquet'], help='forzar el formato')
+    p.add_argument('--desde', help='AAAA-MM-DD, inclusive')
+    p.add_argument('--hasta', help='AAAA-MM-DD, inclusive')
+    p.add_argument('--tienda', type=int, help='id de la sucursal (por defecto: todas)')
+    p.add_argument('--lote', type=int, help='filas por lote')
+    p.set_defaults(func=cmd_exportar)
+
+    p = sub.add_parser('archivar', help='mover los años cerrados de ventas a archivos de solo lectura')
+    p.add_argument('--hasta', type=int, help='último año a archivar (por defecto: el año pasado)')
+    p.add_argument('--compactar', action='store_true', help='VACUUM de la base activa al terminar')
+    p.set_defaults(func=cmd_archivar)
+
+    p = sub.add_parser('reporte', help='resumen, curva, productos y sucursales de un rango (JSON)')
+    p.add_argument('desde', help='AAAA-MM-DD, inclusive')
+    p.add_argument('hasta', help='AAAA-MM-DD, inclusive')
+    p.add_argument('--periodo', choices=['dia', 'semana', 'mes'], default='dia')
+    p.add_argument('--tienda', type=int, help='id de la sucursal (por defecto: todas)')
+    p.add_argument('--limite', type=int, default=20, help='cantidad de productos (0 = todos)')
+    p.set_defaults(func=cmd_reporte)
+
+    p = sub.add_parser('servidor', help='compartir la base con varias cajas por HTTP/JSON')
+    p.add_argument('--host', default='127.0.0.1', help='0.0.0.0 para aceptar cajas de la red local')
+    p.add_argument('--puerto', type=int, default=8765)
+    p.add_argument('--lote-max', type=int, default=64, help='ventas como máximo por transacción')
+    p.add_argument('--espera-ms', type=float, default=0, help='demora para juntar más escrituras por lote')
+    p.set_defaults(func=cmd_servidor)
+
+    p = sub.add_parser('simular', help='cajas simuladas contra un servidor (prueba de carga)')
+    p.add_argument('--url', help='servidor ya levantado (por defecto: uno propio sobre datos sintéticos)')
+    p.add_argument('--clientes', type=int, default=8)
+    p.add_argument('--ventas', type=int, default=200, help='ventas por cliente')
+    p.add_argument('--tienda', type=int, help='id de la sucursal (por defecto: la primera)')
+    p.add_argument('--lote-max', type=int, default=64)
+    p.add_argument('--espera-ms', type=float, default=0)
+    p.set_defaults(func=cmd_simular, sin_db=True)
+    return parser
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(name)s: %(message)s')
+    if args.metricas or args.sql_lento_ms:
+        METRICAS.activar(umbral_lento_ms=args.sql_lento_ms, archivo=args.metricas, intervalo_s=None)
+    if getattr(args, 'sin_db', False):
+        return args.func(None, args)
+    db = DBManager(args.db, args.durabilidad)
+    try:
+        return args.func(db, args)
+    finally:
+        db.close()
@@ -0,0 +1,263 @@
+"""Cliente del servidor de cajas (easystock.servidor) con la misma interfaz que DBManager."""
+
+import http.client
+import json
+import sqlite3
+from urllib.parse import quote, urlencode, urlsplit
+
+from .cambios import AvisosCambios, Cambio
+from .catalogo import CatalogoProductos
+from .db import TAM_PAGINA_HISTORIAL, StockInsuficienteError
+from .registros import Producto
+
+
+class ErrorServidor(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(f"{estado}: {mensaje}")
+        self.estado = estado
+
+
+class ClienteDB:
+    """Habla con ServidorPOS por HTTP/JSON. Los métodos que usa la interfaz devuelven lo
+    mismo que los de DBManager, así MainApp y las ventanas funcionan igual en modo caja.
+
+    Los catálogos quedan en memoria (como en DBManager) y se revalidan con ETag: recargarlos
+    cuando nada cambió en el servidor cuesta un 304 sin cuerpo. Una conexión HTTP persistente
+    por instancia; como DBManager, cada hilo debe usar la suya.
+
+    Las escrituras propias avisan como las de DBManager; las de otras cajas se notan en el
+    encabezado X-Version de las respuestas y salen en revisar_cambios() como Cambio externo.
+    """
+
+    def __init__(self, url, avisos=None):
+        self.filename = url  # lo usa EjecutorDB para abrir su propia instancia
+        self.avisos = avisos if avisos is not None else AvisosCambios()
+        partes = urlsplit(url)
+        self._host, self._puerto = partes.hostname, partes.port or 80
+        self._http = None
+        self._catalogos = {}  # id_tienda -> CatalogoProductos
+        self._etags = {}      # id_tienda -> (etag, filas)
+
+    def _pedir(self, metodo, ruta, datos=None, encabezados=None):
+        cuerpo = None if datos is None else json.dumps(datos).encode('utf-8')
+        encabezados = {'Content-Type': 'application/json', **(encabezados or {})}
+        # si se cayó la conexión persistente se reintenta una vez, salvo los POST:
+        # una venta reenviada podría registrarse dos veces
+        reintentar = metodo != 'POST'
+        while True:
+            if self._http is None:
+                self._http = http.client.HTTPConnection(self._host, self._puerto, timeout=30)
+            try:
+                self._http.request(metodo, ruta, cuerpo, encabezados)
+                resp = self._http.getresponse()
+                texto = resp.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                self._http.close()
+                self._http = None
+                if not reintentar:
+                    raise
+                reintentar = False
+        version = resp.getheader('X-Version')
+        if version is not None:
+            # una escritura aceptada sube la versión en 1; una lectura o un error, en 0
+            self.avisos.version_remota(int(version), escrituras=int(metodo != 'GET' and resp.status < 400))
+        if resp.status == 304:
+            return None, resp.getheader('ETag')
+        respuesta = json.loads(texto) if texto else None
+        if resp.status >= 400:
+            error = respuesta.get('error') if isinstance(respuesta, dict) else texto
+            if error == 'stock_insuficiente':
+                raise StockInsuficienteError(respuesta['faltantes'])
+            if error == 'integridad':
+                raise sqlite3.IntegrityError(respuesta['detalle'])
+            raise ErrorServidor(resp.status, error)
+        return respuesta, resp.getheader('ETag')
+
+    def _get(self, ruta, **params):
+        params = {k: v for k, v in params.items() if v is not None}
+        return self._pedir('GET', f"{ruta}?{urlencode(params)}" if params else ruta)[0]
+
+    # Avisos de cambios
+    def suscribir(self, fn, tablas=None):
+        return self.avisos.suscribir(fn, tablas)
+
+    def revisar_cambios(self):
+        # /estado trae la versión actual del servidor (y le hace revisar su propia base)
+        self.estado()
+        return self.avisos.revisar()
+
+    def _avisar(self, tabla, insertados=(), actualizados=(), borrados=()):
+        self.avisos.emitir([Cambio(tabla, insertados, actualizados, borrados, origen=self)])
+
+    # Tiendas
+    def list_tiendas(self):
+        return self._get('/tiendas')
+
+    def add_tienda(self, nombre):
+        tid = self._pedir('POST', '/tiendas', {'nombre': nombre})[0]['id']
+        self._avisar('tiendas', insertados=[tid])
+        return tid
+
+    def delete_tienda(self, id_tienda):
+        n = self._pedir('DELETE', f'/tiendas/{id_tienda}')[0]['productos']
+        cat = self._catalogos.pop(id_tienda, None)
+        self._etags.pop(id_tienda, None)
+        if cat is not None:
+            self._avisar('productos', borrados=[p['id'] for p in cat.productos])
+        elif n:
+            self.avisos.emitir([Cambio(None, origen=self)])  # no se sabe qué productos eran
+        self._avisar('tiendas', borrados=[id_tienda])
+        return n
+
+    # Productos
+    def list_productos(self, id_tienda=None):
+        anterior = self._etags.get(id_tienda)
+        encabezados = {'If-None-Match': anterior[0]} if anterior else None
+        ruta = f'/productos?tienda={id_tienda}' if id_tienda is not None else '/productos'
+        filas, etag = self._pedir('GET', ruta, encabezados=encabezados)
+        if filas is None:
+            filas = anterior[1]  # 304: no cambió nada desde la última lectura
+        elif etag:
+            self._etags[id_tienda] = (etag, filas)
+        # registros nuevos: el catálogo los modifica y la versión guardada debe quedar intacta
+        return [Producto(**p) for p in filas]
+
+    def producto_por_codigo(self, codigo):
+        try:
+            return self._get(f'/productos/codigo/{quote(codigo, safe="")}')
+        except ErrorServidor as e:
+            if e.estado == 404:
+                return None
+            raise
+
+    def buscar_productos(self, texto, id_tienda=None, limite=50, offset=0):
+        return self._get('/productos/buscar', q=texto, tienda=id_tienda, limite=limite, offset=offset)
+
+    def productos_por_ids(self, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        return [Producto(**p) for p in self._get('/productos', ids=','.join(map(str, ids)))]
+
+    def importar_productos(self, id_tienda, lotes):
+        # se envía todo junto para que el servidor lo confirme en una sola transacción
+        filas = [fila for lote in lotes for fila in lote]
+        res = self._pedir('POST', '/productos/importar', {'tienda': id_tienda, 'filas': filas})[0]
+        self._sincronizar_catalogos([id_tienda])
+        return res['insertados'], res['actualizados'], [tuple(r) for r in res['rechazados']]
+
+    def catalogo(self, id_tienda, productos=None):
+        cat = self._catalogos.get(id_tienda)
+        if cat is None:
+            cat = self._catalogos[id_tienda] = CatalogoProductos(self, id_tienda, productos)
+        return cat
+
+    def tiene_catalogo(self, id_tienda):
+        return id_tienda in self._catalogos
+
+    def descartar_catalogos(self, excepto=None):
+        for tid in [t for t in self._catalogos if t != excepto]:
+            del self._catalogos[tid]
+
+    def add_producto(self, nombre, stock, precio, id_tienda, codigo_barras=None):
+        prod_id = self._pedir('POST', '/productos', {
+            'nombre': nombre, 'stock': int(stock), 'precio': float(precio),
+            'id_tienda': id_tienda, 'codigo_barras': codigo_barras,
+        })[0]['id']
+        cat = self._catalogos.get(id_tienda)
+        if cat is not None:
+            cat._agregar(Producto(prod_id, nombre, int(stock), float(precio), id_tienda, codigo_barras))
+        self._avisar('productos', insertados=[prod_id])
+        return prod_id
+
+    def update_producto(self, prod_id, nombre, stock, precio, codigo_barras):
+        self._pedir('PUT', f'/productos/{prod_id}', {
+            'nombre': nombre, 'stock': int(stock), 'precio': float(precio), 'codigo_barras': codigo_barras,
+        })
+        for cat in self._catalogos.values():
+            cat._actualizar(prod_id, nombre=nombre, stock=int(stock), precio=float(precio),
+                            codigo_barras=codigo_barras)
+        self._avisar('productos', actualizados=[prod_id])
+
+    def delete_producto(self, prod_id):
+        self._pedir('DELETE', f'/productos/{prod_id}')
+        for cat in self._catalogos.values():
+            cat._quitar(prod_id)
+        self._avisar('productos', borrados=[prod_id])
+
+    def actualizar_productos(self, id_tienda=None, ids=None, contiene=None,
+                             precio=None, porcentaje=None, stock=None, sumar_stock=None):
+        n = self._pedir('POST', '/productos/actualizar', {
+            'id_tienda': id_tienda, 'ids': None if ids is None else list(ids), 'contiene': contiene,
+            'precio': precio, 'porcentaje': porcentaje, 'stock': stock, 'sumar_stock': sumar_stock,
+        })[0]['cambiados']
+        self._sincronizar_catalogos()
+        return n
+
+    def delete_productos(self, ids=None, id_tienda=None, contiene=None):
+        n = self._pedir('POST', '/productos/eliminar', {
+            'id_tienda': id_tienda, 'ids': None if ids is None else list(ids), 'contiene': contiene,
+        })[0]['borrados']
+        self._sincronizar_catalogos()
+        return n
+
+    def demanda_productos(self, id_tienda=None):
+        return self._get('/demanda', tienda=id_tienda)
+
+    def _sincronizar_catalogos(self, tiendas=None):
+        # los valores nuevos los calculó SQLite: se vuelven a leer (un GET por catálogo abierto)
+        # y se avisan solo las filas que cambiaron
+        cats = [c for t, c in self._catalogos.items() if tiendas is None or t in tiendas]
+        if not cats:
+            self.avisos.emitir([Cambio(None, origen=self)])  # sin catálogo no se sabe qué filas fueron
+            return
+        insertados, actualizados, borrados = [], [], []
+        for cat in cats:
+            ins, act, bor = cat.sincronizar(self.list_productos(cat.id_tienda))
+            insertados += ins
+            actualizados += act
+            borrados += bor
+        self._avisar('productos', insertados, actualizados, borrados)
+
+    # Ventas
+    def create_venta(self, lineas, total):
+        venta_id = self._pedir('POST', '/ventas', {'lineas': lineas, 'total': total})[0]['id']
+        for cat in self._catalogos.values():
+            cat.aplicar_venta(lineas)
+        self._avisar('ventas', insertados=[venta_id])
+        self._avisar('productos', actualizados={l['producto_id'] for l in lineas})
+        return venta_id
+
+    def list_ventas_pagina(self, despues=None, limite=TAM_PAGINA_HISTORIAL, desde=None, hasta=None,
+                           total_min=None, total_max=None, id_tienda=None, ids=None):
+        if ids is not None and not ids:
+            return []
+        return self._get('/ventas', despues=','.join(map(str, despues)) if despues else None, limite=limite,
+                         desde=desde, hasta=hasta, total_min=total_min, total_max=total_max, tienda=id_tienda,
+                         ids=None if ids is None else ','.join(map(str, ids)))
+
+    def list_items_by_venta(self, venta_id):
+        return self._get(f'/ventas/{venta_id}/items')
+
+    def list_items_by_ventas(self, venta_ids):
+        if not venta_ids:
+            return {}
+        # JSON solo tiene claves de texto
+        return {int(k): v for k, v in self._get('/ventas/items', ids=','.join(map(str, venta_ids))).items()}
+
+    def delete_venta(self, venta_id):
+        self._pedir('DELETE', f'/ventas/{venta_id}')
+        self._avisar('ventas', borrados=[venta_id])
+
+    def top_por_mes(self, year_month):
+        res = self._get(f'/top/{year_month}')
+        return res['unidades'], res['ingresos']
+
+    def estado(self):
+        return self._get('/estado')
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+            self._http = None
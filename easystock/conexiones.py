@@ -0,0 +1,146 @@
+"""Conexiones SQLite por hilo: una de escritura y una de solo lectura para reportes."""
+
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+MAX_ADJUNTAS = 10  # SQLITE_MAX_ATTACHED por defecto
+# PRAGMA synchronous de las conexiones de escritura. Con WAL, 'completa' (FULL) hace fsync
+# en cada commit; 'normal' (NORMAL) solo en los checkpoints: un corte de luz puede perder
+# los últimos commits, pero la base nunca queda corrupta.
+DURABILIDAD = {'completa': 'FULL', 'normal': 'NORMAL'}
+
+
+class GestorConexiones:
+    """Entrega a cada hilo sus propias conexiones sobre el mismo archivo.
+
+    Un cursor compartido entre hilos es una carrera; con una conexión por hilo y WAL,
+    un hilo puede escribir mientras otros leen. Las de lectura se abren con mode=ro y
+    query_only. ':memory:' no se puede abrir dos veces: ahí todos comparten una sola.
+    `envolver(conn)` permite decorar cada conexión nueva (por ejemplo, con métricas).
+    `durabilidad` es una clave de DURABILIDAD.
+    """
+
+    def __init__(self, filename, envolver=None, durabilidad='completa'):
+        if durabilidad not in DURABILIDAD:
+            raise ValueError(f"durabilidad desconocida: {durabilidad!r} (opciones: {', '.join(DURABILIDAD)})")
+        self.filename = filename
+        self.envolver = envolver
+        self.durabilidad = durabilidad
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._abiertas = []
+        self._compartida = None
+        if filename in ('', ':memory:'):
+            self._compartida = self._abrir(solo_lectura=False)
+
+    def _abrir(self, solo_lectura):
+        # check_same_thread=False solo para poder cerrarlas todas desde cerrar();
+        # cada conexión se usa únicamente desde el hilo que la abrió
+        if solo_lectura:
+            uri = f"{Path(self.filename).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = 1")
+        else:
+            conn = sqlite3.connect(self.filename, check_same_thread=False)
+            # WAL: las lecturas no bloquean a la caja mientras confirma una venta
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={DURABILIDAD[self.durabilidad]}")
+        conn.row_factory = sqlite3.Row
+        if self.envolver is not None:
+            conn = self.envolver(conn)
+        with self._lock:
+            self._abiertas.append(conn)
+        return conn
+
+    def escritura(self):
+        if self._compartida is not None:
+            return self._compartida
+        conn = getattr(self._local, 'escritura', None)
+        if conn is None:
+            conn = self._local.escritura = self._abrir(solo_lectura=False)
+        return conn
+
+    def lectura(self):
+        if self._compartida is not None:
+            return self._compartida
+        conn = getattr(self._local, 'lectura', None)
+        if conn is None:
+            # la de escritura crea el archivo y el -wal/-shm que necesita la de solo lectura
+            self.escritura()
+            conn = self._local.lectura = self._abrir(solo_lectura=True)
+        return conn
+
+    @staticmethod
+    def adjuntar(conn, alias, ruta):
+        """ATTACH de solo lectura de `ruta` como `alias`, si esa conexión no la tenía ya."""
+        adjuntas = [r[1] for r in conn.execute("PRAGMA database_list") if r[1] not in ('main', 'temp')]
+        if alias in adjuntas:
+            return
+        if len(adjuntas) >= MAX_ADJUNTAS:
+            # SQLite admite pocas a la vez: se suelta la más vieja
+            conn.execute(f"DETACH DATABASE {adjuntas[0]}")
+        conn.execute("ATTACH DATABASE ? AS " + alias, (f"{Path(ruta).resolve().as_uri()}?mode=ro",))
+
+    @contextmanager
+    def transaccion(self, al_confirmar=None):
+        """BEGIN IMMEDIATE ... COMMIT en la conexión de escritura del hilo; rollback si algo falla.
+
+        Dentro de otra transacción del mismo hilo es un SAVEPOINT: si falla se deshace solo
+        esa parte y lo confirmado queda para el COMMIT de la de afuera (group commit).
+        al_confirmar() es un context manager que envuelve el COMMIT (solo el de afuera)."""
+        conn = self.escritura()
+        cur = conn.cursor()
+        nivel = getattr(self._local, 'nivel', 0)
+        cur.execute(f"SAVEPOINT t{nivel}" if nivel else "BEGIN IMMEDIATE")
+        self._local.nivel = nivel + 1
+        try:
+            yield cur
+        except BaseException:
+            if nivel:
+                cur.execute(f"ROLLBACK TO t{nivel}")
+                cur.execute(f"RELEASE t{nivel}")
+            else:
+                conn.rollback()
+            raise
+        else:
+            if nivel:
+                cur.execute(f"RELEASE t{nivel}")
+            else:
+                try:
+                    with al_confirmar() if al_confirmar else nullcontext():
+                        conn.commit()
+                except BaseException:
+                    # un COMMIT rechazado (p. ej. una clave diferida) deja la transacción abierta
+                    conn.rollback()
+                    raise
+        finally:
+            self._local.nivel = nivel
+            cur.close()
+
+    def soltar_hilo(self):
+        """Cierra las conexiones del hilo actual (un hilo que termina, como los del servidor
+        HTTP, no debe dejarlas abiertas hasta cerrar()). Si las vuelve a pedir, se reabren."""
+        if self._compartida is not None or self.en_transaccion():
+            return
+        propias = [c for c in (getattr(self._local, 'escritura', None), getattr(self._local, 'lectura', None))
+                   if c is not None]
+        self._local.escritura = self._local.lectura = None
+        with self._lock:
+            self._abiertas = [c for c in self._abiertas if all(c is not p for p in propias)]
+        for conn in propias:
+            conn.close()
+
+    def en_transaccion(self):
+        """Si el hilo actual está dentro de transaccion()."""
+        return getattr(self._local, 'nivel', 0) > 0
+
+    def cerrar(self):
+        with self._lock:
+            abiertas, self._abiertas = self._abiertas, []
+        for conn in abiertas:
+            if conn.in_transaction:
+                conn.commit()
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,1278 @@
+"""Acceso a SQLite: esquema, migraciones y operaciones de tiendas, productos y ventas."""
+
+import functools
+import json
+import logging
+import os
+import sqlite3
+import stat
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from .agrupador import AgrupadorEscrituras
+from .cambios import AvisosCambios, Cambio
+from .catalogo import CatalogoProductos
+from .conexiones import GestorConexiones
+from .metricas import METRICAS, ConexionMedida, instrumentar
+from .registros import ItemVenta, Producto, Venta
+
+log = logging.getLogger('easystock.db')
+
+DB_FILE = "StockManager.db"
+TAM_PAGINA_HISTORIAL = 200  # ventas por página en el historial
+DIAS_DEMANDA = 28  # ventana del promedio exponencial de unidades vendidas por día
+ALFA_DEMANDA = 2 / (DIAS_DEMANDA + 1)
+
+
+# -------------------------
+# DB Manager (encapsula acceso a sqlite)
+# -------------------------
+class StockInsuficienteError(Exception):
+    """Venta rechazada: alguna línea pide más stock del disponible al momento de confirmar.
+
+    faltantes: lista de dicts {producto_id, producto, pedido, disponible}.
+    """
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        detalle = ', '.join(f"{f['producto']} (disponible {f['disponible']}, pedido {f['pedido']})" for f in faltantes)
+        super().__init__(f"Stock insuficiente: {detalle}")
+
+
+SQL_RECALCULAR_VENTAS_MES = """
+INSERT INTO ventas_mes (mes, producto, unidades, ingresos)
+SELECT strftime('%Y-%m', v.fecha), vi.producto, SUM(vi.cantidad), SUM(vi.subtotal)
+FROM venta_items vi
+JOIN ventas v ON vi.venta_id = v.id
+GROUP BY strftime('%Y-%m', v.fecha), vi.producto
+"""
+
+# Migraciones de esquema. La entrada i lleva la base a PRAGMA user_version = i + 1.
+# Cada paso es un SQL o una función que recibe el cursor. Solo se agregan al final.
+MIGRACIONES = [
+    # 1 - índices para las consultas habituales
+    (
+        "CREATE INDEX IF NOT EXISTS idx_productos_tienda ON productos(id_tienda)",
+        "CREATE INDEX IF NOT EXISTS idx_venta_items_venta ON venta_items(venta_id)",
+        "CREATE INDEX IF NOT EXISTS idx_venta_items_producto ON venta_items(producto)",
+        "CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas(fecha)",
+    ),
+    # 2 - resumen mensual por producto para el Top mensual (se mantiene en create/delete_venta)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS ventas_mes (
+            mes TEXT,
+            producto TEXT,
+            unidades INTEGER,
+            ingresos REAL,
+            PRIMARY KEY (mes, producto)
+        ) WITHOUT ROWID
+        """,
+        SQL_RECALCULAR_VENTAS_MES,
+    ),
+    # 3 - sucursal de cada venta (filtros por sucursal en historial y exportaciones)
+    (
+        lambda cur: _agregar_columna(cur, 'ventas', 'id_tienda', 'INTEGER'),
+        # ventas viejas: la sucursal de sus productos, si todos los nombres apuntan a una sola
+        """
+        UPDATE ventas SET id_tienda = (
+            SELECT MIN(p.id_tienda)
+            FROM venta_items vi
+            JOIN productos p ON p.nombre = vi.producto
+            WHERE vi.venta_id = ventas.id
+            HAVING COUNT(DISTINCT p.id_tienda) = 1
+        )
+        WHERE id_tienda IS NULL
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ventas_tienda_fecha ON ventas(id_tienda, fecha)",
+    ),
+    # 4 - años de ventas movidos a archivos aparte (archivar_ventas)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS archivos_ventas (
+            anio INTEGER PRIMARY KEY,
+            archivo TEXT NOT NULL,
+            ventas INTEGER,
+            items INTEGER,
+            creado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ),
+    # 5 - demanda por producto (reposición), mantenida en create/delete_venta
+    (
+        lambda cur: _agregar_columna(cur, 'venta_items', 'producto_id', 'INTEGER'),
+        # ítems viejos: el producto de ese nombre en la sucursal de la venta
+        """
+        CREATE TEMP TABLE nombres_productos AS
+        SELECT id_tienda, nombre, MIN(id) AS id FROM productos GROUP BY id_tienda, nombre
+        """,
+        "CREATE INDEX temp.idx_nombres_productos ON nombres_productos(nombre, id_tienda)",
+        """
+        UPDATE venta_items SET producto_id = (
+            SELECT n.id
+            FROM ventas v
+            JOIN nombres_productos n ON n.nombre = venta_items.producto AND n.id_tienda = v.id_tienda
+            WHERE v.id = venta_items.venta_id
+        )
+        WHERE producto_id IS NULL
+        """,
+        "DROP TABLE temp.nombres_productos",
+        """
+        CREATE TABLE IF NOT EXISTS demanda_productos (
+            producto_id INTEGER PRIMARY KEY,
+            tasa REAL NOT NULL,
+            dia TEXT NOT NULL
+        )
+        """,
+        lambda cur: _recalcular_demanda(cur),
+    ),
+    # 6 - búsqueda de productos en todas las sucursales (buscar_productos)
+    (
+        lambda cur: _crear_busqueda(cur),
+    ),
+]
+
+# Esquema de cada archivo anual: mismas tablas de ventas que la base activa
+ESQUEMA_ARCHIVO = """
+CREATE TABLE IF NOT EXISTS ventas (
+    id INTEGER PRIMARY KEY,
+    producto TEXT,
+    cantidad INTEGER,
+    total REAL,
+    fecha TIMESTAMP,
+    id_tienda INTEGER
+);
+CREATE TABLE IF NOT EXISTS venta_items (
+    id INTEGER PRIMARY KEY,
+    venta_id INTEGER,
+    producto TEXT,
+    cantidad INTEGER,
+    precio REAL,
+    subtotal REAL
+);
+CREATE TABLE IF NOT EXISTS ventas_mes (
+    mes TEXT,
+    producto TEXT,
+    unidades INTEGER,
+    ingresos REAL,
+    PRIMARY KEY (mes, producto)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas(fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_tienda_fecha ON ventas(id_tienda, fecha);
+CREATE INDEX IF NOT EXISTS idx_venta_items_venta ON venta_items(venta_id);
+"""
+
+
+def _agregar_columna(cur, tabla, columna, tipo):
+    if columna not in {r[1] for r in cur.execute(f"PRAGMA table_info({tabla})")}:
+        cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+
+
+# Índice FTS5 de nombre y código de barras, sin acentos ni mayúsculas ("azucar" encuentra
+# "Azúcar"). Es de contenido externo: los triggers lo mantienen al día con productos, y el
+# de UPDATE solo salta si cambia el nombre o el código, no con el stock de cada venta.
+SQL_BUSQUEDA = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+        nombre, codigo_barras,
+        content='productos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN
+        INSERT INTO productos_fts (rowid, nombre, codigo_barras) VALUES (new.id, new.nombre, new.codigo_barras);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN
+        INSERT INTO productos_fts (productos_fts, rowid, nombre, codigo_barras)
+        VALUES ('delete', old.id, old.nombre, old.codigo_barras);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_au AFTER UPDATE OF nombre, codigo_barras ON productos BEGIN
+        INSERT INTO productos_fts (productos_fts, rowid, nombre, codigo_barras)
+        VALUES ('delete', old.id, old.nombre, old.codigo_barras);
+        INSERT INTO productos_fts (rowid, nombre, codigo_barras) VALUES (new.id, new.nombre, new.codigo_barras);
+    END
+    """,
+    "INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')",
+)
+
+
+def _crear_busqueda(cur):
+    # sin FTS5 en el SQLite instalado, buscar_productos usa LIKE (sin ranking ni acentos)
+    if 'ENABLE_FTS5' not in {r[0] for r in cur.execute("PRAGMA compile_options")}:
+        return
+    for sql in SQL_BUSQUEDA:
+        cur.execute(sql)
+
+
+def _patron_like(texto):
+    # '%texto%' con los comodines de LIKE escapados (para usar con ESCAPE '\')
+    return '%' + texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _consulta_fts(texto):
+    # cada palabra como prefijo entre comillas (sin operadores de FTS5), todas obligatorias
+    return ' '.join('"' + palabra.replace('"', '""') + '"*' for palabra in texto.split())
+
+
+# Demanda: por producto, promedio exponencial de las unidades vendidas por día (tasa) al
+# día `dia`. Los días sin ventas cuentan como 0, así que para llevarla a otro día posterior
+# alcanza con multiplicar por (1 - ALFA_DEMANDA) ** días; por eso cada venta la actualiza sin
+# releer el historial. Las fechas son las de SQLite (UTC), como las de las ventas.
+def _decaer(tasa, dias):
+    return tasa * (1 - ALFA_DEMANDA) ** dias
+
+
+def _recalcular_demanda(cur):
+    # rehace demanda_productos desde venta_items; va en la transacción de quien llama
+    cur.execute("DELETE FROM demanda_productos")
+    filas, actual = [], None
+    for pid, dia, unidades in cur.execute(
+            "SELECT vi.producto_id, date(v.fecha), SUM(vi.cantidad) FROM venta_items vi "
+            "JOIN ventas v ON v.id = vi.venta_id WHERE vi.producto_id IS NOT NULL "
+            "GROUP BY vi.producto_id, date(v.fecha) ORDER BY vi.producto_id, date(v.fecha)").fetchall():
+        d = date.fromisoformat(dia).toordinal()
+        if actual is None or actual[0] != pid:
+            actual = [pid, 0.0, d]
+            filas.append(actual)
+        actual[1] = _decaer(actual[1], d - actual[2]) + ALFA_DEMANDA * unidades
+        actual[2] = d
+    cur.executemany("INSERT INTO demanda_productos (producto_id, tasa, dia) VALUES (?, ?, ?)",
+                    [(pid, tasa, date.fromordinal(d).isoformat()) for pid, tasa, d in filas])
+
+
+def _agrupable(metodo):
+    # con agrupar_escrituras() activo, la operación se confirma en el próximo lote del hilo
+    # escritor y se espera su resultado; dentro de una transacción (la del lote o una de
+    # quien llama) corre directamente, como SAVEPOINT
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        agrupador = self.agrupador
+        if agrupador is None or self.conexiones.en_transaccion():
+            return metodo(self, *args, **kwargs)
+        return agrupador.enviar(metodo, self, *args, **kwargs).result()
+    return envoltura
+
+
+def _agrupable_sola(metodo):
+    # como _agrupable, para escrituras largas: corre en el hilo escritor pero sola, entre
+    # dos lotes y con su propia transacción (ver AgrupadorEscrituras.enviar_sola)
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        agrupador = self.agrupador
+        if agrupador is None or self.conexiones.en_transaccion():
+            return metodo(self, *args, **kwargs)
+        return agrupador.enviar_sola(metodo, self, *args, **kwargs).result()
+    return envoltura
+
+
+class DBManager:
+    """Acceso a la base. Cada llamada usa un cursor propio sobre la conexión del hilo
+    (ver GestorConexiones): escrituras en la de escritura, consultas en la de solo lectura.
+
+    durabilidad: 'completa' (fsync en cada commit) o 'normal' (ver conexiones.DURABILIDAD);
+    por defecto la de EASYSTOCK_DURABILIDAD, o 'completa'. Varias escrituras de un mismo
+    hilo se confirman juntas dentro de `with db.transaccion():`; las de varios hilos, con
+    agrupar_escrituras().
+
+    Cada escritura confirmada emite Cambio(s) con los ids que tocó (suscribir()); revisar_cambios()
+    detecta las de otros procesos. `avisos` permite compartir las suscripciones con otro
+    DBManager del mismo proceso (el del EjecutorDB), cuyas escrituras no cuentan como externas.
+    """
+
+    def __init__(self, filename=DB_FILE, durabilidad=None, avisos=None):
+        self.filename = filename
+        envolver = (lambda conn: ConexionMedida(conn, METRICAS)) if METRICAS.activa else None
+        durabilidad = durabilidad or os.environ.get('EASYSTOCK_DURABILIDAD', 'completa')
+        self.conexiones = GestorConexiones(filename, envolver, durabilidad)
+        self.agrupador = None  # AgrupadorEscrituras, con agrupar_escrituras()
+        self._avisos_propios = avisos is None
+        self.avisos = avisos if avisos is not None else AvisosCambios(filename)
+        self._local = threading.local()  # avisos pendientes del COMMIT de la transacción del hilo
+        self._catalogos = {}  # id_tienda -> CatalogoProductos
+        self._busqueda = None  # si la base tiene productos_fts (ver _crear_busqueda)
+        if METRICAS.activa:
+            instrumentar(self)
+        self._ensure_schema()
+        if self._avisos_propios:
+            # lo que escribieron las migraciones (ANALYZE, índices) no es un cambio externo
+            self.avisos.despues_de_confirmar()
+
+    @property
+    def conn(self):
+        # conexión de escritura del hilo actual
+        return self.conexiones.escritura()
+
+    @contextmanager
+    def transaccion(self):
+        """BEGIN IMMEDIATE ... COMMIT (o SAVEPOINT, dentro de otra; ver GestorConexiones).
+        Los avisos de lo escrito adentro salen después del COMMIT de la de más afuera; si se
+        deshace, no sale ninguno."""
+        if self.conexiones.en_transaccion():
+            pendientes = getattr(self._local, 'avisos', None)
+            marca = len(pendientes) if pendientes is not None else None
+            try:
+                with self.conexiones.transaccion() as cur:
+                    yield cur
+            except BaseException:
+                if marca is not None:
+                    # lo avisado adentro se deshizo con el SAVEPOINT
+                    self._local.deshechos.extend(pendientes[marca:])
+                    del pendientes[marca:]
+                raise
+            return
+        self._local.avisos, self._local.deshechos = [], []
+        pendientes = None
+        try:
+            with self.conexiones.transaccion(al_confirmar=self.avisos.confirmando) as cur:
+                self.avisos.antes_de_confirmar()
+                yield cur
+            pendientes = self._local.avisos
+        finally:
+            deshechos = self._local.deshechos + (self._local.avisos if pendientes is None else [])
+            self._local.avisos = self._local.deshechos = None
+            self._resincronizar_catalogos(deshechos)
+        if pendientes:
+            self.avisos.emitir(pendientes)
+
+    def _resincronizar_catalogos(self, deshechos):
+        # los catálogos se parchean al volver cada escritura: si después se deshizo, se
+        # releen de la base (ya confirmada o deshecha) las filas que había tocado
+        ids = {i for c in deshechos if c.tabla == 'productos' for i in (*c.insertados, *c.actualizados, *c.borrados)}
+        if ids and self._catalogos:
+            filas = self.productos_por_ids(ids)
+            for cat in self._catalogos.values():
+                cat.sincronizar(filas, ids)
+
+    # Avisos de cambios
+    def suscribir(self, fn, tablas=None):
+        """fn(cambios) tras cada escritura confirmada (ver AvisosCambios.suscribir)."""
+        return self.avisos.suscribir(fn, tablas)
+
+    def revisar_cambios(self):
+        """Emite un Cambio externo si otro proceso escribió desde la última revisión."""
+        return self.avisos.revisar()
+
+    def _avisar(self, tabla, insertados=(), actualizados=(), borrados=()):
+        # las escrituras avisan después de su `with self.transaccion()`: si eso ya fue el
+        # COMMIT se emite ahora; si quedó dentro de otra transacción, al confirmarse esa
+        cambio = Cambio(tabla, insertados, actualizados, borrados, origen=self)
+        pendientes = getattr(self._local, 'avisos', None)
+        if pendientes is not None:
+            pendientes.append(cambio)
+        else:
+            self.avisos.emitir([cambio])
+
+    def agrupar_escrituras(self, lote_max=64, espera_ms=0):
+        """Group commit: desde ahora las escrituras de todos los hilos pasan por un hilo
+        escritor que confirma juntas las que llegan mientras se confirma el lote anterior
+        (y las que llegan dentro de espera_ms). Cada llamada sigue devolviendo su resultado
+        (el id nuevo, etc.) o su excepción, una vez confirmado el lote. Las largas (importar,
+        archivar, recalcular) corren solas en ese hilo, entre dos lotes. close() confirma
+        lo pendiente antes de cerrar."""
+        if self.agrupador is None:
+            self.agrupador = AgrupadorEscrituras(self, lote_max, espera_ms)
+        return self.agrupador
+
+    def _leer(self, sql, params=(), conn=None):
+        conn = conn or self.conexiones.lectura()
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+    def _leer_registros(self, clase, sql, params=(), conn=None):
+        # listados grandes: un registro con __slots__ por fila (easystock.registros), armado
+        # directamente por el row_factory, sin pasar por sqlite3.Row ni dict
+        cur = (conn or self.conexiones.lectura()).cursor()
+        cur.row_factory = clase.fabrica
+        try:
+            return cur.execute(sql, params).fetchall()
+        finally:
+            cur.close()
+
+    def version_datos(self):
+        """Valor que cambia cada vez que se confirma una escritura en la base, de este u otro
+        proceso (para invalidar cachés). data_version de la conexión de lectura ve los commits
+        de las demás conexiones; total_changes cubre la base en memoria, que comparte conexión."""
+        conn = self.conexiones.lectura()
+        return conn.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes
+
+    # Archivos de ventas
+    def _ruta_archivo(self, archivo):
+        # los archivos viven junto a la base activa
+        return os.path.join(os.path.dirname(os.path.abspath(self.filename)), archivo)
+
+    def _archivos_en_rango(self, conn, desde, hasta):
+        # (alias, ruta) de los archivos que pueden tener ventas entre desde y hasta, del más nuevo al más viejo
+        archivos = []
+        for a in self._leer("SELECT anio, archivo FROM archivos_ventas ORDER BY anio DESC", conn=conn):
+            if (desde and a['anio'] < int(desde[:4])) or (hasta and a['anio'] > int(hasta[:4])):
+                continue
+            archivos.append((f"archivo_{a['anio']}", self._ruta_archivo(a['archivo'])))
+        return archivos
+
+    @contextmanager
+    def _lectura_ventas(self, desde=None, hasta=None):
+        """Conexión de lectura con los archivos que pueden tener ventas entre desde y hasta
+        ('YYYY-MM-DD' o 'YYYY-MM', inclusive) ya adjuntados: `with ... as (conn, esquemas)`,
+        con 'main' primero; sin archivos es solo la base activa.
+
+        Todo lo que se lee adentro ve una sola instantánea (BEGIN ... COMMIT): si
+        archivar_ventas confirma en el medio, las ventas de ese año no quedan fuera de la base
+        activa y del archivo a la vez. Un archivo que falta en disco se saltea con una
+        advertencia. Dentro de otra lectura del mismo hilo (un generador abierto) se usa la
+        instantánea de esa, con los archivos que ya tenía adjuntados.
+        """
+        conn = self.conexiones.lectura()
+        if self.filename in ('', ':memory:'):
+            # una sola conexión compartida con las escrituras, y sin archivos
+            yield conn, ['main']
+            return
+        if conn.in_transaction:
+            adjuntas = {r[1] for r in conn.execute("PRAGMA database_list")}
+            yield conn, ['main'] + [a for a, _ in self._archivos_en_rango(conn, desde, hasta) if a in adjuntas]
+            return
+        while True:
+            # ATTACH no se puede dentro de una transacción: se adjunta antes y, ya dentro de
+            # la instantánea, se comprueba que no haya aparecido otro archivo entre medio
+            archivos = self._archivos_en_rango(conn, desde, hasta)
+            presentes = []
+            for alias, ruta in archivos:
+                if os.path.exists(ruta):
+                    self.conexiones.adjuntar(conn, alias, ruta)
+                    presentes.append(alias)
+                else:
+                    log.warning("falta el archivo de ventas %s: sus ventas no se incluyen", ruta)
+            conn.execute("BEGIN")
+            if self._archivos_en_rango(conn, desde, hasta) == archivos:
+                break
+            conn.commit()
+        try:
+            for alias in presentes:
+                conn.execute(f"SELECT 1 FROM {alias}.ventas LIMIT 1").fetchall()
+            yield conn, ['main'] + presentes
+        finally:
+            conn.commit()
+
+    def archivos_ventas(self):
+        return self._leer("SELECT anio, archivo, ventas, items, creado FROM archivos_ventas ORDER BY anio")
+
+    def anios_archivables(self):
+        # años ya cerrados que todavía tienen ventas en la base activa
+        return [r['anio'] for r in self._leer(
+            "SELECT DISTINCT CAST(strftime('%Y', fecha) AS INTEGER) AS anio FROM ventas "
+            "WHERE fecha < ? ORDER BY anio", (f"{datetime.now().year}-01-01",)
+        )]
+
+    @_agrupable_sola
+    def archivar_ventas(self, anio, compactar=False):
+        """Mueve las ventas de `anio` (ya cerrado), con sus ítems y su resumen mensual, a
+        <base>_ventas_<anio>.db, que queda de solo lectura. Historial, top y exportaciones
+        las siguen viendo. Devuelve (ventas, items) movidos. compactar=True hace VACUUM
+        de la base activa al final para devolver el espacio al disco.
+        """
+        if self.filename in ('', ':memory:'):
+            raise ValueError("Una base en memoria no se puede archivar")
+        if anio >= datetime.now().year:
+            raise ValueError(f"{anio} no está cerrado: solo se archivan años anteriores")
+        pendientes = self.anios_archivables()
+        if anio not in pendientes:
+            return 0, 0
+        if anio > pendientes[0]:
+            # los archivos se recorren como años consecutivos anteriores a la base activa
+            raise ValueError(f"Primero hay que archivar {pendientes[0]}")
+        archivo = f"{Path(self.filename).stem}_ventas_{anio}.db"
+        ruta = self._ruta_archivo(archivo)
+        desde, hasta = f"{anio}-01-01", f"{anio + 1}-01-01"
+        # el lock de escritura de la base activa se toma primero: nadie cambia esas ventas
+        # mientras se copian, y solo se borran una vez confirmada la copia
+        with self.transaccion() as cur:
+            self._copiar_a_archivo(ruta, desde, hasta)
+            cur.execute("DELETE FROM venta_items WHERE venta_id IN (SELECT id FROM ventas WHERE fecha >= ? AND fecha < ?)",
+                        (desde, hasta))
+            items = cur.rowcount
+            cur.execute("DELETE FROM ventas WHERE fecha >= ? AND fecha < ?", (desde, hasta))
+            ventas = cur.rowcount
+            cur.execute("DELETE FROM ventas_mes WHERE mes >= ? AND mes < ?", (desde[:7], hasta[:7]))
+            cur.execute(
+                """
+                INSERT INTO archivos_ventas (anio, archivo, ventas, items) VALUES (?, ?, ?, ?)
+                ON CONFLICT (anio) DO UPDATE SET
+                    ventas = ventas + excluded.ventas,
+                    items = items + excluded.items
+                """,
+                (anio, archivo, ventas, items)
+            )
+        if compactar:
+            self.conn.execute("VACUUM")
+        return ventas, items
+
+    def _copiar_a_archivo(self, ruta, desde, hasta):
+        if os.path.exists(ruta):
+            # ya había un archivo del año (ventas rezagadas): se vuelve a abrir para escritura
+            os.chmod(ruta, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+        arch = sqlite3.connect(ruta)
+        try:
+            # sin WAL: un archivo de solo lectura no puede crear el -shm
+            arch.execute("PRAGMA journal_mode=DELETE")
+            arch.executescript(ESQUEMA_ARCHIVO)
+            arch.execute("ATTACH DATABASE ? AS activa", (os.path.abspath(self.filename),))
+            with arch:
+                # OR IGNORE: si una copia anterior se interrumpió, repetirla no duplica nada
+                arch.execute(
+                    "INSERT OR IGNORE INTO main.ventas (id, producto, cantidad, total, fecha, id_tienda) "
+                    "SELECT id, producto, cantidad, total, fecha, id_tienda FROM activa.ventas "
+                    "WHERE fecha >= ? AND fecha < ?", (desde, hasta)
+                )
+                arch.execute(
+                    "INSERT OR IGNORE INTO main.venta_items (id, venta_id, producto, cantidad, precio, subtotal) "
+                    "SELECT vi.id, vi.venta_id, vi.producto, vi.cantidad, vi.precio, vi.subtotal "
+                    "FROM activa.venta_items vi JOIN activa.ventas v ON v.id = vi.venta_id "
+                    "WHERE v.fecha >= ? AND v.fecha < ?", (desde, hasta)
+                )
+            arch.execute("DETACH DATABASE activa")
+            with arch:
+                # el resumen del archivo se rehace con todos sus ítems
+                arch.execute("DELETE FROM ventas_mes")
+                arch.execute(SQL_RECALCULAR_VENTAS_MES)
+        finally:
+            arch.close()
+        os.chmod(ruta, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    def _ensure_schema(self):
+        with self.transaccion() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS tiendas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre TEXT
+            )
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS productos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre TEXT,
+                stock INTEGER,
+                precio REAL,
+                id_tienda INTEGER,
+                codigo_barras TEXT UNIQUE
+            )
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS ventas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                producto TEXT,
+                cantidad INTEGER,
+                total REAL,
+                fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS venta_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                venta_id INTEGER,
+                producto TEXT,
+                cantidad INTEGER,
+                precio REAL,
+                subtotal REAL,
+                FOREIGN KEY (venta_id) REFERENCES ventas(id) ON DELETE CASCADE
+            )
+            """)
+        self._migrar()
+
+    def _migrar(self):
+        # actualiza en el lugar bases existentes (StockManager.db) según PRAGMA user_version
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRACIONES):
+            return
+        for numero, pasos in enumerate(MIGRACIONES[version:], start=version + 1):
+            with self.transaccion() as cur:
+                for paso in pasos:
+                    if callable(paso):
+                        paso(cur)
+                    else:
+                        cur.execute(paso)
+                cur.execute(f"PRAGMA user_version = {numero}")
+        # estadísticas para que el planificador use los índices nuevos
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+
+    # Tiendas
+    def list_tiendas(self):
+        return self._leer("SELECT id, nombre FROM tiendas ORDER BY id")
+
+    @_agrupable
+    def add_tienda(self, nombre):
+        with self.transaccion() as cur:
+            cur.execute("INSERT INTO tiendas (nombre) VALUES (?)", (nombre,))
+            tid = cur.lastrowid
+        self._avisar('tiendas', insertados=[tid])
+        return tid
+
+    @_agrupable
+    def delete_tienda(self, id_tienda):
+        # la sucursal y todos sus productos, en una transacción; devuelve los productos borrados
+        with self.transaccion() as cur:
+            cur.execute("DELETE FROM demanda_productos WHERE producto_id IN "
+                        "(SELECT id FROM productos WHERE id_tienda = ?)", (id_tienda,))
+            productos = [r[0] for r in cur.execute("DELETE FROM productos WHERE id_tienda = ? RETURNING id",
+                                                   (id_tienda,))]
+            cur.execute("DELETE FROM tiendas WHERE id = ?", (id_tienda,))
+        self._catalogos.pop(id_tienda, None)
+        self._avisar('productos', borrados=productos)
+        self._avisar('tiendas', borrados=[id_tienda])
+        return len(productos)
+
+    # Productos
+    def list_productos(self, id_tienda=None):
+        if id_tienda is None:
+            return self._leer_registros(Producto, "SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos")
+        return self._leer_registros(
+            Producto, "SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos WHERE id_tienda = ?",
+            (id_tienda,)
+        )
+
+    @_agrupable_sola
+    def importar_productos(self, id_tienda, lotes):
+        """Inserta o actualiza (por codigo_barras) productos en una sola transacción.
+
+        lotes: iterable de listas de tuplas (fila, nombre, stock, precio, codigo_barras).
+        Un código que ya existe en esta tienda actualiza el producto; si pertenece a
+        otra tienda la fila se rechaza. Devuelve (insertados, actualizados, rechazados).
+        """
+        insertados = actualizados = 0
+        rechazados = []
+        ids_actualizados = []
+        with self.transaccion() as cur:
+            # con el lock de escritura tomado, las filas nuevas son las de id mayor a este
+            ultimo_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM productos").fetchone()[0]
+            for lote in lotes:
+                codigos = [f[4] for f in lote if f[4]]
+                existentes = {}
+                for i in range(0, len(codigos), 900):
+                    parte = codigos[i:i + 900]
+                    cur.execute(
+                        f"SELECT codigo_barras, id_tienda FROM productos WHERE codigo_barras IN ({','.join('?' * len(parte))})",
+                        parte
+                    )
+                    existentes.update((r[0], r[1]) for r in cur.fetchall())
+                nuevos, cambios = [], []
+                for fila, nombre, stock, precio, codigo in lote:
+                    if not codigo or codigo not in existentes:
+                        nuevos.append((nombre, stock, precio, id_tienda, codigo))
+                        if codigo:
+                            existentes[codigo] = id_tienda
+                    elif existentes[codigo] == id_tienda:
+                        cambios.append((nombre, stock, precio, codigo))
+                    else:
+                        rechazados.append((fila, 'código de barras usado en otra sucursal'))
+                cur.executemany(
+                    "INSERT INTO productos (nombre, stock, precio, id_tienda, codigo_barras) VALUES (?, ?, ?, ?, ?)",
+                    nuevos
+                )
+                cur.executemany(
+                    "UPDATE productos SET nombre=?, stock=?, precio=? WHERE codigo_barras=?",
+                    cambios
+                )
+                if cambios:
+                    ids_actualizados.extend(r[0] for r in cur.execute(
+                        "SELECT id FROM productos WHERE codigo_barras IN (SELECT value FROM json_each(?))",
+                        (json.dumps([c[3] for c in cambios]),)))
+                insertados += len(nuevos)
+                actualizados += len(cambios)
+            # AUTOINCREMENT no reutiliza ids: si se borró el de id más alto, los nuevos
+            # empiezan después de él y no en MAX(id) + 1; se leen los que asignó SQLite
+            nuevos = [r[0] for r in cur.execute("SELECT id FROM productos WHERE id > ? ORDER BY id", (ultimo_id,))]
+        cat = self._catalogos.get(id_tienda)
+        if cat is not None:
+            # en el lugar: las ventanas que muestran cat.productos siguen viendo la misma lista
+            tocados = [*nuevos, *ids_actualizados]
+            cat.sincronizar(self.productos_por_ids(tocados), tocados)
+        self._avisar('productos', insertados=nuevos, actualizados=ids_actualizados)
+        return insertados, actualizados, rechazados
+
+    def producto_por_codigo(self, codigo):
+        filas = self._leer_registros(
+            Producto, "SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos WHERE codigo_barras = ?",
+            (codigo,)
+        )
+        return filas[0] if filas else None
+
+    def catalogo(self, id_tienda, productos=None):
+        # catálogo compartido por todas las ventanas de la tienda
+        cat = self._catalogos.get(id_tienda)
+        if cat is None:
+            cat = self._catalogos[id_tienda] = CatalogoProductos(self, id_tienda, productos)
+        return cat
+
+    def tiene_catalogo(self, id_tienda):
+        return id_tienda in self._catalogos
+
+    def descartar_catalogos(self, excepto=None):
+        # tras un cambio externo: los catálogos que no se están mirando se releen al volver a pedirlos
+        for tid in [t for t in self._catalogos if t != excepto]:
+            del self._catalogos[tid]
+
+    def productos_por_ids(self, ids):
+        """Filas actuales de esos productos (los borrados no aparecen)."""
+        return self._leer_registros(
+            Producto, "SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos "
+                      "WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+            (json.dumps(list(ids)),)
+        )
+
+    @_agrupable
+    def add_producto(self, nombre, stock, precio, id_tienda, codigo_barras=None):
+        with self.transaccion() as cur:
+            cur.execute(
+                "INSERT INTO productos (nombre, stock, precio, id_tienda, codigo_barras) VALUES (?, ?, ?, ?, ?)",
+                (nombre, int(stock), float(precio), id_tienda, codigo_barras)
+            )
+            prod_id = cur.lastrowid
+        cat = self._catalogos.get(id_tienda)
+        if cat is not None:
+            cat._agregar(Producto(prod_id, nombre, int(stock), float(precio), id_tienda, codigo_barras))
+        self._avisar('productos', insertados=[prod_id])
+        return prod_id
+
+    @_agrupable
+    def update_producto(self, prod_id, nombre, stock, precio, codigo_barras):
+        with self.transaccion() as cur:
+            cur.execute(
+                "UPDATE productos SET nombre=?, stock=?, precio=?, codigo_barras=? WHERE id=?",
+                (nombre, int(stock), float(precio), codigo_barras, prod_id)
+            )
+        for cat in self._catalogos.values():
+            cat._actualizar(prod_id, nombre=nombre, stock=int(stock), precio=float(precio),
+                            codigo_barras=codigo_barras)
+        self._avisar('productos', actualizados=[prod_id])
+
+    @_agrupable
+    def delete_producto(self, prod_id):
+        with self.transaccion() as cur:
+            cur.execute("DELETE FROM productos WHERE id=?", (prod_id,))
+            cur.execute("DELETE FROM demanda_productos WHERE producto_id = ?", (prod_id,))
+        for cat in self._catalogos.values():
+            cat._quitar(prod_id)
+        self._avisar('productos', borrados=[prod_id])
+
+    def buscar_productos(self, texto, id_tienda=None, limite=50, offset=0):
+        """Productos de todas las sucursales (o de una) cuyo nombre o código empieza con cada
+        palabra de `texto`, sin importar acentos ni mayúsculas; los más relevantes primero.
+        Devuelve hasta `limite` dicts {id, nombre, stock, precio, id_tienda, tienda,
+        codigo_barras}; offset para las páginas siguientes."""
+        if not texto.strip():
+            return []
+        filtro, params = "", []
+        if id_tienda is not None:
+            filtro = "AND p.id_tienda = ?"
+            params.append(id_tienda)
+        if self._hay_busqueda():
+            # el nombre pesa más que el código en el ranking
+            return self._leer(
+                f"""
+                SELECT p.id, p.nombre, p.stock, p.precio, p.id_tienda, t.nombre AS tienda, p.codigo_barras
+                FROM productos_fts f
+                JOIN productos p ON p.id = f.rowid
+                LEFT JOIN tiendas t ON t.id = p.id_tienda
+                WHERE productos_fts MATCH ? {filtro}
+                ORDER BY bm25(productos_fts, 10.0, 1.0), p.id
+                LIMIT ? OFFSET ?
+                """,
+                (_consulta_fts(texto), *params, limite, offset)
+            )
+        condiciones, patrones = [], []
+        for palabra in texto.split():
+            condiciones.append("(p.nombre LIKE ? ESCAPE '\\' OR p.codigo_barras LIKE ? ESCAPE '\\')")
+            patrones += [_patron_like(palabra)] * 2
+        return self._leer(
+            f"""
+            SELECT p.id, p.nombre, p.stock, p.precio, p.id_tienda, t.nombre AS tienda, p.codigo_barras
+            FROM productos p
+            LEFT JOIN tiendas t ON t.id = p.id_tienda
+            WHERE {' AND '.join(condiciones)} {filtro}
+            ORDER BY p.nombre, p.id
+            LIMIT ? OFFSET ?
+            """,
+            (*patrones, *params, limite, offset)
+        )
+
+    def _hay_busqueda(self):
+        if self._busqueda is None:
+            self._busqueda = bool(self._leer("SELECT 1 FROM sqlite_master WHERE name = 'productos_fts'"))
+        return self._busqueda
+
+    # Operaciones masivas: una sentencia por operación, en una transacción
+    @staticmethod
+    def _filtro_productos(id_tienda=None, ids=None, contiene=None):
+        condiciones, params = [], []
+        if id_tienda is not None:
+            condiciones.append("id_tienda = ?")
+            params.append(id_tienda)
+        if ids is not None:
+            # la lista entera viaja como un solo parámetro JSON: sin límite de variables
+            condiciones.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(ids)))
+        if contiene:
+            condiciones.append("nombre LIKE ? ESCAPE '\\'")
+            params.append(_patron_like(contiene))
+        if not condiciones:
+            raise ValueError("Falta el filtro: sucursal, ids o texto")
+        return ' AND '.join(condiciones), params
+
+    @_agrupable
+    def actualizar_productos(self, id_tienda=None, ids=None, contiene=None,
+                             precio=None, porcentaje=None, stock=None, sumar_stock=None):
+        """Cambia precio y/o stock de los productos que cumplen el filtro (todos los dados).
+
+        precio fija el precio y porcentaje lo ajusta (10 = +10 %, redondeado a centavos);
+        stock lo fija y sumar_stock lo suma (sin bajar de 0). Devuelve los productos cambiados.
+        """
+        if (precio is not None and porcentaje is not None) or (stock is not None and sumar_stock is not None):
+            raise ValueError("precio/porcentaje y stock/sumar_stock se excluyen entre sí")
+        asignaciones, valores = [], []
+        if precio is not None:
+            asignaciones.append("precio = ?")
+            valores.append(float(precio))
+        elif porcentaje is not None:
+            asignaciones.append("precio = ROUND(precio * (1 + ? / 100.0), 2)")
+            valores.append(float(porcentaje))
+        if stock is not None:
+            asignaciones.append("stock = ?")
+            valores.append(int(stock))
+        elif sumar_stock is not None:
+            asignaciones.append("stock = MAX(0, stock + ?)")
+            valores.append(int(sumar_stock))
+        if not asignaciones:
+            raise ValueError("No hay cambios: indique precio, porcentaje, stock o sumar_stock")
+        where, params = self._filtro_productos(id_tienda, ids, contiene)
+        with self.transaccion() as cur:
+            cambiados = cur.execute(
+                f"UPDATE productos SET {', '.join(asignaciones)} WHERE {where} RETURNING id, precio, stock",
+                (*valores, *params)
+            ).fetchall()
+        for cat in self._catalogos.values():
+            for pid, precio_nuevo, stock_nuevo in cambiados:
+                cat._actualizar(pid, precio=float(precio_nuevo), stock=stock_nuevo)
+        self._avisar('productos', actualizados=[r[0] for r in cambiados])
+        return len(cambiados)
+
+    @_agrupable
+    def delete_productos(self, ids=None, id_tienda=None, contiene=None):
+        # borra los productos que cumplen el filtro; devuelve cuántos
+        where, params = self._filtro_productos(id_tienda, ids, contiene)
+        with self.transaccion() as cur:
+            borrados = [r[0] for r in cur.execute(f"DELETE FROM productos WHERE {where} RETURNING id", params)]
+            cur.execute("DELETE FROM demanda_productos WHERE producto_id IN (SELECT value FROM json_each(?))",
+                        (json.dumps(borrados),))
+        for cat in self._catalogos.values():
+            cat._quitar_varios(borrados)
+        self._avisar('productos', borrados=borrados)
+        return len(borrados)
+
+    # Ventas
+    @_agrupable
+    def create_venta(self, lineas, total):
+        # lineas: list of dicts {producto, producto_id, cantidad, precio, subtotal}
+        # Todo en una transacción BEGIN IMMEDIATE: si alguna línea no alcanza se deshace la venta entera.
+        try:
+            with self.transaccion() as cur:
+                venta_id = self._registrar_venta(cur, lineas, total)
+        except StockInsuficienteError:
+            # ya se deshizo la transacción: se informa el stock real de cada línea
+            raise StockInsuficienteError(self._lineas_sin_stock(lineas)) from None
+        for cat in self._catalogos.values():
+            cat.aplicar_venta(lineas)
+        self._avisar('ventas', insertados=[venta_id])
+        self._avisar('productos', actualizados={l['producto_id'] for l in lineas})
+        return venta_id
+
+    @_agrupable
+    def create_ventas(self, pedidos):
+        """Confirma varias ventas en una sola transacción (group commit).
+
+        pedidos: lista de (lineas, total). Cada venta va en su propio SAVEPOINT: si una
+        no tiene stock se deshace solo esa. Devuelve, en el mismo orden, el id de cada
+        venta o la StockInsuficienteError que le corresponde.
+        """
+        resultados = []
+        with self.transaccion() as cur:
+            for lineas, total in pedidos:
+                cur.execute("SAVEPOINT venta")
+                try:
+                    resultados.append(self._registrar_venta(cur, lineas, total))
+                except StockInsuficienteError:
+                    cur.execute("ROLLBACK TO venta")
+                    resultados.append(None)
+                cur.execute("RELEASE venta")
+        for i, (lineas, _) in enumerate(pedidos):
+            if resultados[i] is None:
+                # ya confirmado el lote: se informa el stock real de cada línea
+                resultados[i] = StockInsuficienteError(self._lineas_sin_stock(lineas))
+            else:
+                for cat in self._catalogos.values():
+                    cat.aplicar_venta(lineas)
+        confirmadas = [(r, lineas) for r, (lineas, _) in zip(resultados, pedidos) if isinstance(r, int)]
+        if confirmadas:
+            self._avisar('ventas', insertados=[r for r, _ in confirmadas])
+            self._avisar('productos', actualizados={l['producto_id'] for _, lineas in confirmadas for l in lineas})
+        return resultados
+
+    def _registrar_venta(self, cur, lineas, total):
+        # el stock se descuenta solo si alcanza (stock >= cantidad); va en la transacción de quien llama
+        cur.executemany(
+            "UPDATE productos SET stock = stock - ? WHERE id = ? AND stock >= ?",
+            [(l['cantidad'], l['producto_id'], l['cantidad']) for l in lineas]
+        )
+        if cur.rowcount < len(lineas):
+            raise StockInsuficienteError([])
+        cur.execute(
+            "INSERT INTO ventas (producto, cantidad, total, id_tienda) "
+            "VALUES (?, ?, ?, (SELECT id_tienda FROM productos WHERE id = ?))",
+            (None, None, total, lineas[0]['producto_id'])
+        )
+        venta_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO venta_items (venta_id, producto, cantidad, precio, subtotal, producto_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(venta_id, l['producto'], l['cantidad'], l['precio'], l['subtotal'], l['producto_id']) for l in lineas]
+        )
+        mes, dia = cur.execute("SELECT strftime('%Y-%m', fecha), date(fecha) FROM ventas WHERE id = ?",
+                               (venta_id,)).fetchone()
+        self._acumular_mes(cur, mes, [(l['producto'], l['cantidad'], l['subtotal']) for l in lineas])
+        unidades = {}
+        for l in lineas:
+            unidades[l['producto_id']] = unidades.get(l['producto_id'], 0) + l['cantidad']
+        self._acumular_demanda(cur, dia, unidades.items())
+        return venta_id
+
+    def _lineas_sin_stock(self, lineas):
+        # stock actual vs. lo pedido (sumando líneas repetidas del mismo producto)
+        pedido = {}
+        for l in lineas:
+            pedido[l['producto_id']] = pedido.get(l['producto_id'], 0) + l['cantidad']
+        faltantes = []
+        for pid, cant in pedido.items():
+            row = self.conn.execute("SELECT nombre, stock FROM productos WHERE id = ?", (pid,)).fetchone()
+            disponible = row['stock'] if row else 0
+            # de paso se corrige el stock que ven las ventanas
+            for cat in self._catalogos.values():
+                cat.actualizar_stock(pid, disponible)
+            if cant > disponible:
+                nombre = row['nombre'] if row else next(l['producto'] for l in lineas if l['producto_id'] == pid)
+                faltantes.append({'producto_id': pid, 'producto': nombre, 'pedido': cant, 'disponible': disponible})
+        return faltantes
+
+    def list_ventas(self):
+        with self._lectura_ventas() as (conn, esquemas):
+            return self._leer_registros(
+                Venta, " UNION ALL ".join(f"SELECT id, total, fecha FROM {e}.ventas" for e in esquemas)
+                + " ORDER BY fecha DESC",
+                conn=conn
+            )
+
+    def list_ventas_pagina(self, despues=None, limite=TAM_PAGINA_HISTORIAL, desde=None, hasta=None,
+                           total_min=None, total_max=None, id_tienda=None, ids=None):
+        """Página del historial, de la venta más nueva a la más vieja.
+
+        Paginación por clave: `despues` es (fecha, id) de la última venta de la página
+        anterior, así cada página cuesta lo mismo sin importar cuán atrás esté.
+        desde/hasta son fechas 'YYYY-MM-DD' (ambas inclusive). Incluye las ventas archivadas.
+        `ids` limita a esas ventas (las recién avisadas que cumplen los filtros).
+        """
+        # los archivos de años posteriores a la última venta ya mostrada no pueden aportar filas
+        tope = min(filter(None, (hasta, despues[0] if despues else None)), default=None)
+        condiciones, params = self._condiciones_fecha(desde, hasta)
+        if despues is not None:
+            condiciones.append("(fecha, id) < (?, ?)")
+            params.extend(despues)
+        if total_min is not None:
+            condiciones.append("total >= ?")
+            params.append(total_min)
+        if total_max is not None:
+            condiciones.append("total <= ?")
+            params.append(total_max)
+        if id_tienda is not None:
+            condiciones.append("id_tienda = ?")
+            params.append(id_tienda)
+        if ids is not None:
+            condiciones.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(ids)))
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        with self._lectura_ventas(desde, tope) as (conn, esquemas):
+            return self._leer_registros(
+                Venta, " UNION ALL ".join(f"SELECT id, total, fecha FROM {e}.ventas {where}" for e in esquemas)
+                + " ORDER BY fecha DESC, id DESC LIMIT ?",
+                (*params * len(esquemas), limite), conn=conn
+            )
+
+    @staticmethod
+    def _condiciones_fecha(desde, hasta, columna='fecha'):
+        # desde/hasta 'YYYY-MM-DD', ambas inclusive; comparaciones directas para usar el índice
+        condiciones, params = [], []
+        if desde:
+            condiciones.append(f"{columna} >= ?")
+            params.append(desde)
+        if hasta:
+            siguiente = datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1)
+            condiciones.append(f"{columna} < ?")
+            params.append(siguiente.strftime('%Y-%m-%d'))
+        return condiciones, params
+
+    def _iterar(self, sql, params=(), tam_lote=1000):
+        for lote in self._iterar_lotes(sql, params, tam_lote):
+            yield from lote
+
+    def _iterar_lotes(self, sql, params=(), tam_lote=1000, conn=None, tuplas=False):
+        # cursor propio en la conexión de lectura: el generador puede quedar abierto
+        # mientras se usan otros métodos. tuplas=True evita armar un sqlite3.Row por fila
+        cur = (conn or self.conexiones.lectura()).cursor()
+        if tuplas:
+            cur.row_factory = None
+        cur.execute(sql, params)
+        try:
+            while True:
+                filas = cur.fetchmany(tam_lote)
+                if not filas:
+                    break
+                yield filas
+        finally:
+            cur.close()
+
+    def iter_productos(self, id_tienda=None, tam_lote=1000):
+        # como list_productos pero sin materializar la lista (para volcados grandes)
+        if id_tienda is None:
+            return self._iterar("SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos ORDER BY id",
+                                tam_lote=tam_lote)
+        return self._iterar(
+            "SELECT id, nombre, stock, precio, id_tienda, codigo_barras FROM productos WHERE id_tienda = ? ORDER BY id",
+            (id_tienda,), tam_lote
+        )
+
+    def iter_ventas_items(self, desde=None, hasta=None, tam_lote=1000, id_tienda=None):
+        # una fila por ítem vendido, con los datos de su venta, en orden cronológico
+        for lote in self._lotes_ventas_items(
+                "v.id AS venta_id, v.fecha, v.total, vi.producto, vi.cantidad, vi.precio, vi.subtotal",
+                desde, hasta, id_tienda, tam_lote):
+            yield from lote
+
+    def lotes_ventas_items(self, desde=None, hasta=None, id_tienda=None, tam_lote=10_000):
+        """Como iter_ventas_items, pero de a listas de hasta tam_lote tuplas y con la sucursal:
+        (venta_id, fecha, id_tienda, total, producto, cantidad, precio, subtotal)."""
+        return self._lotes_ventas_items(
+            "v.id, v.fecha, v.id_tienda, v.total, vi.producto, vi.cantidad, vi.precio, vi.subtotal",
+            desde, hasta, id_tienda, tam_lote, tuplas=True
+        )
+
+    def _lotes_ventas_items(self, columnas, desde, hasta, id_tienda, tam_lote, tuplas=False):
+        condiciones, params = self._condiciones_fecha(desde, hasta, 'v.fecha')
+        if id_tienda is not None:
+            condiciones.append("v.id_tienda = ?")
+            params.append(id_tienda)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        # orden cronológico: los archivos (años cerrados, del más viejo al más nuevo) y
+        # después la base activa; archivar_ventas va siempre del año más viejo al más nuevo
+        with self._lectura_ventas(desde, hasta) as (conn, esquemas):
+            for e in esquemas[:0:-1] + ['main']:
+                yield from self._iterar_lotes(
+                    f"""
+                    SELECT {columnas}
+                    FROM {e}.ventas v
+                    JOIN {e}.venta_items vi ON vi.venta_id = v.id
+                    {where}
+                    ORDER BY v.fecha, v.id, vi.id
+                    """,
+                    params, tam_lote, conn, tuplas
+                )
+
+    # Lecturas por columnas para easystock.analitica: ventas e ítems por separado (sin join,
+    # que se hace en memoria); con despues_id, solo lo agregado desde una lectura anterior
+    def lotes_ventas(self, despues_id=None, tam_lote=50_000):
+        # (id, fecha, id_tienda, total) en orden cronológico, archivos incluidos
+        where, params = ("WHERE id > ?", (despues_id,)) if despues_id is not None else ("", ())
+        with self._lectura_ventas() as (conn, esquemas):
+            for e in esquemas[:0:-1] + ['main']:
+                yield from self._iterar_lotes(
+                    f"SELECT id, fecha, id_tienda, total FROM {e}.ventas {where} ORDER BY fecha, id",
+                    params, tam_lote, conn, tuplas=True
+                )
+
+    def lotes_items_ventas(self, despues_id=None, tam_lote=50_000):
+        # (venta_id, producto, cantidad, subtotal) en el orden en que se guardaron
+        where, params = ("WHERE venta_id > ?", (despues_id,)) if despues_id is not None else ("", ())
+        with self._lectura_ventas() as (conn, esquemas):
+            for e in esquemas[:0:-1] + ['main']:
+                yield from self._iterar_lotes(
+                    f"SELECT venta_id, producto, cantidad, subtotal FROM {e}.venta_items {where}",
+                    params, tam_lote, conn, tuplas=True
+                )
+
+    def conteo_ventas(self, hasta_id=None):
+        # (ventas, id máximo) de la base activa; con hasta_id cuenta solo las de id <= hasta_id
+        where, params = ("WHERE id <= ?", (hasta_id,)) if hasta_id is not None else ("", ())
+        fila = self.conexiones.lectura().execute(f"SELECT COUNT(*), MAX(id) FROM ventas {where}", params).fetchone()
+        return fila[0], fila[1]
+
+    def list_items_by_venta(self, venta_id):
+        return self.list_items_by_ventas([venta_id])[venta_id]
+
+    def list_items_by_ventas(self, venta_ids):
+        # ítems de varias ventas en una consulta: {venta_id: [items]}
+        items = {vid: [] for vid in venta_ids}
+        self._leer_items(self.conexiones.lectura(), 'main', venta_ids, items)
+        faltan = [vid for vid in venta_ids if not items[vid]]
+        if faltan and self._leer("SELECT 1 FROM archivos_ventas LIMIT 1"):
+            # ventas que no están en la base activa: se buscan en los archivos
+            with self._lectura_ventas() as (conn, esquemas):
+                for e in esquemas[1:]:
+                    self._leer_items(conn, e, faltan, items)
+        return items
+
+    def _leer_items(self, conn, esquema, venta_ids, items):
+        cur = conn.cursor()
+        cur.row_factory = None
+        try:
+            for i in range(0, len(venta_ids), 900):
+                parte = venta_ids[i:i + 900]
+                cur.execute(
+                    f"SELECT venta_id, producto, cantidad, precio, subtotal FROM {esquema}.venta_items "
+                    f"WHERE venta_id IN ({','.join('?' * len(parte))}) ORDER BY id",
+                    parte
+                )
+                for venta_id, *campos in cur.fetchall():
+                    items[venta_id].append(ItemVenta(*campos))
+        finally:
+            cur.close()
+
+    @_agrupable
+    def delete_venta(self, venta_id):
+        with self.transaccion() as cur:
+            row = cur.execute("SELECT strftime('%Y-%m', fecha), date(fecha) FROM ventas WHERE id = ?",
+                              (venta_id,)).fetchone()
+            if row is None and cur.execute("SELECT 1 FROM archivos_ventas LIMIT 1").fetchone():
+                # los archivos son de solo lectura
+                raise ValueError(f"La venta {venta_id} no está en la base activa: puede estar archivada")
+            if row is not None:
+                cur.execute(
+                    "SELECT producto, -SUM(cantidad), -SUM(subtotal) FROM venta_items WHERE venta_id = ? GROUP BY producto",
+                    (venta_id,)
+                )
+                self._acumular_mes(cur, row[0], cur.fetchall())
+                cur.execute(
+                    "SELECT producto_id, -SUM(cantidad) FROM venta_items "
+                    "WHERE venta_id = ? AND producto_id IS NOT NULL GROUP BY producto_id",
+                    (venta_id,)
+                )
+                self._acumular_demanda(cur, row[1], cur.fetchall())
+            cur.execute("DELETE FROM venta_items WHERE venta_id = ?", (venta_id,))
+            cur.execute("DELETE FROM ventas WHERE id = ?", (venta_id,))
+        if row is not None:
+            self._avisar('ventas', borrados=[venta_id])
+
+    @_agrupable_sola
+    def recalcular_ventas_mes(self):
+        # rehace el resumen mensual desde venta_items (tras cargas directas de ventas)
+        with self.transaccion() as cur:
+            cur.execute("DELETE FROM ventas_mes")
+            cur.execute(SQL_RECALCULAR_VENTAS_MES)
+
+    @staticmethod
+    def _acumular_mes(cur, mes, deltas):
+        # deltas: (producto, unidades, ingresos); va en la transacción de quien llama
+        cur.executemany(
+            """
+            INSERT INTO ventas_mes (mes, producto, unidades, ingresos) VALUES (?, ?, ?, ?)
+            ON CONFLICT (mes, producto) DO UPDATE SET
+                unidades = unidades + excluded.unidades,
+                ingresos = ingresos + excluded.ingresos
+            """,
+            [(mes, producto, unidades, ingresos) for producto, unidades, ingresos in deltas]
+        )
+        cur.execute("DELETE FROM ventas_mes WHERE mes = ? AND unidades <= 0", (mes,))
+
+    @staticmethod
+    def _acumular_demanda(cur, dia, deltas):
+        """Suma a la demanda de cada producto las unidades vendidas el `dia` ('YYYY-MM-DD');
+        con unidades negativas descuenta una venta borrada. deltas: (producto_id, unidades),
+        un par por producto. Va en la transacción de quien llama."""
+        deltas = list(deltas)
+        if not deltas:
+            return
+        d = date.fromisoformat(dia).toordinal()
+        actuales = {
+            pid: (tasa, date.fromisoformat(dia_fila).toordinal()) for pid, tasa, dia_fila in cur.execute(
+                "SELECT producto_id, tasa, dia FROM demanda_productos WHERE producto_id IN (SELECT value FROM json_each(?))",
+                (json.dumps([pid for pid, _ in deltas]),)
+            ).fetchall()
+        }
+        filas = []
+        for pid, unidades in deltas:
+            tasa, ref = actuales.get(pid, (0.0, d))
+            if d >= ref:
+                tasa, ref = _decaer(tasa, d - ref) + ALFA_DEMANDA * unidades, d
+            else:
+                # venta de un día anterior al último actualizado: su aporte ya decayó
+                tasa += _decaer(ALFA_DEMANDA * unidades, ref - d)
+            filas.append((pid, max(tasa, 0.0), date.fromordinal(ref).isoformat()))
+        cur.executemany(
+            "INSERT INTO demanda_productos (producto_id, tasa, dia) VALUES (?, ?, ?) "
+            "ON CONFLICT (producto_id) DO UPDATE SET tasa = excluded.tasa, dia = excluded.dia",
+            filas
+        )
+
+    @_agrupable_sola
+    def recalcular_demanda(self):
+        # rehace la demanda desde venta_items (tras cargas directas de ventas)
+        with self.transaccion() as cur:
+            _recalcular_demanda(cur)
+
+    def demanda_productos(self, id_tienda=None):
+        """Productos con su demanda tal como quedó guardada: lista de dicts {id, nombre, stock,
+        tasa, dias}, con dias = días desde la última actualización (la demanda de hoy es
+        tasa * (1 - ALFA_DEMANDA) ** dias). tasa 0 si nunca se vendieron. Ver easystock.reposicion."""
+        return self._leer(
+            "SELECT p.id, p.nombre, p.stock, COALESCE(d.tasa, 0) AS tasa, "
+            "COALESCE(CAST(julianday(date('now')) - julianday(d.dia) AS INTEGER), 0) AS dias "
+            "FROM productos p LEFT JOIN demanda_productos d ON d.producto_id = p.id"
+            + (" WHERE p.id_tienda = ?" if id_tienda is not None else ""),
+            (id_tienda,) if id_tienda is not None else ()
+        )
+
+    def top_por_mes(self, year_month):
+        # year_month: 'YYYY-MM'; una sola lectura del resumen mensual, se ordena en memoria
+        with self._lectura_ventas(year_month, year_month) as (conn, esquemas):
+            if len(esquemas) == 1:
+                filas = self._leer(
+                    "SELECT producto, unidades AS total_vendido, ingresos FROM ventas_mes WHERE mes = ?",
+                    (year_month,), conn
+                )
+            else:
+                # mes archivado (y quizá alguna venta rezagada en la base activa)
+                union = " UNION ALL ".join(
+                    f"SELECT producto, unidades, ingresos FROM {e}.ventas_mes WHERE mes = ?" for e in esquemas
+                )
+                filas = self._leer(
+                    f"SELECT producto, SUM(unidades) AS total_vendido, SUM(ingresos) AS ingresos FROM ({union}) "
+                    f"GROUP BY producto",
+                    (year_month,) * len(esquemas), conn
+                )
+        unidades = sorted(filas, key=lambda r: r['total_vendido'], reverse=True)
+        ingresos = sorted(filas, key=lambda r: r['ingresos'], reverse=True)
+        return unidades, ingresos
+
+    def soltar_conexiones(self):
+        # para hilos que terminan (ver GestorConexiones.soltar_hilo)
+        self.conexiones.soltar_hilo()
+
+    def close(self):
+        agrupador, self.agrupador = self.agrupador, None
+        if agrupador is not None:
+            agrupador.cerrar()  # confirma las escrituras encoladas
+        self.conexiones.cerrar()
+        if self._avisos_propios:
+            self.avisos.cerrar()
+        if METRICAS.activa:
+            METRICAS.exportar()
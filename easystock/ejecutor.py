@@ -0,0 +1,135 @@
+"""Ejecutor de consultas en un hilo propio, con resultados entregados al loop de Tk."""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+from .db import DB_FILE, DBManager
+
+
+# -------------------------
+# Ejecutor de consultas en segundo plano
+# -------------------------
+class EjecutorDB:
+    """Hilo dedicado, con su propia conexión, para que el loop de Tk no espere a SQLite.
+
+    enviar(fn) encola fn(db) (db es el DBManager del hilo) y devuelve un Future.
+    on_ok/on_error se llaman en el hilo de Tk: los resultados se recogen con after().
+    Con `clave`, un envío nuevo reemplaza al anterior de la misma clave: si no había
+    empezado se cancela y, si ya corrió, su resultado se descarta. Con `ventana`, el
+    resultado se descarta si la ventana ya se cerró. `abrir` crea el db del hilo a partir
+    de `filename` (DBManager, o ClienteDB con la URL del servidor en modo caja).
+
+    en_tk(fn) adapta un suscriptor de avisos de cambios (db.suscribir) para que corra en el
+    hilo de Tk: los avisos de una escritura hecha en el hilo del ejecutor se entregan antes
+    que el on_ok de ese mismo pedido.
+    """
+    POLL_MS = 15
+
+    def __init__(self, tk_root, filename=DB_FILE, abrir=DBManager):
+        self.tk_root = tk_root
+        self.filename = filename
+        self.abrir = abrir
+        self._pedidos = queue.Queue()
+        self._resultados = queue.Queue()
+        self._avisos = queue.Queue()  # (fn, args, ventana) que llegaron desde el hilo del ejecutor
+        self._hilo_tk = threading.current_thread()
+        self._vigentes = {}       # clave -> Future más reciente
+        self._pendientes = set()  # futures cuyo resultado falta recoger
+        self._poll_job = None
+        self._hilo = threading.Thread(target=self._trabajar, name='EjecutorDB', daemon=True)
+        self._hilo.start()
+
+    def enviar(self, fn, on_ok=None, on_error=None, clave=None, ventana=None):
+        fut = Future()
+        if clave is not None:
+            anterior = self._vigentes.get(clave)
+            if anterior is not None and anterior.cancel():
+                self._pendientes.discard(anterior)
+            self._vigentes[clave] = fut
+        self._pendientes.add(fut)
+        self._pedidos.put((fut, fn, on_ok, on_error, clave, ventana))
+        if self._poll_job is None:
+            self._poll_job = self.tk_root.after(self.POLL_MS, self._drenar)
+        return fut
+
+    def en_tk(self, fn, ventana=None):
+        """fn, llamada desde el hilo de Tk o desde el del ejecutor, corre en el de Tk (con
+        `ventana`, solo si sigue abierta)."""
+        def envuelta(*args):
+            if threading.current_thread() is self._hilo_tk:
+                if ventana is None or ventana.winfo_exists():
+                    fn(*args)
+            else:
+                # se recogen en _drenar: quien escribe en el ejecutor es un pedido pendiente
+                self._avisos.put((fn, args, ventana))
+        return envuelta
+
+    def _entregar_avisos(self):
+        while True:
+            try:
+                fn, args, ventana = self._avisos.get_nowait()
+            except queue.Empty:
+                return
+            if ventana is not None and not ventana.winfo_exists():
+                continue
+            try:
+                fn(*args)
+            except Exception as exc:
+                self.tk_root.report_callback_exception(type(exc), exc, exc.__traceback__)
+
+    def _trabajar(self):
+        db = self.abrir(self.filename)
+        try:
+            while True:
+                pedido = self._pedidos.get()
+                if pedido is None:
+                    break
+                fut, fn = pedido[0], pedido[1]
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                try:
+                    fut.set_result(fn(db))
+                except BaseException as e:
+                    fut.set_exception(e)
+                self._resultados.put(pedido)
+        finally:
+            db.close()
+
+    def _drenar(self):
+        self._poll_job = None
+        while True:
+            try:
+                pedido = self._resultados.get_nowait()
+            except queue.Empty:
+                pedido = None
+            # los avisos de este pedido ya están en la cola: van antes que su on_ok
+            self._entregar_avisos()
+            if pedido is None:
+                break
+            fut, fn, on_ok, on_error, clave, ventana = pedido
+            self._pendientes.discard(fut)
+            if clave is not None:
+                if self._vigentes.get(clave) is not fut:
+                    continue  # reemplazado por un pedido más nuevo
+                del self._vigentes[clave]
+            if ventana is not None and not ventana.winfo_exists():
+                continue
+            exc = fut.exception()
+            if exc is None:
+                if on_ok:
+                    on_ok(fut.result())
+            elif on_error:
+                on_error(exc)
+            else:
+                self.tk_root.report_callback_exception(type(exc), exc, exc.__traceback__)
+        if self._pendientes:
+            self._poll_job = self.tk_root.after(self.POLL_MS, self._drenar)
+
+    def cerrar(self):
+        # espera a que terminen los pedidos ya encolados (p. ej. una venta)
+        if self._poll_job is not None:
+            self.tk_root.after_cancel(self._poll_job)
+            self._poll_job = None
+        self._pedidos.put(None)
+        self._hilo.join()
@@ -0,0 +1,102 @@
+"""Exportación del historial de ventas (una fila por ítem) a CSV, XLSX o Parquet, usable sin GUI.
+
+Se lee de a lotes de la base y cada lote se escribe antes de leer el siguiente, así la memoria
+no depende del largo del historial. openpyxl y pyarrow se importan solo si se piden.
+"""
+
+import csv
+import os
+
+TAM_LOTE_EXPORTACION = 10_000  # filas leídas/escritas por lote al exportar
+COLUMNAS_EXPORTACION = ('venta_id', 'fecha', 'id_tienda', 'total', 'producto', 'cantidad', 'precio', 'subtotal')
+FORMATOS = ('csv', 'xlsx', 'parquet')
+MAX_FILAS_HOJA = 1_048_575  # filas de datos por hoja de Excel (más el encabezado)
+
+
+# -------------------------
+# Escritores por formato
+# -------------------------
+def _escribir_csv(ruta, lotes):
+    with open(ruta, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(COLUMNAS_EXPORTACION)
+        for lote in lotes:
+            w.writerows(lote)
+
+
+def _escribir_xlsx(ruta, lotes):
+    from openpyxl import Workbook
+    # write_only: las filas van directo al archivo, no quedan en memoria
+    wb = Workbook(write_only=True)
+    ws, en_hoja, hojas = None, MAX_FILAS_HOJA, 0
+    for lote in lotes:
+        for fila in lote:
+            if en_hoja == MAX_FILAS_HOJA:
+                # Excel no admite más filas por hoja: se sigue en ventas_2, ventas_3...
+                hojas += 1
+                ws = wb.create_sheet('ventas' if hojas == 1 else f'ventas_{hojas}')
+                ws.append(COLUMNAS_EXPORTACION)
+                en_hoja = 0
+            ws.append(tuple(fila))
+            en_hoja += 1
+    if ws is None:
+        wb.create_sheet('ventas').append(COLUMNAS_EXPORTACION)
+    wb.save(ruta)
+
+
+def _escribir_parquet(ruta, lotes):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    esquema = pa.schema([
+        ('venta_id', pa.int64()), ('fecha', pa.string()), ('id_tienda', pa.int64()), ('total', pa.float64()),
+        ('producto', pa.string()), ('cantidad', pa.int64()), ('precio', pa.float64()), ('subtotal', pa.float64()),
+    ])
+    # cada lote es un row group: se escribe y se libera
+    with pq.ParquetWriter(ruta, esquema) as writer:
+        for lote in lotes:
+            columnas = list(zip(*lote))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=campo.type) for col, campo in zip(columnas, esquema)], schema=esquema
+            ))
+
+
+ESCRITORES = {'csv': _escribir_csv, 'xlsx': _escribir_xlsx, 'parquet': _escribir_parquet}
+
+
+def formato_de(ruta):
+    ext = os.path.splitext(ruta)[1].lower().lstrip('.')
+    if ext not in FORMATOS:
+        raise ValueError(f"Formato no soportado: '{ext or ruta}'. Use .csv, .xlsx o .parquet")
+    return ext
+
+
+def exportar_ventas(db, ruta, formato=None, desde=None, hasta=None, id_tienda=None,
+                    progreso=None, tam_lote=TAM_LOTE_EXPORTACION):
+    """Escribe los ítems vendidos (con los datos de su venta) en `ruta`. Devuelve las filas escritas.
+
+    formato: 'csv', 'xlsx' o 'parquet' (por defecto, según la extensión de la ruta).
+    desde/hasta: 'YYYY-MM-DD', ambas inclusive. progreso(filas) se llama después de cada lote.
+    """
+    formato = formato or formato_de(ruta)
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato no soportado: '{formato}'. Use csv, xlsx o parquet")
+    total = 0
+
+    def lotes():
+        nonlocal total
+        for lote in db.lotes_ventas_items(desde, hasta, id_tienda, tam_lote):
+            yield lote
+            total += len(lote)
+            if progreso:
+                progreso(total)
+
+    # se escribe en un temporal: si algo falla a mitad no queda un archivo truncado con el nombre final
+    tmp = f"{ruta}.tmp"
+    try:
+        ESCRITORES[formato](tmp, lotes())
+        os.replace(tmp, ruta)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return total
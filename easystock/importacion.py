@@ -0,0 +1,120 @@
+"""Importación masiva de productos desde Excel/CSV, usable sin GUI."""
+
+import csv
+
+import pandas as pd
+
+TAM_LOTE_IMPORTACION = 5000  # filas leídas/escritas por lote al importar
+
+
+# -------------------------
+# Importación masiva de productos (Excel/CSV, sin GUI)
+# -------------------------
+def _leer_por_lotes(ruta, tam_lote):
+    # genera DataFrames de hasta tam_lote filas sin cargar el archivo entero
+    ext = ruta.lower().rsplit('.', 1)[-1]
+    if ext in ('csv', 'txt'):
+        # el Excel en español exporta CSV con ';'
+        with open(ruta, newline='', encoding='utf-8-sig') as f:
+            sep = ';' if f.readline().count(';') > 0 else ','
+        yield from pd.read_csv(ruta, chunksize=tam_lote, dtype=str, keep_default_na=False, sep=sep, encoding='utf-8-sig')
+        return
+    if ext == 'xls':
+        # formato viejo: openpyxl no lo lee en modo streaming
+        df = pd.read_excel(ruta)
+        for i in range(0, len(df), tam_lote):
+            yield df.iloc[i:i + tam_lote]
+        return
+    from openpyxl import load_workbook
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = wb.active.iter_rows(values_only=True)
+        encabezado = [str(c).strip() if c is not None else '' for c in next(filas, ())]
+        n = len(encabezado)
+        lote = []
+        for fila in filas:
+            lote.append(tuple(fila[:n]) + (None,) * (n - len(fila)))
+            if len(lote) >= tam_lote:
+                yield pd.DataFrame(lote, columns=encabezado)
+                lote = []
+        if lote:
+            yield pd.DataFrame(lote, columns=encabezado)
+    finally:
+        wb.close()
+
+
+def _a_numero(serie):
+    # acepta "12,50" además de "12.50"
+    return pd.to_numeric(serie.astype('string').str.strip().str.replace(',', '.', regex=False), errors='coerce')
+
+
+def _validar_lote(df, primera_fila):
+    """Valida y convierte un lote de forma vectorizada.
+
+    Devuelve (filas válidas como tuplas (fila, nombre, stock, precio, codigo_barras),
+    rechazados como [(fila, motivo)]). primera_fila es el número de fila del archivo.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    faltan = [c for c in ('nombre', 'stock', 'precio') if c not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas: {', '.join(faltan)} (opcional: codigo_barras)")
+    df = df.reset_index(drop=True)
+    fila = pd.Series(range(primera_fila, primera_fila + len(df)))
+    nombre = df['nombre'].astype('string').fillna('').str.strip()
+    stock = _a_numero(df['stock'])
+    precio = _a_numero(df['precio'])
+    if 'codigo_barras' in df.columns:
+        codigo = df['codigo_barras'].astype('string').str.strip()
+        # Excel guarda los códigos numéricos como float: 7790001.0 -> "7790001"
+        codigo = codigo.str.replace(r'\.0$', '', regex=True).replace('', pd.NA)
+    else:
+        codigo = pd.Series(pd.NA, index=df.index, dtype='string')
+
+    motivo = pd.Series(None, index=df.index, dtype=object)
+    motivo = motivo.mask(precio.isna() | (precio < 0), 'precio inválido')
+    motivo = motivo.mask(stock.isna() | (stock % 1 != 0) | (stock < 0), 'stock inválido')
+    motivo = motivo.mask(nombre == '', 'nombre vacío')
+    malos = motivo.notna()
+
+    ok = ~malos
+    validos = list(zip(
+        fila[ok].tolist(),
+        nombre[ok].tolist(),
+        stock[ok].astype('int64').tolist(),
+        precio[ok].astype(float).tolist(),
+        codigo[ok].astype(object).where(codigo[ok].notna(), None).tolist(),
+    ))
+    rechazados = list(zip(fila[malos].tolist(), motivo[malos].tolist()))
+    return validos, rechazados
+
+
+def importar_productos(db, ruta, id_tienda, progreso=None, tam_lote=TAM_LOTE_IMPORTACION):
+    """Importa productos de un Excel/CSV a una tienda, leyendo y escribiendo por lotes.
+
+    progreso(filas_leidas) se llama después de cada lote. Todo se escribe en una sola
+    transacción: si algo falla no queda nada a medias. Devuelve un dict con
+    insertados, actualizados y rechazados ([(fila, motivo)] ordenado por fila).
+    """
+    rechazados = []
+
+    def lotes():
+        leidas = 0
+        for df in _leer_por_lotes(ruta, tam_lote):
+            validos, malos = _validar_lote(df, primera_fila=leidas + 2)  # fila 1 = encabezado
+            rechazados.extend(malos)
+            leidas += len(df)
+            yield validos
+            if progreso:
+                progreso(leidas)
+
+    insertados, actualizados, rechazados_db = db.importar_productos(id_tienda, lotes())
+    rechazados.extend(rechazados_db)
+    rechazados.sort()
+    return {'insertados': insertados, 'actualizados': actualizados, 'rechazados': rechazados}
+
+
+def guardar_reporte_rechazados(rechazados, ruta):
+    with open(ruta, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['fila', 'motivo'])
+        w.writerows(rechazados)
@@ -0,0 +1,336 @@
+"""Instrumentación opcional de DBManager: conteos, latencias, filas y consultas lentas.
+
+Se activa con activar() o con variables de entorno antes de abrir la base:
+  EASYSTOCK_METRICAS=/ruta/metricas.prom   exporta los contadores en formato texto de Prometheus
+  EASYSTOCK_SQL_LENTO_MS=200               registra (logger 'easystock.sql') las sentencias más
+                                           lentas que el umbral, con su EXPLAIN QUERY PLAN
+Desactivada no cuesta nada: DBManager solo se envuelve si está activa al crearse.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+log = logging.getLogger('easystock.sql')
+
+# límites de los buckets de latencia, en segundos
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# métodos de DBManager que se miden (los iter_* devuelven generadores: se mediría solo su creación)
+METODOS_MEDIDOS = (
+    'list_tiendas', 'add_tienda', 'list_productos', 'add_producto', 'update_producto', 'delete_producto',
+    'importar_productos', 'create_venta', 'create_ventas', 'list_ventas', 'list_ventas_pagina',
+    'list_items_by_venta', 'list_items_by_ventas', 'delete_venta', 'top_por_mes', 'recalcular_ventas_mes',
+    'archivar_ventas', 'delete_tienda', 'actualizar_productos', 'delete_productos', 'demanda_productos',
+    'recalcular_demanda', 'buscar_productos', 'productos_por_ids',
+)
+
+
+class _Histograma:
+    __slots__ = ('cuentas', 'suma', 'n')
+
+    def __init__(self):
+        self.cuentas = [0] * (len(BUCKETS) + 1)
+        self.suma = 0.0
+        self.n = 0
+
+    def observar(self, segundos):
+        self.cuentas[bisect_left(BUCKETS, segundos)] += 1
+        self.suma += segundos
+        self.n += 1
+
+
+class Metricas:
+    def __init__(self):
+        self.activa = False
+        self.umbral_lento = None  # segundos
+        self.archivo = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.metodos = {}      # nombre -> _Histograma
+            self.sentencias = {}   # sql normalizado -> _Histograma
+            self.filas = {}        # sql normalizado -> filas devueltas
+            self.errores = {}      # nombre de método -> excepciones
+            self.espera_bloqueo = _Histograma()  # tiempo en BEGIN IMMEDIATE (esperando el lock de escritura)
+            self.commits = _Histograma()
+            self.bloqueos = 0      # "database is locked" que llegaron a la aplicación
+            self.lentas = 0
+
+    def activar(self, umbral_lento_ms=None, archivo=None, intervalo_s=60):
+        self.activa = True
+        self.umbral_lento = umbral_lento_ms / 1000 if umbral_lento_ms else None
+        self.archivo = archivo
+        if archivo and intervalo_s and self._timer is None:
+            self._programar(intervalo_s)
+
+    def desactivar(self):
+        # las DBManager ya instrumentadas siguen midiendo; afecta a las que se abran después
+        self.activa = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _programar(self, intervalo_s):
+        def tick():
+            self.exportar()
+            self._programar(intervalo_s)
+        self._timer = threading.Timer(intervalo_s, tick)
+        self._timer.daemon = True
+        self._timer.start()
+
+    # ---- registro ----
+    def registrar_metodo(self, nombre, segundos, error=False):
+        with self._lock:
+            self.metodos.setdefault(nombre, _Histograma()).observar(segundos)
+            if error:
+                self.errores[nombre] = self.errores.get(nombre, 0) + 1
+
+    def registrar_sentencia(self, sql, segundos):
+        clave = _normalizar_sql(sql)
+        with self._lock:
+            self.sentencias.setdefault(clave, _Histograma()).observar(segundos)
+            if clave.startswith('BEGIN IMMEDIATE'):
+                self.espera_bloqueo.observar(segundos)
+        return clave
+
+    def sumar_filas(self, clave, n):
+        with self._lock:
+            self.filas[clave] = self.filas.get(clave, 0) + n
+
+    def registrar_commit(self, segundos):
+        with self._lock:
+            self.commits.observar(segundos)
+
+    def registrar_bloqueo(self):
+        with self._lock:
+            self.bloqueos += 1
+
+    def es_lenta(self, segundos):
+        return self.umbral_lento is not None and segundos >= self.umbral_lento
+
+    def registrar_lenta(self, conn, sql, params, segundos):
+        with self._lock:
+            self.lentas += 1
+        plan = ''
+        if re.match(r'\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b', sql, re.IGNORECASE):
+            try:
+                filas = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+                plan = '\n'.join(f"  {r[3]}" for r in filas)
+            except Exception as e:  # el plan es informativo; no debe romper la operación
+                plan = f"  (sin plan: {e})"
+        if plan:
+            log.warning("SQL lenta (%.1f ms): %s\n%s", segundos * 1000, _normalizar_sql(sql), plan)
+        else:
+            log.warning("SQL lenta (%.1f ms): %s", segundos * 1000, _normalizar_sql(sql))
+
+    # ---- exportación ----
+    def texto_prometheus(self):
+        lineas = []
+
+        def histograma(nombre, ayuda, datos, etiqueta=None):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} histogram")
+            for valor, h in datos:
+                base = f'{etiqueta}="{_escapar(valor)}",' if etiqueta else ''
+                acumulado = 0
+                for limite, c in zip(BUCKETS + (float('inf'),), h.cuentas):
+                    acumulado += c
+                    le = '+Inf' if limite == float('inf') else repr(limite)
+                    lineas.append(f'{nombre}_bucket{{{base}le="{le}"}} {acumulado}')
+                sel = f'{{{base.rstrip(",")}}}' if base else ''
+                lineas.append(f"{nombre}_sum{sel} {h.suma:.6f}")
+                lineas.append(f"{nombre}_count{sel} {h.n}")
+
+        def contador(nombre, ayuda, datos, etiqueta=None):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} counter")
+            for valor, n in datos:
+                sel = f'{{{etiqueta}="{_escapar(valor)}"}}' if etiqueta else ''
+                lineas.append(f"{nombre}{sel} {n}")
+
+        with self._lock:
+            histograma('easystock_db_metodo_segundos', 'Duración de los métodos de DBManager.',
+                       sorted(self.metodos.items()), 'metodo')
+            contador('easystock_db_metodo_errores_total', 'Excepciones por método.',
+                     sorted(self.errores.items()), 'metodo')
+            histograma('easystock_db_sql_segundos', 'Duración de execute() por sentencia.',
+                       sorted(self.sentencias.items()), 'sql')
+            contador('easystock_db_sql_filas_total', 'Filas devueltas por sentencia.',
+                     sorted(self.filas.items()), 'sql')
+            histograma('easystock_db_espera_bloqueo_segundos', 'Espera del lock de escritura (BEGIN IMMEDIATE).',
+                       [(None, self.espera_bloqueo)])
+            histograma('easystock_db_commit_segundos', 'Duración de los commits.', [(None, self.commits)])
+            contador('easystock_db_bloqueos_total', 'Errores "database is locked".', [(None, self.bloqueos)])
+            contador('easystock_db_sql_lentas_total', 'Sentencias por encima del umbral.', [(None, self.lentas)])
+        return '\n'.join(lineas) + '\n'
+
+    def exportar(self, archivo=None):
+        archivo = archivo or self.archivo
+        if not archivo:
+            return
+        # escritura atómica: el scraper nunca ve un archivo a medias
+        tmp = f"{archivo}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.texto_prometheus())
+        os.replace(tmp, archivo)
+
+
+METRICAS = Metricas()
+
+
+def _normalizar_sql(sql):
+    # un IN (?, ?, ...) o VALUES de largo variable sería una etiqueta nueva por cada largo
+    sql = ' '.join(sql.split())
+    sql = re.sub(r'\(\?(?:,\s*\?)*\)', '(?…)', sql)
+    return re.sub(r'\(\?…\)(?:,\s*\(\?…\))+', '(?…), …', sql)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# -------------------------
+# Envoltorios de conexión y cursor
+# -------------------------
+class CursorMedido:
+    """Cursor de sqlite3 que mide cada execute y cuenta las filas leídas."""
+
+    __slots__ = ('_cur', '_conn', '_m', '_clave')
+
+    def __init__(self, cur, conn, metricas):
+        self._cur = cur
+        self._conn = conn  # conexión sin envolver, para EXPLAIN QUERY PLAN
+        self._m = metricas
+        self._clave = None
+
+    def _medir(self, metodo, sql, params):
+        t = time.perf_counter()
+        try:
+            metodo(sql, params)
+        except Exception as e:
+            if 'locked' in str(e):
+                self._m.registrar_bloqueo()
+            raise
+        finally:
+            dt = time.perf_counter() - t
+            self._clave = self._m.registrar_sentencia(sql, dt)
+        if self._m.es_lenta(dt):
+            self._m.registrar_lenta(self._conn, sql, params if metodo == self._cur.execute else (), dt)
+        return self
+
+    def execute(self, sql, params=()):
+        return self._medir(self._cur.execute, sql, params)
+
+    def executemany(self, sql, seq):
+        return self._medir(self._cur.executemany, sql, seq)
+
+    def fetchone(self):
+        r = self._cur.fetchone()
+        if r is not None:
+            self._m.sumar_filas(self._clave, 1)
+        return r
+
+    def fetchmany(self, size=None):
+        filas = self._cur.fetchmany(size) if size is not None else self._cur.fetchmany()
+        self._m.sumar_filas(self._clave, len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = self._cur.fetchall()
+        self._m.sumar_filas(self._clave, len(filas))
+        return filas
+
+    def __iter__(self):
+        n = 0
+        try:
+            for r in self._cur:
+                n += 1
+                yield r
+        finally:
+            self._m.sumar_filas(self._clave, n)
+
+    @property
+    def row_factory(self):
+        return self._cur.row_factory
+
+    @row_factory.setter
+    def row_factory(self, fabrica):
+        self._cur.row_factory = fabrica
+
+    def __getattr__(self, nombre):
+        return getattr(self._cur, nombre)
+
+
+class ConexionMedida:
+    """Conexión de sqlite3 con commits medidos y cursores CursorMedido."""
+
+    def __init__(self, conn, metricas):
+        self._conn = conn
+        self._m = metricas
+
+    def cursor(self):
+        return CursorMedido(self._conn.cursor(), self._conn, self._m)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def commit(self):
+        t = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._m.registrar_commit(time.perf_counter() - t)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+def instrumentar(db, metricas=METRICAS):
+    """Envuelve los métodos públicos de una DBManager (las conexiones las envuelve su
+    GestorConexiones con ConexionMedida al abrirlas)."""
+    for nombre in METODOS_MEDIDOS:
+        metodo = getattr(db, nombre, None)
+        if metodo is not None:
+            setattr(db, nombre, _medir_metodo(nombre, metodo, metricas))
+
+
+def _medir_metodo(nombre, metodo, metricas):
+    @wraps(metodo)
+    def medido(*args, **kwargs):
+        t = time.perf_counter()
+        error = False
+        try:
+            return metodo(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            metricas.registrar_metodo(nombre, time.perf_counter() - t, error)
+    return medido
+
+
+def _desde_entorno():
+    archivo = os.environ.get('EASYSTOCK_METRICAS')
+    umbral = os.environ.get('EASYSTOCK_SQL_LENTO_MS')
+    if archivo or umbral:
+        METRICAS.activar(umbral_lento_ms=float(umbral) if umbral else None, archivo=archivo or None)
+
+
+_desde_entorno()
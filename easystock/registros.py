@@ -0,0 +1,85 @@
+"""Filas compactas para los listados grandes: productos, ventas e ítems de venta.
+
+Un dict por fila pesa casi el doble que un objeto con __slots__ y, con el catálogo entero
+en memoria, eso son cientos de MB y pausas del recolector. Los registros se leen con
+registro['campo'] igual que un dict (la interfaz no distingue si vienen de DBManager o,
+como dicts, de ClienteDB), y también como atributos.
+"""
+
+
+class Registro:
+    """Base: acceso por clave además de por atributo. Los campos son los __slots__."""
+
+    __slots__ = ()
+
+    @classmethod
+    def fabrica(cls, cursor, fila):
+        # para usar como row_factory de un cursor de sqlite3
+        return cls(*fila)
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except AttributeError:
+            raise KeyError(campo) from None
+
+    def __setitem__(self, campo, valor):
+        setattr(self, campo, valor)
+
+    def get(self, campo, defecto=None):
+        return getattr(self, campo, defecto)
+
+    def keys(self):
+        return self.__slots__
+
+    def __contains__(self, campo):
+        return campo in self.__slots__
+
+    def update(self, campos):
+        for campo, valor in campos.items():
+            setattr(self, campo, valor)
+
+    def _asdict(self):
+        # para JSON y para quien necesite un dict de verdad
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{c}={getattr(self, c)!r}' for c in self.__slots__)})"
+
+
+class Producto(Registro):
+    __slots__ = ('id', 'nombre', 'stock', 'precio', 'id_tienda', 'codigo_barras')
+
+    def __init__(self, id, nombre, stock, precio, id_tienda, codigo_barras=None):
+        self.id = id
+        self.nombre = nombre
+        self.stock = stock
+        self.precio = precio
+        self.id_tienda = id_tienda
+        self.codigo_barras = codigo_barras
+
+
+class Venta(Registro):
+    __slots__ = ('id', 'total', 'fecha')
+
+    def __init__(self, id, total, fecha):
+        self.id = id
+        self.total = total
+        self.fecha = fecha
+
+
+class ItemVenta(Registro):
+    __slots__ = ('producto', 'cantidad', 'precio', 'subtotal')
+
+    def __init__(self, producto, cantidad, precio, subtotal):
+        self.producto = producto
+        self.cantidad = cantidad
+        self.precio = precio
+        self.subtotal = subtotal
+
+
+def a_json(valor):
+    # `default` de json.dumps: los registros salen como objetos JSON
+    if isinstance(valor, Registro):
+        return valor._asdict()
+    raise TypeError(f"{type(valor).__name__} no es serializable a JSON")
@@ -0,0 +1,47 @@
+"""Reposición: días de cobertura, punto de pedido y cantidad sugerida de cada producto.
+
+Parte de la demanda que DBManager mantiene al día con cada venta (demanda_productos), así
+que no relee el historial; las cuentas se hacen con NumPy sobre todo el catálogo a la vez.
+"""
+
+import numpy as np
+
+from .db import ALFA_DEMANDA
+
+PLAZO_REPOSICION_DIAS = 7  # días que tarda en llegar un pedido
+DIAS_SEGURIDAD = 3         # margen por encima del plazo para el punto de pedido
+DIAS_OBJETIVO = 14         # cobertura que debería dejar un pedido, además del plazo
+
+
+def calcular_reposicion(productos, plazo=PLAZO_REPOSICION_DIAS, seguridad=DIAS_SEGURIDAD,
+                        objetivo=DIAS_OBJETIVO, solo_alertas=True):
+    """productos: filas de DBManager.demanda_productos. Devuelve dicts {id, nombre, stock,
+    demanda (unidades/día), dias_cobertura (None sin demanda), punto_pedido, sugerido, alerta},
+    del que menos cubre al que más. alerta: el stock ya no llega al punto de pedido.
+    Con solo_alertas, solo los que están en alerta."""
+    n = len(productos)
+    stock = np.fromiter((p['stock'] or 0 for p in productos), dtype=np.float64, count=n)
+    tasa = np.fromiter((p['tasa'] for p in productos), dtype=np.float64, count=n)
+    dias = np.fromiter((p['dias'] for p in productos), dtype=np.float64, count=n)
+
+    demanda = tasa * (1 - ALFA_DEMANDA) ** np.maximum(dias, 0)
+    con_demanda = demanda > 1e-9
+    cobertura = np.divide(stock, demanda, out=np.full(n, np.inf), where=con_demanda)
+    punto_pedido = np.ceil(demanda * (plazo + seguridad))
+    sugerido = np.maximum(np.ceil(demanda * (plazo + objetivo)) - stock, 0)
+    alerta = con_demanda & (stock <= punto_pedido)
+
+    indices = np.flatnonzero(alerta) if solo_alertas else np.arange(n)
+    indices = indices[np.argsort(cobertura[indices], kind='stable')]
+    return [
+        {'id': productos[i]['id'], 'nombre': productos[i]['nombre'], 'stock': int(stock[i]),
+         'demanda': round(float(demanda[i]), 2),
+         'dias_cobertura': round(float(cobertura[i]), 1) if con_demanda[i] else None,
+         'punto_pedido': int(punto_pedido[i]), 'sugerido': int(sugerido[i]), 'alerta': bool(alerta[i])}
+        for i in indices.tolist()
+    ]
+
+
+def productos_a_reponer(db, id_tienda=None, **opciones):
+    """calcular_reposicion sobre los productos de la sucursal (o de todas)."""
+    return calcular_reposicion(db.demanda_productos(id_tienda), **opciones)
@@ -0,0 +1,394 @@
+"""Servidor HTTP/JSON para varias cajas sobre una sola base.
+
+Uso:
+  python -m easystock [--db RUTA] servidor [--host 0.0.0.0] [--puerto 8765] [--lote-max 64] [--espera-ms 0]
+
+El servidor es el único que abre StockManager.db; las cajas se conectan con ClienteDB
+(EasyStock.py --servidor http://host:8765). Las escrituras que llegan mientras se confirma
+un lote se confirman juntas en la transacción siguiente (DBManager.agrupar_escrituras).
+
+  GET    /tiendas                      POST /tiendas {nombre}        DELETE /tiendas/ID
+  GET    /productos?tienda=ID          (ETag: responde 304 si el catálogo no cambió)
+  GET    /productos?ids=1,2,3          (filas actuales de esos productos)
+  GET    /productos/codigo/CODIGO      POST /productos {...}         PUT/DELETE /productos/ID
+  POST   /productos/importar {tienda, filas}
+  POST   /productos/actualizar {filtro..., cambios...}   POST /productos/eliminar {filtro...}
+  GET    /productos/buscar?q=TEXTO&tienda=ID&limite&offset   (todas las sucursales si no hay tienda)
+  GET    /demanda?tienda=ID            (demanda por producto, para easystock.reposicion)
+  POST   /ventas {lineas, total}       (409 con los faltantes si no alcanza el stock)
+  GET    /ventas?despues=FECHA,ID&limite&desde&hasta&total_min&total_max&tienda&ids
+  GET    /ventas/items?ids=1,2,3       GET /ventas/ID/items          DELETE /ventas/ID
+  GET    /top/AAAA-MM                  GET /estado
+
+Cada respuesta lleva X-Version: sube exactamente 1 con cada escritura aceptada (y con
+cada cambio externo que el servidor vea en la base), así una caja sabe si escribió
+alguien más (ClienteDB.revisar_cambios).
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .db import TAM_PAGINA_HISTORIAL, StockInsuficienteError
+from .registros import a_json
+
+log = logging.getLogger('easystock.servidor')
+
+PUERTO = 8765
+
+
+# -------------------------
+# HTTP
+# -------------------------
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.cuerpo = {'error': mensaje}
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # conexiones persistentes: una por caja
+    server_version = 'EasyStock'
+    disable_nagle_algorithm = True  # encabezados y cuerpo salen en dos escrituras
+
+    def finish(self):
+        # un hilo por conexión de caja: al cortarse, sus conexiones SQLite se cierran
+        try:
+            super().finish()
+        finally:
+            self.server.pos.db.soltar_conexiones()
+
+    def log_message(self, formato, *args):
+        log.debug("%s %s", self.address_string(), formato % args)
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def do_PUT(self):
+        self._atender('PUT')
+
+    def do_DELETE(self):
+        self._atender('DELETE')
+
+    def _atender(self, metodo):
+        partes = urlsplit(self.path)
+        consulta = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+        try:
+            cuerpo = self._leer_cuerpo()
+            for verbo, patron, accion in RUTAS:
+                m = patron.fullmatch(partes.path)
+                if m and verbo == metodo:
+                    estado, datos = accion(self.server.pos, *map(unquote, m.groups()),
+                                           consulta=consulta, cuerpo=cuerpo, encabezados=self.headers)
+                    break
+            else:
+                raise ErrorHTTP(404, f"ruta desconocida: {metodo} {partes.path}")
+        except ErrorHTTP as e:
+            estado, datos = e.estado, e.cuerpo
+        except StockInsuficienteError as e:
+            estado, datos = 409, {'error': 'stock_insuficiente', 'faltantes': e.faltantes}
+        except sqlite3.IntegrityError as e:
+            estado, datos = 409, {'error': 'integridad', 'detalle': str(e)}
+        except (KeyError, TypeError, ValueError) as e:
+            estado, datos = 400, {'error': f"pedido inválido: {e}"}
+        except Exception as e:
+            log.exception("error atendiendo %s %s", metodo, self.path)
+            estado, datos = 500, {'error': str(e)}
+        self._responder(estado, datos)
+
+    def _leer_cuerpo(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        if not largo:
+            return None
+        return json.loads(self.rfile.read(largo))
+
+    def _responder(self, estado, datos):
+        etag = None
+        if isinstance(datos, tuple):
+            datos, etag = datos
+        cuerpo = b'' if estado == 304 else json.dumps(datos, ensure_ascii=False, default=a_json).encode('utf-8')
+        self.send_response(estado)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('X-Version', str(self.server.pos.version))
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+class ServidorPOS:
+    """Expone un DBManager a varias cajas. Cada hilo del servidor HTTP lee con sus propias
+    conexiones (GestorConexiones); todas las escrituras pasan por el hilo escritor del
+    DBManager (agrupar_escrituras), que las confirma por lotes. db.close() confirma lo
+    que quede pendiente."""
+
+    def __init__(self, db, host='127.0.0.1', puerto=PUERTO, lote_max=64, espera_ms=0):
+        self.db = db
+        self.agrupador = db.agrupar_escrituras(lote_max, espera_ms)
+        # versión de los datos de productos: cambia con cada escritura y sirve de ETag
+        self.version = 0
+        self._lock = threading.Lock()
+        # escrituras de otro proceso sobre la base (la CLI, otro EasyStock): también cuentan
+        db.suscribir(lambda cambios: self.cambio() if any(c.externo for c in cambios) else None)
+        self.httpd = ThreadingHTTPServer((host, puerto), _Manejador)
+        self.httpd.daemon_threads = True
+        self.httpd.pos = self
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self.httpd.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def cambio(self):
+        with self._lock:
+            self.version += 1
+
+    def servir(self):
+        self.httpd.serve_forever()
+
+    def iniciar(self):
+        # en un hilo aparte (simulaciones y pruebas en la misma máquina)
+        self._hilo = threading.Thread(target=self.servir, name='ServidorPOS', daemon=True)
+        self._hilo.start()
+        return self
+
+    def cerrar(self):
+        if self._hilo is not None:
+            self.httpd.shutdown()
+            self._hilo.join()
+        self.httpd.server_close()
+
+    def estado(self):
+        self.db.revisar_cambios()
+        a = self.agrupador
+        return {'version': self.version, 'durabilidad': self.db.conexiones.durabilidad,
+                'escrituras': a.escrituras, 'lotes': a.lotes,
+                'escrituras_por_lote': round(a.escrituras / a.lotes, 2) if a.lotes else 0}
+
+
+# -------------------------
+# Rutas
+# -------------------------
+def _productos(pos, consulta, encabezados, **_):
+    if 'ids' in consulta:
+        return 200, pos.db.productos_por_ids(_ids(consulta))
+    etag = f'"{pos.version}"'
+    if encabezados.get('If-None-Match') == etag:
+        return 304, (None, etag)
+    tienda = consulta.get('tienda')
+    return 200, (pos.db.list_productos(int(tienda) if tienda else None), etag)
+
+
+def _producto_por_codigo(pos, codigo, **_):
+    producto = pos.db.producto_por_codigo(codigo)
+    if producto is None:
+        raise ErrorHTTP(404, f"no hay producto con código {codigo}")
+    return 200, producto
+
+
+def _buscar_productos(pos, consulta, **_):
+    tienda = consulta.get('tienda')
+    return 200, pos.db.buscar_productos(consulta.get('q', ''), int(tienda) if tienda else None,
+                                        int(consulta.get('limite', 50)), int(consulta.get('offset', 0)))
+
+
+def _add_producto(pos, cuerpo, **_):
+    pid = pos.db.add_producto(cuerpo['nombre'], cuerpo['stock'], cuerpo['precio'], cuerpo['id_tienda'],
+                              cuerpo.get('codigo_barras'))
+    pos.cambio()
+    return 201, {'id': pid}
+
+
+def _update_producto(pos, pid, cuerpo, **_):
+    pos.db.update_producto(int(pid), cuerpo['nombre'], cuerpo['stock'], cuerpo['precio'],
+                           cuerpo.get('codigo_barras'))
+    pos.cambio()
+    return 200, {}
+
+
+def _delete_producto(pos, pid, **_):
+    pos.db.delete_producto(int(pid))
+    pos.cambio()
+    return 200, {}
+
+
+def _importar(pos, cuerpo, **_):
+    ins, act, rech = pos.db.importar_productos(cuerpo['tienda'], [[tuple(f) for f in cuerpo['filas']]])
+    pos.cambio()
+    return 200, {'insertados': ins, 'actualizados': act, 'rechazados': rech}
+
+
+def _filtro(cuerpo):
+    return {k: cuerpo.get(k) for k in ('id_tienda', 'ids', 'contiene')}
+
+
+def _actualizar_productos(pos, cuerpo, **_):
+    cambios = {k: cuerpo.get(k) for k in ('precio', 'porcentaje', 'stock', 'sumar_stock')}
+    n = pos.db.actualizar_productos(**_filtro(cuerpo), **cambios)
+    pos.cambio()
+    return 200, {'cambiados': n}
+
+
+def _delete_productos(pos, cuerpo, **_):
+    n = pos.db.delete_productos(**_filtro(cuerpo))
+    pos.cambio()
+    return 200, {'borrados': n}
+
+
+def _demanda(pos, consulta, **_):
+    tienda = consulta.get('tienda')
+    return 200, pos.db.demanda_productos(int(tienda) if tienda else None)
+
+
+def _add_tienda(pos, cuerpo, **_):
+    tid = pos.db.add_tienda(cuerpo['nombre'])
+    pos.cambio()
+    return 201, {'id': tid}
+
+
+def _delete_tienda(pos, tid, **_):
+    n = pos.db.delete_tienda(int(tid))
+    pos.cambio()
+    return 200, {'productos': n}
+
+
+def _create_venta(pos, cuerpo, **_):
+    venta_id = pos.db.create_venta(cuerpo['lineas'], cuerpo['total'])
+    pos.cambio()
+    return 201, {'id': venta_id}
+
+
+def _list_ventas(pos, consulta, **_):
+    despues = None
+    if consulta.get('despues'):
+        fecha, vid = consulta['despues'].rsplit(',', 1)
+        despues = (fecha, int(vid))
+    numeros = {k: float(consulta[k]) for k in ('total_min', 'total_max') if consulta.get(k)}
+    if consulta.get('tienda'):
+        numeros['id_tienda'] = int(consulta['tienda'])
+    if 'ids' in consulta:
+        numeros['ids'] = _ids(consulta)
+    return 200, pos.db.list_ventas_pagina(despues=despues, limite=int(consulta.get('limite', TAM_PAGINA_HISTORIAL)),
+                                          desde=consulta.get('desde'), hasta=consulta.get('hasta'), **numeros)
+
+
+def _ids(consulta):
+    return [int(i) for i in consulta.get('ids', '').split(',') if i]
+
+
+def _items_ventas(pos, consulta, **_):
+    return 200, pos.db.list_items_by_ventas(_ids(consulta))
+
+
+def _items_venta(pos, vid, **_):
+    return 200, pos.db.list_items_by_venta(int(vid))
+
+
+def _delete_venta(pos, vid, **_):
+    pos.db.delete_venta(int(vid))
+    pos.cambio()
+    return 200, {}
+
+
+def _top(pos, mes, **_):
+    unidades, ingresos = pos.db.top_por_mes(mes)
+    return 200, {'unidades': unidades, 'ingresos': ingresos}
+
+
+RUTAS = [(verbo, re.compile(patron), accion) for verbo, patron, accion in (
+    ('GET', r'/tiendas', lambda pos, **_: (200, pos.db.list_tiendas())),
+    ('POST', r'/tiendas', _add_tienda),
+    ('DELETE', r'/tiendas/(\d+)', _delete_tienda),
+    ('GET', r'/productos', _productos),
+    ('GET', r'/productos/buscar', _buscar_productos),
+    ('GET', r'/productos/codigo/([^/]+)', _producto_por_codigo),
+    ('POST', r'/productos', _add_producto),
+    ('POST', r'/productos/importar', _importar),
+    ('POST', r'/productos/actualizar', _actualizar_productos),
+    ('POST', r'/productos/eliminar', _delete_productos),
+    ('GET', r'/demanda', _demanda),
+    ('PUT', r'/productos/(\d+)', _update_producto),
+    ('DELETE', r'/productos/(\d+)', _delete_producto),
+    ('POST', r'/ventas', _create_venta),
+    ('GET', r'/ventas', _list_ventas),
+    ('GET', r'/ventas/items', _items_ventas),
+    ('GET', r'/ventas/(\d+)/items', _items_venta),
+    ('DELETE', r'/ventas/(\d+)', _delete_venta),
+    ('GET', r'/top/(\d{4}-\d{2})', _top),
+    ('GET', r'/estado', lambda pos, **_: (200, pos.estado())),
+)]
+
+
+# -------------------------
+# Simulación de cajas
+# -------------------------
+def simular(url, clientes=8, ventas=200, tienda=None, seed=42):
+    """Lanza `clientes` cajas (hilos con su propio ClienteDB) que registran `ventas` ventas
+    cada una contra el servidor y devuelve latencias y rendimiento."""
+    import random
+    import statistics
+
+    from .cliente import ClienteDB
+
+    consulta = ClienteDB(url)
+    if tienda is None:
+        tienda = consulta.list_tiendas()[0]['id']
+    latencias, rechazadas, errores = [], [0], []
+    lock = threading.Lock()
+
+    def caja(n):
+        rnd = random.Random(seed + n)
+        cli = ClienteDB(url)
+        productos = cli.catalogo(tienda).productos
+        propias = []
+        try:
+            for _ in range(ventas):
+                lineas = []
+                for p in rnd.sample(productos, k=min(len(productos), rnd.randint(1, 6))):
+                    cant = rnd.randint(1, 3)
+                    lineas.append({'producto': p['nombre'], 'producto_id': p['id'], 'cantidad': cant,
+                                   'precio': p['precio'], 'subtotal': cant * p['precio']})
+                t = time.perf_counter()
+                try:
+                    cli.create_venta(lineas, sum(l['subtotal'] for l in lineas))
+                except StockInsuficienteError:
+                    with lock:
+                        rechazadas[0] += 1
+                propias.append((time.perf_counter() - t) * 1000)
+        except Exception as e:
+            errores.append(repr(e))
+        finally:
+            cli.close()
+        with lock:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=caja, args=(n,)) for n in range(clientes)]
+    t = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    duracion = time.perf_counter() - t
+    latencias.sort()
+    return {
+        'clientes': clientes,
+        'ventas': len(latencias),
+        'rechazadas': rechazadas[0],
+        'errores': errores,
+        'duracion_s': round(duracion, 3),
+        'ventas_por_s': round(len(latencias) / duracion, 1) if duracion else 0,
+        'latencia_mediana_ms': round(statistics.median(latencias), 3) if latencias else None,
+        'latencia_p95_ms': round(latencias[int(len(latencias) * 0.95)], 3) if latencias else None,
+        'servidor': consulta.estado(),
+    }
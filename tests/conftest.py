@@ -0,0 +1,17 @@
+"""Fixtures comunes: una base nueva por prueba en un directorio temporal."""
+
+import pytest
+
+from easystock.db import DBManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    base = DBManager(str(tmp_path / 'stock.db'))
+    yield base
+    base.close()
+
+
+@pytest.fixture
+def tienda(db):
+    return db.add_tienda('Central')
@@ -0,0 +1,182 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from easystock.db import DBManager, StockInsuficienteError
+
+
+def _en_hilos(n, fn):
+    # n hilos que llaman fn(i) a la vez; devuelve el resultado o la excepción de cada uno
+    resultados = [None] * n
+    barrera = threading.Barrier(n)
+
+    def correr(i):
+        barrera.wait()
+        try:
+            resultados[i] = fn(i)
+        except Exception as e:
+            resultados[i] = e
+
+    hilos = [threading.Thread(target=correr, args=(i,)) for i in range(n)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return resultados
+
+
+def _linea(producto, cantidad=1):
+    return {'producto': producto['nombre'], 'producto_id': producto['id'], 'cantidad': cantidad,
+            'precio': producto['precio'], 'subtotal': cantidad * producto['precio']}
+
+
+def test_venta_sin_stock_se_deshace_sola_dentro_del_lote(db, tienda):
+    pid = db.add_producto('Yerba', 5, 100, tienda)
+    producto = db.productos_por_ids([pid])[0]
+    cat = db.catalogo(tienda)
+    avisos = []
+    db.suscribir(avisos.extend)
+    db.agrupar_escrituras(lote_max=64, espera_ms=50)
+
+    resultados = _en_hilos(10, lambda i: db.create_venta([_linea(producto)], producto['precio']))
+
+    vendidas = [r for r in resultados if isinstance(r, int)]
+    rechazadas = [r for r in resultados if isinstance(r, StockInsuficienteError)]
+    assert len(vendidas) == 5 and len(rechazadas) == 5
+    assert all(f['disponible'] == 0 for r in rechazadas for f in r.faltantes)
+    assert db.productos_por_ids([pid])[0]['stock'] == 0
+    assert cat.por_id(pid)['stock'] == 0
+    assert db.agrupador.lotes < 10  # se confirmaron juntas
+    # solo avisan las ventas confirmadas
+    assert sorted(v for c in avisos if c.tabla == 'ventas' for v in c.insertados) == sorted(vendidas)
+    assert len(db.list_ventas_pagina()) == 5
+
+
+def test_error_de_una_operacion_no_deshace_las_demas(db, tienda):
+    db.agrupar_escrituras(lote_max=64, espera_ms=50)
+    resultados = _en_hilos(4, lambda i: db.add_producto(f'P{i}', 1, 1, tienda, 'DUP' if i < 2 else f'C{i}'))
+    errores = [r for r in resultados if isinstance(r, Exception)]
+    assert len(errores) == 1 and isinstance(errores[0], sqlite3.IntegrityError)
+    assert len(db.list_productos(tienda)) == 3
+
+
+def test_futures_se_resuelven_recien_tras_el_commit(db, tienda):
+    agrupador = db.agrupar_escrituras(lote_max=64, espera_ms=100)
+    empezo, seguir = threading.Event(), threading.Event()
+
+    def lenta():
+        empezo.set()
+        return seguir.wait(5)
+
+    primera = agrupador.enviar(db.add_tienda, 'Norte')
+    segunda = agrupador.enviar(lenta)
+    # la primera ya corrió, pero su lote no se confirma mientras la segunda siga
+    assert empezo.wait(5)
+    assert not primera.done()
+    seguir.set()
+    assert isinstance(primera.result(timeout=5), int) and segunda.result(timeout=5)
+
+
+def test_commit_fallido_recarga_catalogos_y_avisa_externo(tmp_path):
+    db = DBManager(str(tmp_path / 'stock.db'))
+    try:
+        tienda = db.add_tienda('Central')
+        pid = db.add_producto('Yerba', 5, 100, tienda)
+        producto = db.productos_por_ids([pid])[0]
+        cat = db.catalogo(tienda)
+        with db.transaccion() as cur:
+            cur.execute("CREATE TABLE padre (id INTEGER PRIMARY KEY)")
+            cur.execute("CREATE TABLE hijo (padre_id INTEGER REFERENCES padre(id) DEFERRABLE INITIALLY DEFERRED)")
+
+        # una clave foránea diferida solo se controla en el COMMIT
+        def con_claves(conn):
+            conn.execute("PRAGMA foreign_keys = ON")
+            return conn
+        db.conexiones.envolver = con_claves
+        avisos = []
+        db.suscribir(avisos.extend)
+        agrupador = db.agrupar_escrituras(lote_max=64, espera_ms=100)
+
+        def huerfano():
+            with db.transaccion() as cur:
+                cur.execute("INSERT INTO hijo VALUES (99)")
+
+        venta = agrupador.enviar(db.create_venta, [_linea(producto, 2)], 200)
+        roto = agrupador.enviar(huerfano)
+        for fut in (venta, roto):
+            with pytest.raises(sqlite3.IntegrityError):
+                fut.result(timeout=5)
+        assert db.productos_por_ids([pid])[0]['stock'] == 5
+        assert cat.por_id(pid)['stock'] == 5  # el catálogo se releyó
+        assert [c.externo for c in avisos] == [True]
+        assert db.list_ventas_pagina() == []
+        # la conexión del hilo escritor quedó usable
+        assert agrupador.enviar(db.add_tienda, 'Norte').result(timeout=5)
+    finally:
+        db.close()
+
+
+def test_close_confirma_lo_encolado(tmp_path):
+    ruta = str(tmp_path / 'stock.db')
+    db = DBManager(ruta)
+    tienda = db.add_tienda('Central')
+    agrupador = db.agrupar_escrituras(lote_max=64, espera_ms=500)
+    futures = [agrupador.enviar(db.add_producto, f'P{i}', 1, 1, tienda) for i in range(5)]
+    db.close()
+    assert all(isinstance(f.result(timeout=0), int) for f in futures)
+    otra = DBManager(ruta)
+    try:
+        assert len(otra.list_productos(tienda)) == 5
+    finally:
+        otra.close()
+
+
+def test_importar_corre_solo_en_el_hilo_escritor(db, tienda):
+    pid = db.add_producto('Yerba', 5, 100, tienda)
+    producto = db.productos_por_ids([pid])[0]
+    agrupador = db.agrupar_escrituras(lote_max=64, espera_ms=0)
+    hilos_import = []
+    ventas = []
+
+    def vender():
+        ventas.extend(_en_hilos(3, lambda i: db.create_venta([_linea(producto)], producto['precio'])))
+
+    vendedor = threading.Thread(target=vender)
+
+    def lotes():
+        # a mitad de la importación llegan ventas de otras cajas
+        hilos_import.append(threading.current_thread().name)
+        vendedor.start()
+        limite = time.monotonic() + 5
+        while agrupador._cola.qsize() < 3 and time.monotonic() < limite:
+            time.sleep(0.01)
+        yield [(2, 'Café', 3, 80.0, '779')]
+
+    lotes_antes = agrupador.lotes
+    insertados, actualizados, rechazados = db.importar_productos(tienda, lotes())
+    vendedor.join()
+
+    assert (insertados, actualizados, rechazados) == (1, 0, [])
+    assert hilos_import == ['AgrupadorEscrituras']
+    assert all(isinstance(v, int) for v in ventas)
+    assert db.productos_por_ids([pid])[0]['stock'] == 2
+    # la importación fue un lote propio; las ventas, que esperaron en la cola, otro(s)
+    assert agrupador.lotes - lotes_antes >= 2
+
+
+def test_archivar_y_compactar_con_escrituras_agrupadas(db, tienda):
+    pid = db.add_producto('Yerba', 2, 100, tienda)
+    producto = db.productos_por_ids([pid])[0]
+    venta = db.create_venta([_linea(producto)], producto['precio'])
+    with db.transaccion() as cur:
+        cur.execute("UPDATE ventas SET fecha = ? WHERE id = ?", (f"{datetime.now().year - 1}-06-01 10:00:00", venta))
+    db.agrupar_escrituras()
+
+    # VACUUM no puede correr dentro de la transacción de un lote
+    assert db.archivar_ventas(datetime.now().year - 1, compactar=True) == (1, 1)
+    db.recalcular_ventas_mes()
+    db.recalcular_demanda()
+    assert isinstance(db.create_venta([_linea(producto)], producto['precio']), int)
@@ -0,0 +1,29 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from easystock.analitica import AnaliticaVentas
+
+
+def _items(venta_ids):
+    return pd.DataFrame({
+        'venta_id': np.array(venta_ids, dtype=np.int64),
+        'producto': pd.Categorical(['Yerba'] * len(venta_ids)),
+        'cantidad': np.ones(len(venta_ids), dtype=np.int64),
+        'subtotal': np.full(len(venta_ids), 100.0),
+    })
+
+
+def test_items_sin_ventas_leidas_quedan_afuera(db):
+    # un ítem confirmado entre la lectura de las ventas y la de los ítems
+    a = AnaliticaVentas(db)
+    ventas, _ = a._leer()
+    assert len(ventas) == 0
+
+    a._armar(ventas, _items([1, 2]))
+
+    assert len(a._ventas) == 0
+    assert len(a._items) == 0
+    assert {'pos', 'id_tienda'} <= set(a._items.columns)
+    assert a._ventas['unidades'].tolist() == []
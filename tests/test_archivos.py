@@ -0,0 +1,93 @@
+import csv
+import logging
+import os
+import threading
+from datetime import datetime
+
+from easystock.db import DBManager
+from easystock.exportacion import exportar_ventas
+
+ANIO = datetime.now().year
+
+
+def _vender(db, tienda, fechas):
+    # una venta de una unidad por fecha, movida después a esa fecha; devuelve los ids
+    pid = db.add_producto('Yerba', len(fechas), 100, tienda)
+    producto = db.productos_por_ids([pid])[0]
+    linea = {'producto': producto['nombre'], 'producto_id': pid, 'cantidad': 1,
+             'precio': producto['precio'], 'subtotal': producto['precio']}
+    ids = []
+    for fecha in fechas:
+        venta_id = db.create_venta([linea], linea['subtotal'])
+        with db.transaccion() as cur:
+            cur.execute("UPDATE ventas SET fecha = ? WHERE id = ?", (fecha, venta_id))
+        ids.append(venta_id)
+    db.recalcular_ventas_mes()
+    return ids
+
+
+def _fechas(anio):
+    return [f"{anio}-03-0{d} 10:00:00" for d in (1, 2, 3)]
+
+
+def _todas_las_paginas(db, limite):
+    vistas, despues = [], None
+    while True:
+        pagina = db.list_ventas_pagina(despues=despues, limite=limite)
+        if not pagina:
+            return vistas
+        vistas.extend(v.id for v in pagina)
+        despues = (pagina[-1].fecha, pagina[-1].id)
+
+
+def test_historial_pagina_a_traves_de_los_archivos(db, tienda):
+    ids = _vender(db, tienda, _fechas(ANIO - 2) + _fechas(ANIO - 1) + _fechas(ANIO))
+    assert db.archivar_ventas(ANIO - 2) == (3, 3)
+    assert db.archivar_ventas(ANIO - 1) == (3, 3)
+
+    assert _todas_las_paginas(db, limite=2) == ids[::-1]
+
+
+def test_exportar_y_top_incluyen_los_archivos(db, tienda, tmp_path):
+    _vender(db, tienda, _fechas(ANIO - 1) + _fechas(ANIO))
+    db.archivar_ventas(ANIO - 1)
+
+    ruta = tmp_path / 'ventas.csv'
+    assert exportar_ventas(db, str(ruta)) == 6
+    with open(ruta, newline='', encoding='utf-8') as f:
+        assert len(list(csv.reader(f))) == 1 + 6
+
+    unidades, _ = db.top_por_mes(f"{ANIO - 1}-03")
+    assert [(r['producto'], r['total_vendido']) for r in unidades] == [('Yerba', 3)]
+
+
+def test_archivo_faltante_se_saltea_con_advertencia(db, tienda, caplog):
+    ids = _vender(db, tienda, _fechas(ANIO - 2) + _fechas(ANIO - 1))
+    db.archivar_ventas(ANIO - 2)
+    db.archivar_ventas(ANIO - 1)
+    os.remove(db._ruta_archivo(db.archivos_ventas()[0]['archivo']))
+
+    with caplog.at_level(logging.WARNING, logger='easystock.db'):
+        assert _todas_las_paginas(db, limite=2) == ids[3:][::-1]
+    assert any('falta el archivo de ventas' in r.getMessage() for r in caplog.records)
+
+
+def test_lectura_no_pierde_ventas_si_se_archiva_en_el_medio(db, tienda):
+    ids = _vender(db, tienda, _fechas(ANIO - 2) + _fechas(ANIO - 1) + _fechas(ANIO))
+    db.archivar_ventas(ANIO - 2)
+
+    lotes = db.lotes_ventas(tam_lote=1)
+    vistas = [f[0] for f in next(lotes)]  # ya empezó con el archivo de ANIO - 2
+
+    # otro proceso archiva ANIO - 1 mientras la lectura sigue abierta
+    otra = DBManager(db.filename)
+    hilo = threading.Thread(target=otra.archivar_ventas, args=(ANIO - 1,))
+    hilo.start()
+    hilo.join()
+    assert [a['anio'] for a in otra.archivos_ventas()] == [ANIO - 2, ANIO - 1]
+    otra.close()
+
+    for lote in lotes:
+        vistas.extend(f[0] for f in lote)
+    assert vistas == ids
+    assert [f[0] for lote in db.lotes_ventas() for f in lote] == ids
@@ -0,0 +1,25 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+EASYSTOCK = Path(__file__).resolve().parent.parent / 'EasyStock.py'
+
+
+@pytest.mark.skipif(sys.platform.startswith('linux') and not os.environ.get('DISPLAY'),
+                    reason="sin pantalla: correr con xvfb-run -a python -m pytest")
+def test_arranque_dentro_del_presupuesto(tmp_path):
+    pytest.importorskip('customtkinter')
+    # en un directorio vacío: la base nueva se crea ahí y no toca la del repositorio
+    entorno = {**os.environ, 'EASYSTOCK_T_LANZAMIENTO': repr(time.time())}
+    entorno.pop('EASYSTOCK_SERVIDOR', None)
+    proc = subprocess.run([sys.executable, str(EASYSTOCK), '--medir-arranque'], cwd=tmp_path, env=entorno,
+                          capture_output=True, text=True, timeout=60)
+    salida = json.loads(proc.stdout.strip().splitlines()[-1])
+    for clave, presupuesto in salida['presupuesto_ms'].items():
+        assert salida['ms'][clave] <= presupuesto, salida
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,73 @@
+import pytest
+
+
+@pytest.fixture
+def fts(db):
+    if not db._hay_busqueda():
+        pytest.skip("el SQLite instalado no tiene FTS5")
+    return db
+
+
+def _nombres(db, texto, **kwargs):
+    return [p['nombre'] for p in db.buscar_productos(texto, **kwargs)]
+
+
+def test_busca_por_prefijo_sin_acentos_en_todas_las_sucursales(fts, tienda):
+    norte = fts.add_tienda('Norte')
+    fts.add_producto('Azúcar común', 5, 100, tienda)
+    fts.add_producto('Azucarera', 1, 900, norte, '7790001')
+    fts.add_producto('Café', 1, 80, tienda)
+
+    assert sorted(_nombres(fts, 'AZUC')) == ['Azucarera', 'Azúcar común']
+    assert _nombres(fts, 'azu com') == ['Azúcar común']
+    assert _nombres(fts, 'azuc', id_tienda=norte) == ['Azucarera']
+    assert _nombres(fts, '77900') == ['Azucarera']
+    assert [p['tienda'] for p in fts.buscar_productos('cafe')] == ['Central']
+    assert _nombres(fts, '   ') == []
+
+
+def test_el_indice_sigue_a_los_cambios(fts, tienda):
+    pid = fts.add_producto('Yerba', 5, 100, tienda, '779')
+    otro = fts.add_producto('Yerba suave', 5, 100, tienda)
+
+    fts.update_producto(pid, 'Mate cocido', 5, 100, '880')
+    assert _nombres(fts, 'yerba') == ['Yerba suave']
+    assert _nombres(fts, 'mate') == ['Mate cocido']
+    assert _nombres(fts, '779') == [] and _nombres(fts, '880') == ['Mate cocido']
+
+    fts.actualizar_productos(ids=[otro], precio=1)  # sin cambiar nombre ni código
+    assert _nombres(fts, 'yerba') == ['Yerba suave']
+
+    fts.delete_producto(otro)
+    assert _nombres(fts, 'yerba') == []
+    fts.delete_productos(contiene='mate')
+    assert _nombres(fts, 'mate') == []
+    fts.importar_productos(tienda, [[(2, 'Yerba nueva', 1, 10.0, '990')]])
+    assert _nombres(fts, 'yerb') == ['Yerba nueva']
+
+
+@pytest.mark.parametrize('texto', ['"', 'yerba"', '*', 'yer*ba', 'NOT yerba', 'yerba OR', '(yerba', 'nombre:yerba', '^'])
+def test_operadores_de_fts_se_tratan_como_texto(fts, tienda, texto):
+    fts.add_producto('Yerba "premium"', 5, 100, tienda)
+
+    # nunca un error de sintaxis de MATCH
+    assert isinstance(fts.buscar_productos(texto), list)
+
+
+def test_comillas_en_el_texto_buscan_literal(fts, tienda):
+    fts.add_producto('Yerba "premium"', 5, 100, tienda)
+    fts.add_producto('Yerba común', 5, 100, tienda)
+
+    assert _nombres(fts, '"premium') == ['Yerba "premium"']
+    # el * es parte de la palabra, no un operador: 'yerba*' busca lo mismo que 'yerba'
+    assert sorted(_nombres(fts, 'yerba*')) == sorted(_nombres(fts, 'yerba')) == ['Yerba "premium"', 'Yerba común']
+
+
+def test_sin_fts_busca_con_like_escapando_comodines(db, tienda):
+    db._busqueda = False  # como en un SQLite sin FTS5
+    db.add_producto('Yerba 50%_off', 5, 100, tienda)
+    db.add_producto('Yerba 500', 5, 100, tienda)
+
+    assert _nombres(db, '50%_') == ['Yerba 50%_off']
+    assert _nombres(db, '0%o') == []
+    assert sorted(_nombres(db, 'yerba 50')) == ['Yerba 50%_off', 'Yerba 500']
@@ -0,0 +1,237 @@
+import threading
+
+import pytest
+
+from easystock.db import DBManager, StockInsuficienteError
+from easystock.ejecutor import EjecutorDB
+
+
+def _suscribir(db):
+    # lista de los Cambio emitidos (sin los externos)
+    avisos = []
+    db.suscribir(lambda cambios: avisos.extend(c for c in cambios if not c.externo))
+    return avisos
+
+
+def _resumen(avisos):
+    return [(c.tabla, c.insertados, c.actualizados, c.borrados) for c in avisos]
+
+
+def _linea(db, pid, cantidad=1):
+    p = db.productos_por_ids([pid])[0]
+    return {'producto': p['nombre'], 'producto_id': pid, 'cantidad': cantidad,
+            'precio': p['precio'], 'subtotal': cantidad * p['precio']}
+
+
+class _RaizTk:
+    """Lo mínimo de Tk que usa EjecutorDB: after() guarda la función y correr() la llama."""
+
+    def __init__(self):
+        self._pendientes = []
+
+    def after(self, ms, fn):
+        self._pendientes.append(fn)
+        return fn
+
+    def after_cancel(self, job):
+        if job in self._pendientes:
+            self._pendientes.remove(job)
+
+    def report_callback_exception(self, tipo, exc, tb):
+        raise exc
+
+    def correr(self):
+        pendientes, self._pendientes = self._pendientes, []
+        for fn in pendientes:
+            fn()
+
+
+def test_altas_cambios_y_bajas_de_productos_avisan_sus_ids(db, tienda):
+    avisos = _suscribir(db)
+
+    pid = db.add_producto('Yerba', 5, 100, tienda, '779')
+    db.update_producto(pid, 'Yerba 1kg', 5, 120, '779')
+    db.delete_producto(pid)
+
+    assert _resumen(avisos) == [
+        ('productos', (pid,), (), ()),
+        ('productos', (), (pid,), ()),
+        ('productos', (), (), (pid,)),
+    ]
+    assert all(c.origen is db for c in avisos)
+
+
+def test_importar_avisa_insertados_y_actualizados(db, tienda):
+    existente = db.add_producto('Yerba', 1, 100, tienda, '779')
+    avisos = _suscribir(db)
+
+    db.importar_productos(tienda, [[(2, 'Yerba 1kg', 4, 120.0, '779'), (3, 'Café', 2, 80.0, None)]])
+
+    nuevo = db.list_productos(tienda)[-1]['id']
+    assert _resumen(avisos) == [('productos', (nuevo,), (existente,), ())]
+
+
+def test_ventas_avisan_la_venta_y_el_stock(db, tienda):
+    a = db.add_producto('Yerba', 5, 100, tienda)
+    b = db.add_producto('Café', 1, 80, tienda)
+    avisos = _suscribir(db)
+
+    venta = db.create_venta([_linea(db, a), _linea(db, b)], 180)
+    ids = db.create_ventas([([_linea(db, a)], 100), ([_linea(db, b)], 80)])
+    db.delete_venta(venta)
+
+    assert isinstance(ids[1], StockInsuficienteError)
+    assert _resumen(avisos) == [
+        ('ventas', (venta,), (), ()),
+        ('productos', (), tuple(sorted({a, b})), ()),
+        ('ventas', (ids[0],), (), ()),
+        ('productos', (), (a,), ()),
+        ('ventas', (), (), (venta,)),
+    ]
+
+
+def test_venta_sin_stock_no_avisa_nada(db, tienda):
+    pid = db.add_producto('Yerba', 1, 100, tienda)
+    avisos = _suscribir(db)
+
+    with pytest.raises(StockInsuficienteError):
+        db.create_venta([_linea(db, pid, 2)], 200)
+
+    assert avisos == []
+
+
+def test_operaciones_masivas_avisan_los_ids_tocados(db, tienda):
+    otra = db.add_tienda('Norte')
+    a = db.add_producto('Yerba', 1, 100, tienda)
+    b = db.add_producto('Yerba mate', 1, 100, tienda)
+    c = db.add_producto('Yerba', 1, 100, otra)
+    avisos = _suscribir(db)
+
+    db.actualizar_productos(id_tienda=tienda, porcentaje=10)
+    db.delete_productos(ids=[a, c])
+    db.delete_tienda(otra)
+
+    assert _resumen(avisos) == [
+        ('productos', (), (a, b), ()),
+        ('productos', (), (), (a, c)),
+        ('productos', (), (), ()),
+        ('tiendas', (), (), (otra,)),
+    ]
+
+
+def test_transaccion_anidada_avisa_al_confirmar_la_de_afuera(db, tienda):
+    cat = db.catalogo(tienda)
+    avisos = _suscribir(db)
+
+    with db.transaccion():
+        a = db.add_producto('Yerba', 1, 100, tienda)
+        assert avisos == []
+        with pytest.raises(ZeroDivisionError):
+            with db.transaccion():
+                db.add_producto('Café', 1, 80, tienda, '779')
+                1 / 0
+
+    # lo deshecho con el SAVEPOINT no se avisa ni queda en el catálogo
+    assert _resumen(avisos) == [('productos', (a,), (), ())]
+    assert [p['id'] for p in cat] == [a]
+    assert cat.por_codigo('779') is None
+
+
+def test_transaccion_deshecha_no_avisa_y_restaura_el_catalogo(db, tienda):
+    pid = db.add_producto('Yerba', 5, 100, tienda)
+    cat = db.catalogo(tienda)
+    avisos = _suscribir(db)
+
+    with pytest.raises(ZeroDivisionError):
+        with db.transaccion():
+            db.add_producto('Café', 1, 80, tienda)
+            db.update_producto(pid, 'Yerba', 9, 100, None)
+            1 / 0
+
+    assert avisos == []
+    assert [(p['id'], p['stock']) for p in cat] == [(pid, 5)]
+
+
+def test_sincronizar_aplica_solo_lo_que_cambio(db, tienda):
+    a = db.add_producto('Yerba', 1, 100, tienda, '779')
+    b = db.add_producto('Café', 1, 80, tienda)
+    cat = db.catalogo(tienda)
+    lista = cat.productos
+    otra = DBManager(db.filename)  # otro proceso: el catálogo de db no se entera
+    otra.update_producto(a, 'Yerba', 1, 100, '779')  # sin cambios reales
+    otra.update_producto(b, 'Café', 7, 80, None)
+    c = otra.add_producto('Té', 3, 50, tienda, '780')
+    otra.add_producto('Mate', 1, 10, otra.add_tienda('Norte'))  # de otra sucursal: no entra
+    otra.delete_producto(a)
+    otra.close()
+
+    assert cat.sincronizar(db.list_productos()) == ([c], [b], [a])
+
+    assert cat.productos is lista  # en el lugar: las ventanas siguen viendo la misma lista
+    assert [p['id'] for p in cat] == [b, c]
+    assert cat.por_id(b)['stock'] == 7
+    assert cat.por_codigo('779') is None and cat.por_codigo('780')['id'] == c
+    assert [p['id'] for p in cat.buscar('te')] == [c]
+    assert cat.sincronizar(db.productos_por_ids([b]), [b]) == ([], [], [])
+
+
+def test_importar_tras_borrar_el_ultimo_producto_avisa_los_ids_reales(db, tienda):
+    db.add_producto('Yerba', 1, 100, tienda)
+    ultimo = db.add_producto('Azúcar', 1, 50, tienda)
+    db.delete_producto(ultimo)
+    cat = db.catalogo(tienda)
+    avisos = _suscribir(db)
+
+    db.importar_productos(tienda, [[(2, 'Café', 3, 80.0, '779')]])
+
+    nuevo = db.producto_por_codigo('779')
+    assert nuevo['id'] > ultimo  # AUTOINCREMENT no reutiliza el id borrado
+    assert cat.por_codigo('779')['id'] == nuevo['id']
+    assert [(c.tabla, c.insertados) for c in avisos] == [('productos', (nuevo['id'],))]
+
+
+def test_escrituras_de_dos_dbmanager_con_avisos_compartidos_no_son_externas(db, tienda):
+    # como la interfaz y el EjecutorDB: mismo archivo, mismas suscripciones
+    otra = DBManager(db.filename, avisos=db.avisos)
+    externos = []
+    db.suscribir(lambda cambios: externos.extend(c for c in cambios if c.externo))
+    barrera = threading.Barrier(2)
+
+    def escribir(base):
+        barrera.wait()
+        for i in range(200):
+            base.add_producto(f'P{i}', 1, 10, tienda)
+
+    hilos = [threading.Thread(target=escribir, args=(b,)) for b in (db, otra)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    otra.close()
+
+    assert not db.revisar_cambios()
+    assert externos == []
+    assert len(db.list_productos(tienda)) == 400
+
+
+def test_escrituras_del_ejecutor_no_son_externas_para_la_interfaz(db, tienda):
+    raiz = _RaizTk()
+    ejecutor = EjecutorDB(raiz, db.filename, abrir=lambda f: DBManager(f, avisos=db.avisos))
+    recibidos = []
+    db.suscribir(ejecutor.en_tk(recibidos.extend))
+    try:
+        pid = ejecutor.enviar(lambda base: base.add_producto('Yerba', 1, 100, tienda)).result(timeout=5)
+        raiz.correr()  # el aviso llega al hilo de Tk
+
+        assert _resumen(recibidos) == [('productos', (pid,), (), ())]
+        assert recibidos[0].origen is not db
+        assert not db.revisar_cambios()
+
+        # una escritura de otro proceso (sin avisos compartidos) sí es externa
+        otro = DBManager(db.filename)
+        otro.add_producto('Café', 1, 80, tienda)
+        otro.close()
+        assert db.revisar_cambios()
+        assert recibidos[-1].externo
+    finally:
+        ejecutor.cerrar()
@@ -0,0 +1,16 @@
+from easystock.catalogo import CatalogoProductos
+
+
+def _producto(pid, nombre, codigo=None):
+    return {'id': pid, 'nombre': nombre, 'stock': 1, 'precio': 10.0, 'id_tienda': 1, 'codigo_barras': codigo}
+
+
+def test_quitar_saca_el_producto_de_la_lista_y_los_indices(db):
+    cat = CatalogoProductos(db, 1, [_producto(1, 'Yerba', '779'), _producto(2, 'Azúcar'), _producto(3, 'Café')])
+
+    cat._quitar(1)
+    cat._quitar(1)  # ya no está: no hace nada
+
+    assert [p['id'] for p in cat] == [2, 3]
+    assert cat.por_id(1) is None and cat.por_codigo('779') is None
+    assert cat.buscar('yerba') == []
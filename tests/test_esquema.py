@@ -0,0 +1,68 @@
+import shutil
+import sqlite3
+from pathlib import Path
+
+from easystock.db import MIGRACIONES, SQL_RECALCULAR_VENTAS_MES, DBManager
+
+# la base de la primera versión (sin user_version, índices ni tablas nuevas)
+BASE_ORIGINAL = Path(__file__).resolve().parent.parent / 'StockManager.db'
+
+INDICES = {'idx_productos_tienda', 'idx_venta_items_venta', 'idx_venta_items_producto',
+           'idx_ventas_fecha', 'idx_ventas_tienda_fecha'}
+TABLAS = {'ventas_mes', 'archivos_ventas', 'demanda_productos'}
+
+
+def _esquema(conn):
+    return {r[0]: r[1] for r in conn.execute("SELECT name, type FROM sqlite_master")}
+
+
+def test_base_original_se_migra_a_la_ultima_version(tmp_path):
+    ruta = tmp_path / 'StockManager.db'
+    shutil.copy(BASE_ORIGINAL, ruta)
+    antes = sqlite3.connect(ruta)
+    assert antes.execute("PRAGMA user_version").fetchone()[0] == 0
+    datos = [antes.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ('productos', 'ventas', 'venta_items')]
+    antes.close()
+
+    db = DBManager(str(ruta))
+    try:
+        conn = db.conn
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRACIONES)
+        esquema = _esquema(conn)
+        assert {n for n, t in esquema.items() if t == 'index'} >= INDICES
+        assert {n for n, t in esquema.items() if t == 'table'} >= TABLAS
+        assert 'id_tienda' in {r[1] for r in conn.execute("PRAGMA table_info(ventas)")}
+        assert 'producto_id' in {r[1] for r in conn.execute("PRAGMA table_info(venta_items)")}
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0  # ANALYZE
+        # los datos siguen ahí y el resumen mensual salió de ellos
+        assert [conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ('productos', 'ventas', 'venta_items')] == datos
+        resumen = conn.execute("SELECT mes, producto, unidades, ingresos FROM ventas_mes ORDER BY 1, 2").fetchall()
+        assert resumen
+        conn.execute("CREATE TEMP TABLE esperado AS SELECT * FROM ventas_mes WHERE 0")
+        conn.execute(SQL_RECALCULAR_VENTAS_MES.replace('INSERT INTO ventas_mes', 'INSERT INTO temp.esperado'))
+        assert resumen == conn.execute("SELECT * FROM temp.esperado ORDER BY 1, 2").fetchall()
+    finally:
+        db.close()
+
+
+def test_abrir_una_base_ya_migrada_no_repite_migraciones(tmp_path):
+    ruta = str(tmp_path / 'stock.db')
+    DBManager(ruta).close()
+    conn = sqlite3.connect(ruta)
+    antes = _esquema(conn)
+    conn.close()
+
+    db = DBManager(ruta)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRACIONES)
+        assert _esquema(db.conn) == antes
+    finally:
+        db.close()
+
+
+def test_historial_usa_el_indice_de_fecha(db):
+    plan = ' '.join(r[3] for r in db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id, total, fecha FROM ventas WHERE fecha >= ? ORDER BY fecha DESC LIMIT 50",
+        ('2024-01-01',)))
+    assert 'idx_ventas_fecha' in plan
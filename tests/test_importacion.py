@@ -0,0 +1,14 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from easystock.importacion import _validar_lote
+
+
+def test_stock_negativo_se_rechaza():
+    df = pd.DataFrame({'Nombre': ['Yerba', 'Azúcar', 'Café'], 'Stock': [3, -2, 1.5], 'Precio': [100, 50, 80]})
+
+    validos, rechazados = _validar_lote(df, primera_fila=2)
+
+    assert validos == [(2, 'Yerba', 3, 100.0, None)]
+    assert rechazados == [(3, 'stock inválido'), (4, 'stock inválido')]
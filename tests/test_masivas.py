@@ -0,0 +1,75 @@
+import pytest
+
+
+def _productos(db, *ids):
+    return [(p['id'], p['precio'], p['stock']) for p in db.productos_por_ids(ids)]
+
+
+@pytest.fixture
+def surtido(db, tienda):
+    # tres productos en la tienda y uno con el mismo nombre en otra
+    norte = db.add_tienda('Norte')
+    ids = [db.add_producto('Yerba', 5, 100, tienda), db.add_producto('Yerba 50%_off', 1, 10.05, tienda),
+           db.add_producto('Café', 2, 80, tienda), db.add_producto('Yerba', 5, 100, norte)]
+    return norte, ids
+
+
+def test_actualizar_por_sucursal_y_texto(db, tienda, surtido):
+    norte, (yerba, oferta, cafe, yerba_norte) = surtido
+    cat = db.catalogo(tienda)
+    avisos = []
+    db.suscribir(avisos.extend)
+
+    assert db.actualizar_productos(id_tienda=tienda, contiene='yerba', porcentaje=10, sumar_stock=-3) == 2
+
+    assert _productos(db, yerba, oferta, cafe, yerba_norte) == [
+        (yerba, 110.0, 2), (oferta, 11.06, 0), (cafe, 80.0, 2), (yerba_norte, 100.0, 5)]
+    assert [(p['id'], p['precio'], p['stock']) for p in cat] == _productos(db, yerba, oferta, cafe)
+    assert [c.actualizados for c in avisos] == [(yerba, oferta)]
+
+
+def test_actualizar_por_ids_y_comodines_literales(db, tienda, surtido):
+    _, (yerba, oferta, cafe, yerba_norte) = surtido
+
+    # % y _ del texto son literales, no comodines de LIKE
+    assert db.actualizar_productos(contiene='50%_', precio=9) == 1
+    assert db.actualizar_productos(contiene='0%o', precio=1) == 0
+    assert db.actualizar_productos(ids=[cafe, yerba_norte], stock=7) == 2
+
+    assert _productos(db, yerba, oferta, cafe, yerba_norte) == [
+        (yerba, 100.0, 5), (oferta, 9.0, 1), (cafe, 80.0, 7), (yerba_norte, 100.0, 7)]
+
+
+def test_actualizar_valida_los_argumentos(db, tienda):
+    with pytest.raises(ValueError):
+        db.actualizar_productos(precio=1)  # sin filtro
+    with pytest.raises(ValueError):
+        db.actualizar_productos(id_tienda=tienda)  # sin cambios
+    with pytest.raises(ValueError):
+        db.actualizar_productos(id_tienda=tienda, precio=1, porcentaje=5)
+
+
+def test_borrar_por_filtro_sincroniza_catalogos_y_avisa(db, tienda, surtido):
+    norte, (yerba, oferta, cafe, yerba_norte) = surtido
+    cat, cat_norte = db.catalogo(tienda), db.catalogo(norte)
+    avisos = []
+    db.suscribir(avisos.extend)
+
+    assert db.delete_productos(contiene='yerba') == 3
+
+    assert [p['id'] for p in cat] == [cafe]
+    assert len(cat_norte) == 0
+    assert db.buscar_productos('yerba') == []
+    assert [(c.tabla, c.borrados) for c in avisos] == [('productos', (yerba, oferta, yerba_norte))]
+
+
+def test_borrar_sucursal_borra_sus_productos(db, tienda, surtido):
+    norte, (yerba, oferta, cafe, yerba_norte) = surtido
+    db.catalogo(norte)
+
+    assert db.delete_tienda(norte) == 1
+
+    assert not db.tiene_catalogo(norte)
+    assert _productos(db, yerba_norte) == []
+    assert [t['id'] for t in db.list_tiendas()] == [tienda]
+    assert len(db.list_productos(tienda)) == 3
@@ -0,0 +1,16 @@
+from easystock.metricas import Metricas, _normalizar_sql
+
+
+def test_listas_de_parametros_comparten_etiqueta():
+    assert _normalizar_sql("SELECT * FROM productos WHERE id IN (?, ?, ?)") == \
+        _normalizar_sql("SELECT * FROM productos\n  WHERE id IN (?)") == \
+        "SELECT * FROM productos WHERE id IN (?…)"
+    assert _normalizar_sql("INSERT INTO t (a, b) VALUES (?, ?), (?,?), (?, ?)") == \
+        "INSERT INTO t (a, b) VALUES (?…), …"
+
+
+def test_sentencias_con_distinto_largo_de_lista_son_una_serie():
+    m = Metricas()
+    for n in range(1, 50):
+        m.registrar_sentencia(f"SELECT id FROM ventas WHERE id IN ({', '.join('?' * n)})", 0.001)
+    assert list(m.sentencias) == ["SELECT id FROM ventas WHERE id IN (?…)"]
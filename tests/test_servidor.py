@@ -0,0 +1,32 @@
+import time
+
+from easystock.cliente import ClienteDB
+from easystock.servidor import ServidorPOS
+
+
+def _esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while not condicion() and time.monotonic() < limite:
+        time.sleep(0.02)
+    return condicion()
+
+
+def test_conexiones_de_cajas_cerradas_se_liberan(db, tienda):
+    db.add_producto('Yerba', 10, 2500, tienda, '779')
+    pos = ServidorPOS(db, puerto=0).iniciar()
+    try:
+        abiertas = lambda: len(db.conexiones._abiertas)
+        cliente = ClienteDB(pos.url)
+        cliente.list_productos(tienda)
+        cliente.close()
+        assert _esperar(lambda: abiertas() <= 2)
+        base = abiertas()
+        for _ in range(30):
+            cliente = ClienteDB(pos.url)
+            assert cliente.producto_por_codigo('779')['nombre'] == 'Yerba'
+            cliente.list_ventas_pagina()
+            cliente.close()
+        # cada caja usó su hilo y sus conexiones; al cortarse, se cerraron
+        assert _esperar(lambda: abiertas() <= base), abiertas()
+    finally:
+        pos.cerrar()
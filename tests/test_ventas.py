@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from easystock.db import SQL_RECALCULAR_VENTAS_MES, DBManager, StockInsuficienteError
+
+
+def _linea(db, pid, cantidad):
+    p = db.productos_por_ids([pid])[0]
+    return {'producto': p['nombre'], 'producto_id': pid, 'cantidad': cantidad,
+            'precio': p['precio'], 'subtotal': cantidad * p['precio']}
+
+
+def _filas(db, tabla):
+    return db.conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+
+def test_venta_con_una_linea_sin_stock_no_deja_nada(db, tienda):
+    yerba = db.add_producto('Yerba', 5, 100, tienda)
+    cafe = db.add_producto('Café', 1, 80, tienda)
+    cat = db.catalogo(tienda)
+    lineas = [_linea(db, yerba, 2), _linea(db, cafe, 1), _linea(db, cafe, 1)]
+
+    with pytest.raises(StockInsuficienteError) as e:
+        db.create_venta(lineas, 360)
+
+    # las líneas repetidas del mismo producto se suman
+    assert e.value.faltantes == [{'producto_id': cafe, 'producto': 'Café', 'pedido': 2, 'disponible': 1}]
+    assert (_filas(db, 'ventas'), _filas(db, 'venta_items')) == (0, 0)
+    assert [(p['id'], p['stock']) for p in db.productos_por_ids([yerba, cafe])] == [(yerba, 5), (cafe, 1)]
+    assert [p['stock'] for p in cat] == [5, 1]
+
+
+def test_dos_cajas_compiten_por_la_ultima_unidad(db, tienda):
+    pid = db.add_producto('Yerba', 1, 100, tienda)
+    linea = _linea(db, pid, 1)
+    cajas = [DBManager(db.filename), DBManager(db.filename)]
+    resultados = [None, None]
+    barrera = threading.Barrier(2)
+
+    def vender(i):
+        barrera.wait()
+        try:
+            resultados[i] = cajas[i].create_venta([linea], 100)
+        except StockInsuficienteError as e:
+            resultados[i] = e
+
+    hilos = [threading.Thread(target=vender, args=(i,)) for i in range(2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    for caja in cajas:
+        caja.close()
+
+    vendidas = [r for r in resultados if isinstance(r, int)]
+    rechazadas = [r for r in resultados if isinstance(r, StockInsuficienteError)]
+    assert len(vendidas) == 1 and len(rechazadas) == 1
+    assert rechazadas[0].faltantes == [{'producto_id': pid, 'producto': 'Yerba', 'pedido': 1, 'disponible': 0}]
+    assert db.productos_por_ids([pid])[0]['stock'] == 0
+    assert (_filas(db, 'ventas'), _filas(db, 'venta_items')) == (1, 1)
+
+
+def _resumen_mensual(db):
+    # ventas_mes tal como quedó y como lo dejaría un recálculo completo, sin tocar la base
+    conn = db.conn
+    actual = conn.execute("SELECT mes, producto, unidades, ingresos FROM ventas_mes ORDER BY 1, 2").fetchall()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS esperado AS SELECT * FROM ventas_mes WHERE 0")
+    conn.execute("DELETE FROM temp.esperado")
+    conn.execute(SQL_RECALCULAR_VENTAS_MES.replace('INSERT INTO ventas_mes', 'INSERT INTO temp.esperado'))
+    esperado = conn.execute("SELECT * FROM temp.esperado ORDER BY 1, 2").fetchall()
+    conn.commit()
+    return [tuple(r) for r in actual], [tuple(r) for r in esperado]
+
+
+def _top(db, mes):
+    unidades, ingresos = db.top_por_mes(mes)
+    return [(r['producto'], r['total_vendido'], r['ingresos']) for r in unidades]
+
+
+def test_resumen_mensual_coincide_con_recalcularlo(db, tienda):
+    yerba = db.add_producto('Yerba', 50, 100, tienda)
+    cafe = db.add_producto('Café', 50, 80, tienda)
+    anio = datetime.now().year
+    mes = datetime.now(timezone.utc).strftime('%Y-%m')  # las fechas de las ventas son las de SQLite (UTC)
+
+    vieja = db.create_venta([_linea(db, yerba, 1), _linea(db, cafe, 2)], 260)
+    with db.transaccion() as cur:
+        cur.execute("UPDATE ventas SET fecha = ? WHERE id = ?", (f"{anio - 1}-05-10 10:00:00", vieja))
+    db.recalcular_ventas_mes()
+
+    db.create_venta([_linea(db, yerba, 2), _linea(db, cafe, 1)], 280)
+    borrada = db.create_venta([_linea(db, yerba, 3)], 300)
+    db.create_venta([_linea(db, cafe, 2), _linea(db, cafe, 2)], 320)
+    db.delete_venta(borrada)
+
+    actual, esperado = _resumen_mensual(db)
+    assert actual == esperado
+    assert _top(db, mes) == [('Café', 5, 400.0), ('Yerba', 2, 200.0)]
+
+    db.archivar_ventas(anio - 1)
+    db.create_venta([_linea(db, yerba, 1)], 100)
+
+    actual, esperado = _resumen_mensual(db)
+    assert actual == esperado
+    assert all(m == mes for m, *_ in actual)
+    assert _top(db, mes) == [('Café', 5, 400.0), ('Yerba', 3, 300.0)]
+    assert _top(db, f"{anio - 1}-05") == [('Café', 2, 160.0), ('Yerba', 1, 100.0)]